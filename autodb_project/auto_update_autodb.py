@@ -5,6 +5,8 @@ from datetime import datetime
 import pytz
 import requests
 from tqdm import tqdm
+import threading
+import time
 
 load_dotenv()
 
@@ -22,6 +24,15 @@ TGT_DB = {
     'host': os.getenv("AUTODB_HOST")
 }
 
+# "row" keeps the per-row INSERT path, "bulk" streams tables with COPY
+SYNC_MODE = os.getenv("SYNC_MODE", "row")
+
+SALES_COLUMNS = [
+    "store_id", "sku_id", "year", "day", "date", "type_of_day",
+    "initial", "sold", "returns", "donations", "reroutes_in", "reroutes_out", "recycled", "final"
+]
+SALES_PK = "store_id, sku_id, year, day"
+
 def get_today_date_from_ip():
     try:
         resp = requests.get("https://ipapi.co/json/")
@@ -74,12 +85,127 @@ def copy_sales_data_until_date(src_cur, tgt_cur, date):
         tgt_cur.execute(sql, row)
     print(f"✅ Done: sales_data")
 
+# --- Bulk (COPY) sync ---
+
+def _copy_out(src_conn, copy_sql, write_fd, errors):
+    """
+    Run COPY ... TO STDOUT on the source and write it into a pipe.
+    """
+    try:
+        with os.fdopen(write_fd, 'wb') as pipe, src_conn.cursor() as cur:
+            cur.copy_expert(copy_sql, pipe)
+    except Exception as e:
+        errors.append(e)
+
+def bulk_copy_table(src_conn, tgt_conn, table, columns, pk, where=None, params=None):
+    """
+    Stream rows from src table into tgt table with COPY TO / COPY FROM.
+
+    Rows are piped straight from the source into a temp staging table and
+    merged with one INSERT ... SELECT, skipping duplicates by PK. The whole
+    table is a single target transaction.
+    """
+    print(f"🚚 Bulk copying table: {table}")
+    started = time.perf_counter()
+    cols = ', '.join(columns)
+    staging = f"{table}_staging"
+
+    select_sql = f"SELECT {cols} FROM {table}"
+    if where:
+        select_sql += f" WHERE {where}"
+    with src_conn.cursor() as src_cur:
+        select_sql = src_cur.mogrify(select_sql, params).decode()
+
+    errors = []
+    writer = None
+    try:
+        with tgt_conn.cursor() as tgt_cur:
+            tgt_cur.execute(
+                f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+            read_fd, write_fd = os.pipe()
+            writer = threading.Thread(
+                target=_copy_out,
+                args=(src_conn, f"COPY ({select_sql}) TO STDOUT", write_fd, errors),
+                daemon=True
+            )
+            writer.start()
+            # Closing the read end on failure unblocks the writer thread
+            with os.fdopen(read_fd, 'rb') as pipe:
+                tgt_cur.copy_expert(f"COPY {staging} ({cols}) FROM STDIN", pipe)
+            writer.join()
+            if errors:
+                raise errors[0]
+
+            tgt_cur.execute(f"SELECT COUNT(*) FROM {staging}")
+            copied = tgt_cur.fetchone()[0]
+            tgt_cur.execute(f"""
+                INSERT INTO {table} ({cols})
+                SELECT {cols} FROM {staging}
+                ON CONFLICT ({pk}) DO NOTHING
+            """)
+            merged = tgt_cur.rowcount
+        tgt_conn.commit()
+    except Exception:
+        tgt_conn.rollback()
+        if writer is not None:
+            writer.join()
+        raise
+    finally:
+        # COPY TO opened a read transaction on the source; end it either way
+        src_conn.rollback()
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    rate = copied / elapsed
+    print(f"✅ Done: {table} — {copied} rows streamed, {merged} new, "
+          f"{elapsed:.1f}s ({rate:,.0f} rows/s)")
+    return {'table': table, 'rows': copied, 'merged': merged,
+            'seconds': elapsed, 'rows_per_sec': rate}
+
+def bulk_copy_sales_data_until_date(src_conn, tgt_conn, date):
+    """
+    COPY-based variant of copy_sales_data_until_date.
+    """
+    print(f"🔄 Copying sales_data until date: {date}")
+    return bulk_copy_table(src_conn, tgt_conn, "sales_data", SALES_COLUMNS, SALES_PK,
+                           where="date <= %s", params=(date,))
+
+def print_sync_report(stats):
+    """
+    Print per-table row counts and throughput of a bulk sync.
+    """
+    print("📊 Sync report:")
+    for s in stats:
+        print(f"   {s['table']:<12} {s['rows']:>12,} rows {s['merged']:>12,} new "
+              f"{s['seconds']:>8.1f}s {s['rows_per_sec']:>12,.0f} rows/s")
+
+def run_bulk_sync(src_conn, tgt_conn, date):
+    """
+    Copy all tables and sales_data up to date with COPY streaming.
+    """
+    stats = [
+        bulk_copy_table(src_conn, tgt_conn, "skus", ["sku_id", "name", "shelf_life_days"], pk="sku_id"),
+        bulk_copy_table(src_conn, tgt_conn, "stores", ["store_id", "geo", "religion"], pk="store_id"),
+        bulk_copy_table(src_conn, tgt_conn, "store_skus", ["store_id", "sku_id"], pk="store_id, sku_id"),
+        bulk_copy_sales_data_until_date(src_conn, tgt_conn, date),
+    ]
+    print_sync_report(stats)
+    return stats
+
 def main():
     today = get_today_date_from_ip()
 
     print("🔗 Connecting to source and target DBs...")
     src_conn = psycopg2.connect(**SRC_DB)
     tgt_conn = psycopg2.connect(**TGT_DB)
+
+    if SYNC_MODE == "bulk":
+        run_bulk_sync(src_conn, tgt_conn, today)
+        src_conn.close()
+        tgt_conn.close()
+        print("✅ Sync complete!")
+        return
+
     src_cur = src_conn.cursor()
     tgt_cur = tgt_conn.cursor()
 
@@ -0,0 +1,98 @@
+import os
+import glob
+from datetime import datetime
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- DB config (same target as auto_update_autodb) ---
+TGT_DB = {
+    'dbname': os.getenv("AUTODB_NAME"),
+    'user': os.getenv("AUTODB_USER"),
+    'password': os.getenv("AUTODB_PASSWORD"),
+    'host': os.getenv("AUTODB_HOST")
+}
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+def applied_migrations(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version TEXT PRIMARY KEY,
+            applied_at TIMESTAMPTZ DEFAULT now()
+        )
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {r[0] for r in cur.fetchall()}
+
+def apply_migrations(conn):
+    """
+    Apply every migrations/*.sql not yet recorded in schema_migrations,
+    each in its own transaction, in file name order.
+    """
+    with conn, conn.cursor() as cur:
+        done = applied_migrations(cur)
+
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, "*.sql"))):
+        version = os.path.splitext(os.path.basename(path))[0]
+        if version in done:
+            continue
+        print(f"🛠 Applying migration {version}...")
+        with open(path, encoding="utf-8") as f:
+            sql = f.read()
+        with conn, conn.cursor() as cur:
+            cur.execute(sql)
+            cur.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (version,))
+        print(f"✅ Applied {version}")
+
+def ensure_year_partitions(conn, through_year):
+    """
+    Create sales_data_y<year> partitions up to through_year, moving any rows
+    for that year out of the default partition first.
+    """
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('sales_data')")
+        row = cur.fetchone()
+        if not row or row[0] != 'p':
+            print("⚠️ sales_data is not partitioned; run the migrations first.")
+            return
+        cur.execute("""
+            SELECT COALESCE(MIN(year), %s) FROM (
+                SELECT year FROM sales_data_default
+                UNION ALL
+                SELECT substring(c.relname FROM 'sales_data_y(\\d+)')::INTEGER
+                FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'sales_data'::regclass AND c.relname ~ '^sales_data_y\\d+$'
+            ) years
+        """, (through_year,))
+        first_year = cur.fetchone()[0]
+
+    for year in range(first_year, through_year + 1):
+        name = f"sales_data_y{year}"
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s)", (name,))
+            if cur.fetchone()[0]:
+                continue
+            cur.execute(f"CREATE TABLE {name} (LIKE sales_data INCLUDING DEFAULTS)")
+            cur.execute(f"""
+                WITH moved AS (DELETE FROM sales_data_default WHERE year = %s RETURNING *)
+                INSERT INTO {name} SELECT * FROM moved
+            """, (year,))
+            moved = cur.rowcount
+            cur.execute(f"ALTER TABLE sales_data ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                        (year, year + 1))
+        print(f"✅ Created partition {name} ({moved} rows moved from default)")
+
+def main():
+    print("🔗 Connecting to autodb...")
+    conn = psycopg2.connect(**TGT_DB)
+    try:
+        apply_migrations(conn)
+        ensure_year_partitions(conn, datetime.utcnow().year + 1)
+    finally:
+        conn.close()
+    print("✅ autodb schema is up to date!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+-- Convert sales_data into a table range-partitioned by year, in place.
+-- The primary key already contains year, so ON CONFLICT (store_id, sku_id, year, day)
+-- keeps working. Skips itself when sales_data is already partitioned.
+
+DO $$
+DECLARE
+    lo INTEGER;
+    hi INTEGER;
+    y INTEGER;
+BEGIN
+    IF (SELECT c.relkind FROM pg_class c
+        WHERE c.oid = to_regclass('sales_data')) = 'p' THEN
+        RAISE NOTICE 'sales_data is already partitioned, skipping';
+        RETURN;
+    END IF;
+
+    ALTER TABLE sales_data RENAME TO sales_data_unpartitioned;
+    ALTER TABLE sales_data_unpartitioned RENAME CONSTRAINT sales_data_pkey TO sales_data_unpartitioned_pkey;
+
+    CREATE TABLE sales_data (
+        store_id TEXT,
+        sku_id TEXT,
+        year INTEGER,
+        day INTEGER,
+        date DATE,
+        type_of_day TEXT,
+        initial INTEGER,
+        sold INTEGER,
+        returns INTEGER,
+        donations INTEGER,
+        reroutes_in INTEGER,
+        reroutes_out INTEGER,
+        recycled INTEGER,
+        final INTEGER,
+        PRIMARY KEY (store_id, sku_id, year, day),
+        FOREIGN KEY (store_id) REFERENCES stores(store_id),
+        FOREIGN KEY (sku_id) REFERENCES skus(sku_id)
+    ) PARTITION BY RANGE (year);
+
+    -- One partition per year of existing data, through next year
+    SELECT COALESCE(MIN(year), EXTRACT(YEAR FROM now())::INTEGER),
+           GREATEST(COALESCE(MAX(year), 0), EXTRACT(YEAR FROM now())::INTEGER + 1)
+    INTO lo, hi
+    FROM sales_data_unpartitioned;
+
+    FOR y IN lo..hi LOOP
+        EXECUTE format(
+            'CREATE TABLE sales_data_y%s PARTITION OF sales_data FOR VALUES FROM (%s) TO (%s)',
+            y, y, y + 1);
+    END LOOP;
+    CREATE TABLE sales_data_default PARTITION OF sales_data DEFAULT;
+
+    INSERT INTO sales_data SELECT * FROM sales_data_unpartitioned;
+    DROP TABLE sales_data_unpartitioned;
+END $$;
+
+-- Date-range scans (fetch_sales_data): BRIN stays tiny on date-ordered appends
+CREATE INDEX IF NOT EXISTS sales_data_date_brin ON sales_data USING brin (date);
+
+-- MAX(date) and "rows at the latest date" (stock snapshot in run_abc_logic)
+CREATE INDEX IF NOT EXISTS sales_data_date_store_sku_idx ON sales_data (date, store_id, sku_id);
+
+ANALYZE sales_data;
@@ -24,7 +24,8 @@ CREATE TABLE IF NOT EXISTS store_skus (
     FOREIGN KEY (sku_id) REFERENCES skus(sku_id)
 );
 
--- Table: sales_data
+-- Table: sales_data (range-partitioned by year; see migrations/)
+-- Year partitions are created by migrate_autodb.py; until then rows land in the default partition.
 CREATE TABLE IF NOT EXISTS sales_data (
     store_id TEXT,
     sku_id TEXT,
@@ -43,4 +44,12 @@ CREATE TABLE IF NOT EXISTS sales_data (
     PRIMARY KEY (store_id, sku_id, year, day),
     FOREIGN KEY (store_id) REFERENCES stores(store_id),
     FOREIGN KEY (sku_id) REFERENCES skus(sku_id)
-);
+) PARTITION BY RANGE (year);
+
+CREATE TABLE IF NOT EXISTS sales_data_default PARTITION OF sales_data DEFAULT;
+
+-- Date-range scans (fetch_sales_data)
+CREATE INDEX IF NOT EXISTS sales_data_date_brin ON sales_data USING brin (date);
+
+-- MAX(date) and "rows at the latest date" (stock snapshot in run_abc_logic)
+CREATE INDEX IF NOT EXISTS sales_data_date_store_sku_idx ON sales_data (date, store_id, sku_id);
@@ -0,0 +1,212 @@
+import time
+import numpy as np
+import pandas as pd
+
+# Gap (shelf days left - days to sell) thresholds of the ABC rules
+KEEP_GAP = 15
+REROUTE_GAP = 8
+CLEARANCE_GAP = 6
+FLASH_GAP = 4
+RESTOCK_MULTIPLIER = 2
+
+ACTIONS = np.array([
+    'keep_on_shelf_and_restock',
+    'reroute_to_high_demand_store',
+    'clearance_sale_tier1_30_50',
+    'flash_sale_tier2_80_90',
+    'donate',
+], dtype=object)
+PLAN_COLUMNS = ['store_id', 'sku_id', 'action', 'restock', 'target_store_id', 'bundle_with_sku']
+
+def reroute_targets(pred_df):
+    """
+    Store with the highest predicted_sales for each SKU.
+    """
+    sku_store_max = pred_df.groupby('sku_id')['predicted_sales'].idxmax()
+    reroute = pred_df.loc[sku_store_max][['sku_id', 'store_id']]
+    return reroute.rename(columns={'store_id': 'target_store_id'})
+
+def top_store_targets(store, sku, reroute):
+    """
+    Each row's SKU top store from reroute_targets, or '' when that is the row's own store.
+    """
+    top_store = pd.Series(reroute['target_store_id'].to_numpy(), index=reroute['sku_id'].to_numpy())
+    top_store = top_store[~top_store.index.duplicated()]
+    candidate = pd.Series(np.asarray(sku, dtype=object)).map(top_store).fillna('').to_numpy(dtype=object)
+    return np.where(candidate != np.asarray(store, dtype=object), candidate, '')
+
+def days_and_gap(merged, sell_factor=1):
+    """
+    Days to sell the current stock and the gap to the shelf life, per row.
+    """
+    predicted = merged['predicted_sales'].to_numpy(dtype=np.float64)
+    stock = np.nan_to_num(merged['current_stock'].to_numpy(dtype=np.float64))
+    shelf_days = merged['shelf_life_days'].to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_to_sell = np.where(predicted > 0, stock / predicted * sell_factor, np.inf)
+    return predicted, stock, shelf_days, days_to_sell, shelf_days - days_to_sell
+
+def classify(days_to_sell, shelf_days, gap, keep_gap=KEEP_GAP, reroute_gap=REROUTE_GAP,
+             clearance_gap=CLEARANCE_GAP, flash_gap=FLASH_GAP):
+    """
+    Index into ACTIONS for every row, from the rule masks.
+    """
+    is_keep = (days_to_sell < shelf_days) & (gap >= keep_gap)
+    is_reroute = (reroute_gap < gap) & (gap < keep_gap)
+    is_clearance = (clearance_gap < gap) & (gap <= reroute_gap)
+    is_flash = (flash_gap < gap) & (gap <= clearance_gap)
+    # np.select takes the first match, like the if/elif chain
+    return np.select([is_keep, is_reroute, is_clearance, is_flash], [0, 1, 2, 3], default=4)
+
+def decide_actions(merged, reroute, sell_factor=1, keep_gap=KEEP_GAP, reroute_gap=REROUTE_GAP,
+                   clearance_gap=CLEARANCE_GAP, flash_gap=FLASH_GAP, restock_multiplier=RESTOCK_MULTIPLIER):
+    """
+    Columnar ABC rules: one action per merged row, in merged order.
+
+    - keep: days_to_sell < shelf days and gap >= keep_gap; restock up to restock_multiplier x predicted
+    - reroute: reroute_gap < gap < keep_gap; target is the SKU's top store unless it is this store
+    - clearance / flash: bundled with the first keep SKU of the same store at an earlier row
+    - donate: everything else (including missing shelf life)
+    """
+    predicted, stock, shelf_days, days_to_sell, gap = days_and_gap(merged, sell_factor)
+    choice = classify(days_to_sell, shelf_days, gap, keep_gap, reroute_gap, clearance_gap, flash_gap)
+    is_keep, is_reroute, is_bundle = choice == 0, choice == 1, (choice == 2) | (choice == 3)
+
+    n = len(merged)
+    store = merged['store_id'].to_numpy(dtype=object)
+    sku = merged['sku_id'].to_numpy(dtype=object)
+
+    restock = np.full(n, '', dtype=object)
+    restock_amt = np.trunc(np.maximum(0, predicted * restock_multiplier - stock))
+    restock[is_keep] = restock_amt[is_keep].astype(np.int64).tolist()
+
+    target = np.full(n, '', dtype=object)
+    target[is_reroute] = top_store_targets(store[is_reroute], sku[is_reroute], reroute)
+
+    # Per-store index of the first keep row; only rows after it bundle with it
+    bundle = np.full(n, '', dtype=object)
+    positions = np.arange(n)
+    keep_first = pd.DataFrame({'store_id': store[is_keep], 'pos': positions[is_keep], 'sku_id': sku[is_keep]})
+    keep_first = keep_first.drop_duplicates('store_id').set_index('store_id')
+    first_pos = pd.Series(store[is_bundle]).map(keep_first['pos']).to_numpy(dtype=np.float64)
+    first_sku = pd.Series(store[is_bundle]).map(keep_first['sku_id']).to_numpy(dtype=object)
+    bundle[is_bundle] = np.where(first_pos < positions[is_bundle], first_sku, '')
+
+    return pd.DataFrame({
+        'store_id': store, 'sku_id': sku, 'action': ACTIONS[choice], 'restock': restock,
+        'target_store_id': target, 'bundle_with_sku': bundle,
+    }, columns=PLAN_COLUMNS)
+
+def decide_actions_loop(merged, reroute, sell_factor=1):
+    """
+    Reference row-by-row implementation (the original run_abc_logic loop),
+    kept for parity checks.
+    """
+    action_plan = []
+
+    for _, row in merged.iterrows():
+        sku = row['sku_id']
+        store = row['store_id']
+        shelf_days = row.get('shelf_life_days', 14)
+        predicted = row['predicted_sales']
+        stock = row['current_stock'] if pd.notna(row['current_stock']) else 0
+
+        if predicted > 0:
+            days_to_sell = stock / predicted * sell_factor
+        else:
+            days_to_sell = float('inf')
+
+        days_left = shelf_days
+        gap = days_left - days_to_sell
+
+        target_store_id = ''
+        bundle_with_sku = ''
+
+        if days_to_sell < days_left and gap >= 15:
+            action = 'keep_on_shelf_and_restock'
+            restock_amt = max(0, predicted*2 - stock)
+            action_plan.append({
+                'store_id': store, 'sku_id': sku, 'action': action, 'restock': int(restock_amt),
+                'target_store_id': target_store_id, 'bundle_with_sku': bundle_with_sku
+            })
+
+        elif 8 < gap < 15:
+            action = 'reroute_to_high_demand_store'
+            target_row = reroute[(reroute['sku_id']==sku) & (reroute['target_store_id'] != store)]
+            if not target_row.empty:
+                target_store_id = target_row.iloc[0]['target_store_id']
+            action_plan.append({
+                'store_id': store, 'sku_id': sku, 'action': action, 'restock': '',
+                'target_store_id': target_store_id, 'bundle_with_sku': bundle_with_sku
+            })
+
+        elif 6 < gap <= 8:
+            action = 'clearance_sale_tier1_30_50'
+            keep_skus = [x['sku_id'] for x in action_plan if x['store_id']==store and x['action']=='keep_on_shelf_and_restock']
+            if keep_skus:
+                bundle_with_sku = keep_skus[0]
+            action_plan.append({
+                'store_id': store, 'sku_id': sku, 'action': action, 'restock': '',
+                'target_store_id': target_store_id, 'bundle_with_sku': bundle_with_sku
+            })
+
+        elif 4 < days_left - days_to_sell <= 6:
+            action = 'flash_sale_tier2_80_90'
+            keep_skus = [x['sku_id'] for x in action_plan if x['store_id']==store and x['action']=='keep_on_shelf_and_restock']
+            if keep_skus:
+                bundle_with_sku = keep_skus[0]
+            action_plan.append({
+                'store_id': store, 'sku_id': sku, 'action': action, 'restock': '',
+                'target_store_id': target_store_id, 'bundle_with_sku': bundle_with_sku
+            })
+
+        else:
+            action = 'donate'
+            action_plan.append({
+                'store_id': store, 'sku_id': sku, 'action': action, 'restock': '',
+                'target_store_id': target_store_id, 'bundle_with_sku': bundle_with_sku
+            })
+
+    return pd.DataFrame(action_plan, columns=PLAN_COLUMNS)
+
+def synthetic_merged(n_stores, n_skus, seed=0):
+    """
+    Random merged frame (one row per store x sku) for benchmarks.
+    """
+    rng = np.random.default_rng(seed)
+    n = n_stores * n_skus
+    merged = pd.DataFrame({
+        'store_id': np.repeat(np.arange(n_stores), n_skus).astype(str),
+        'sku_id': np.tile(np.arange(n_skus), n_stores).astype(str),
+        'predicted_sales': rng.gamma(2.0, 3.0, n).round(2),
+        'current_stock': rng.integers(0, 120, n).astype(float),
+        'shelf_life_days': rng.choice([7, 14, 21, 30, 60], n).astype(float),
+    })
+    merged.loc[rng.random(n) < 0.02, 'current_stock'] = np.nan
+    merged.loc[rng.random(n) < 0.02, 'predicted_sales'] = 0.0
+    return merged
+
+def benchmark(n_stores=2000, n_skus=500, parity_rows=20000):
+    """
+    Time decide_actions on n_stores x n_skus rows and check it matches the
+    row loop on the first parity_rows rows.
+    """
+    merged = synthetic_merged(n_stores, n_skus)
+    reroute = reroute_targets(merged)
+
+    start = time.perf_counter()
+    plan = decide_actions(merged, reroute)
+    elapsed = time.perf_counter() - start
+    print(f"⚡ Vectorized engine: {len(plan):,} rows in {elapsed:.2f}s")
+
+    sample = merged.iloc[:parity_rows]
+    start = time.perf_counter()
+    expected = decide_actions_loop(sample, reroute)
+    loop_elapsed = time.perf_counter() - start
+    same = decide_actions(sample, reroute).astype(str).equals(expected.astype(str))
+    print(f"⏱ Row loop: {len(sample):,} rows in {loop_elapsed:.2f}s")
+    print(f"{'✅' if same else '⚠️'} Parity on {len(sample):,} rows: {'identical' if same else 'MISMATCH'}")
+    return same
+
+if __name__ == "__main__":
+    benchmark()
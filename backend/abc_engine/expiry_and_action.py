@@ -1,9 +1,9 @@
 import os
 import sys
-import joblib
+import time
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from tensorflow import keras
 from dotenv import load_dotenv
 import psycopg2
 
@@ -12,12 +12,22 @@ load_dotenv()
 
 # Adjust path to import lstm_utils etc.
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'lstm_project')))
-from lstm_utils import fetch_sales_data, preprocess_with_meta
+from lstm_utils import iter_sales_data, fit_scaler, iter_series_windows, predict_in_batches
 from retrain_lstm_if_needed import days_since_last_retrain
+from model_registry import load_current
+from prediction_cache import PREDICTION_CACHE, PredictionCache, model_version
+from forecast import FORECAST_HORIZON, count_row_steps, forecast_horizon, step_days
+from baseline_forecast import baseline_series_demand
+from decision_engine import decide_actions, reroute_targets
+from reroute_optimizer import REROUTE_MODE, plan_reroutes, apply_transfers
 
-# Paths
-MODEL_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "lstm_project", "base_lstm_model.h5"))
-SCALER_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "lstm_project", "scaler.pkl"))
+# horizon (default): H-day demand in real units from each series' latest window
+# latest: one-step scaled prediction from each series' latest window only, times 14
+# single: the original one-step scaled prediction per window, times 14
+# baseline: NumPy exponential smoothing / croston, no model needed
+FORECAST_MODE = os.getenv("FORECAST_MODE", "horizon")
+# > 1: split stores across this many shards run in worker processes
+ABC_SHARDS = int(os.getenv("ABC_SHARDS", "1"))
 
 def get_supabase_conn():
     """
@@ -34,115 +44,207 @@ def get_supabase_conn():
 def load_current_model():
     days = days_since_last_retrain()
     print(f"⏱ Days since last retrain: {days}")
-    model = keras.models.load_model(MODEL_FILE)
-    scaler = joblib.load(SCALER_FILE) if os.path.exists(SCALER_FILE) else None
-    return model, scaler
+    model, scaler, manifest = load_current()
+    return model, scaler, manifest
 
-def run_abc_logic():
-    print("🔍 Loading model...")
-    model, scaler = load_current_model()
+def report_skipped(stats):
+    """
+    Print how many historical windows a latest-window run did not build or predict.
+    """
+    skipped = stats.get('windows', 0) - stats.get('selected', 0)
+    print(f"⚡ Predicted {stats.get('selected', 0)} latest windows, skipped {skipped} historical windows")
 
-    print("📦 Fetching latest sales data...")
-    current_year = datetime.utcnow().year
-    df = fetch_sales_data(2021, current_year)
+def predict_all_windows(predict, model, scaler, window_size, current_year, version=None, last_n=None,
+                        stores=None):
+    """
+    One-step scaled prediction for every window of every series
+    (FORECAST_MODE=single), or only each series' last_n windows (latest).
+    stores limits the run to a shard of store_ids.
+    """
+    # Windows already predicted by this model + scaler are served from the cache
+    cache = None
+    if PREDICTION_CACHE:
+        runtime = type(model).__name__ if model is not None else 'service'
+        cache = PredictionCache(model_version(version, scaler, runtime), stores=stores)
+
+    print(f"⚙️ Preprocessing and 📈 predicting next 14 days sales...")
+    pred_parts = []
+    stats = {}
+    chunks = iter_sales_data(2021, current_year, order='series', stores=stores)
+    for X, _, meta in iter_series_windows(chunks, scaler, window_size=window_size, with_meta=True,
+                                          last_n=last_n, stats=stats):
+        if cache is None:
+            meta['predicted_sales'] = predict(X)
+        else:
+            preds, miss = cache.lookup(meta)
+            if miss.any():
+                preds[miss] = predict(X[miss])
+                cache.add(meta[miss], preds[miss])
+            meta['predicted_sales'] = preds
+        pred_parts.append(meta)
 
-    print("⚙️ Preprocessing...")
-    X, _, meta = preprocess_with_meta(df, window_size=5)
+    if cache is not None:
+        cache.flush()
+        cache.report()
+    if last_n is not None:
+        report_skipped(stats)
 
-    if meta is None or len(meta) == 0:
+    if not pred_parts:
         raise ValueError("Preprocessing returned empty meta data!")
 
-    print(f"📈 Predicting next 14 days sales...")
-    preds = model.predict(X).flatten()
+    return pd.concat(pred_parts, ignore_index=True)
+
+def forecast_series_demand(predict, scaler, window_size, current_year, horizon=FORECAST_HORIZON, stores=None,
+                           step=None):
+    """
+    Roll every series' latest window forward `horizon` days in one batched
+    pass. Returns one row per series with horizon_demand (total units) and
+    predicted_sales (average units per day). step is the row spacing in
+    days, measured on this read when None.
+    """
+    print(f"⚙️ Preprocessing and 📈 forecasting next {horizon} days sales...")
+    X_parts, meta_parts = [], []
+    stats, steps = {}, {}
+    chunks = count_row_steps(iter_sales_data(2021, current_year, order='series', stores=stores), steps)
+    for X, _, meta in iter_series_windows(chunks, scaler, window_size=window_size, with_meta=True,
+                                          last_n=1, stats=stats):
+        X_parts.append(X)
+        meta_parts.append(meta)
+    report_skipped(stats)
+
+    if not meta_parts:
+        raise ValueError("Preprocessing returned empty meta data!")
+
+    # Rows may be days or weeks apart; forecast_horizon returns units per day
+    demand = forecast_horizon(predict, np.concatenate(X_parts), scaler, horizon, step or step_days(steps))
+    pred_df = pd.concat(meta_parts, ignore_index=True)
+    pred_df['horizon_demand'] = demand.sum(axis=1)
+    pred_df['predicted_sales'] = pred_df['horizon_demand'] / horizon
+    return pred_df
+
+def forecast_demand(model=None, predict=None, scaler=None, version=None, stores=None, strict=False, step=None,
+                    window_size=None):
+    """
+    Predicted sales per row for the current FORECAST_MODE, falling back to the
+    baseline forecaster when the LSTM is unavailable. Returns (pred_df,
+    sell_factor), where stock / predicted_sales * sell_factor is days to sell.
+    stores limits the forecast to a shard of store_ids. strict raises instead
+    of falling back, so every shard of a run uses the same forecaster. A
+    passed scaler is used when the loaded model has none, and step fixes
+    the row spacing; sharded runs work both out once for the fleet.
+    window_size belongs with a passed model or predict (a loaded model
+    brings its own from the manifest).
+    """
+    window_size = window_size or 5
+    use_baseline = FORECAST_MODE == 'baseline'
+    if not use_baseline and model is None and predict is None:
+        print("🔍 Loading model...")
+        try:
+            model, model_scaler, manifest = load_current_model()
+            scaler = model_scaler if model_scaler is not None else scaler
+            version, window_size = manifest['version'], manifest['window_size']
+        except Exception as e:
+            if strict:
+                raise
+            # No published model or TensorFlow unavailable: the plan still runs
+            print(f"⚠️ LSTM unavailable ({e}), falling back to the baseline forecaster")
+            use_baseline = True
+    if not use_baseline and predict is None:
+        predict = lambda X: predict_in_batches(model, X)
+
+    current_year = datetime.utcnow().year
+    if not use_baseline and scaler is None:
+        # Legacy models without a saved scaler: fit one on the data as before
+        print("📦 Streaming latest sales data...")
+        scaler, n_rows = fit_scaler(iter_sales_data(2021, current_year))
+        print(f"✅ Streamed {n_rows} rows from sales_data")
+    fitted_scaler = scaler
 
-    pred_df = pd.DataFrame(meta)
-    pred_df['predicted_sales'] = preds
+    pred_df = None
+    if not use_baseline:
+        try:
+            if FORECAST_MODE == 'horizon':
+                pred_df = forecast_series_demand(predict, fitted_scaler, window_size, current_year,
+                                                 stores=stores, step=step)
+                # predicted_sales is real daily demand, so stock / predicted is days of stock
+                sell_factor = 1
+            else:
+                # latest joins one window per series to the stock snapshot; single keeps every window
+                last_n = 1 if FORECAST_MODE == 'latest' else None
+                pred_df = predict_all_windows(predict, model, fitted_scaler, window_size, current_year,
+                                              version, last_n=last_n, stores=stores)
+                sell_factor = 14
+        except Exception as e:
+            if strict:
+                raise
+            print(f"⚠️ LSTM forecast failed ({e}), falling back to the baseline forecaster")
+    if pred_df is None:
+        pred_df = baseline_series_demand(FORECAST_HORIZON, stores=stores, step=step)
+        sell_factor = 1
+    pred_df[['store_id', 'sku_id']] = pred_df[['store_id', 'sku_id']].astype(str)
+    return pred_df, sell_factor
+
+def load_plan_inputs(model=None, predict=None, scaler=None, version=None, stores=None, strict=False,
+                     step=None, window_size=None):
+    """
+    Predictions joined to the latest stock and shelf life, plus store geo
+    classes: (pred_df, merged, stores_df, sell_factor). stores limits the
+    forecast and stock to a shard of store_ids; strict, step and window_size
+    as in forecast_demand.
+    """
+    pred_df, sell_factor = forecast_demand(model, predict, scaler, version, stores, strict, step, window_size)
+    shard_filter = "AND store_id = ANY(%(stores)s)" if stores is not None else ""
+    params = {'stores': [str(s) for s in stores]} if stores is not None else None
 
     # 🔗 Use Supabase connection to get shelf life & stock
     conn = get_supabase_conn()
     skus_df = pd.read_sql("SELECT sku_id, shelf_life_days FROM skus", conn)
-    stock_df = pd.read_sql("""
+    stock_df = pd.read_sql(f"""
         SELECT store_id, sku_id, final as current_stock 
         FROM sales_data 
-        WHERE date = (SELECT max(date) FROM sales_data)
-    """, conn)
+        WHERE date = (SELECT max(date) FROM sales_data) {shard_filter}
+    """, conn, params=params)
+    stores_df = pd.read_sql("SELECT store_id, geo FROM stores", conn)
     conn.close()
 
     merged = pred_df.merge(stock_df, on=['store_id', 'sku_id'], how='left')
     merged = merged.merge(skus_df, on='sku_id', how='left')
+    return pred_df, merged, stores_df, sell_factor
 
-    # Group by SKU to find store with max predicted sales (for reroute target)
-    sku_store_max = pred_df.groupby('sku_id')['predicted_sales'].idxmax()
-    reroute_targets = pred_df.loc[sku_store_max][['sku_id', 'store_id']]
-    reroute_targets = reroute_targets.rename(columns={'store_id': 'target_store_id'})
+def run_abc_logic(model=None, predict=None, scaler=None, version=None, window_size=None):
+    """
+    Build the action plan. A long-running caller (auth_api) passes its warm
+    model or a batched predict(X) function, plus the scaler, registry version
+    and window size that belong to it, instead of loading from disk. With
+    ABC_SHARDS > 1 and nothing passed in, stores are split across worker
+    processes (see sharded_abc).
+    """
+    if ABC_SHARDS > 1 and model is None and predict is None:
+        from sharded_abc import run_sharded_abc_logic
+        return run_sharded_abc_logic(ABC_SHARDS)
 
-    action_plan = []
+    pred_df, merged, stores_df, sell_factor = load_plan_inputs(model, predict, scaler, version,
+                                                               window_size=window_size)
 
-    for _, row in merged.iterrows():
-        sku = row['sku_id']
-        store = row['store_id']
-        shelf_days = row.get('shelf_life_days', 14)
-        predicted = row['predicted_sales']
-        stock = row['current_stock'] if pd.notna(row['current_stock']) else 0
+    # Store with max predicted sales per SKU is the reroute target
+    reroute = reroute_targets(pred_df)
 
-        if predicted > 0:
-            days_to_sell = stock / predicted * 14
-        else:
-            days_to_sell = float('inf')
-
-        days_left = shelf_days
-        gap = days_left - days_to_sell
-
-        # Default extra fields
-        target_store_id = ''
-        bundle_with_sku = ''
-
-        if days_to_sell < days_left and gap >= 15:
-            action = 'keep_on_shelf_and_restock'
-            restock_amt = max(0, predicted*2 - stock)
-            action_plan.append({
-                'store_id': store, 'sku_id': sku, 'action': action, 'restock': int(restock_amt),
-                'target_store_id': target_store_id, 'bundle_with_sku': bundle_with_sku
-            })
-
-        elif 8 < gap < 15:
-            action = 'reroute_to_high_demand_store'
-            target_row = reroute_targets[(reroute_targets['sku_id']==sku) & (reroute_targets['target_store_id'] != store)]
-            if not target_row.empty:
-                target_store_id = target_row.iloc[0]['target_store_id']
-            action_plan.append({
-                'store_id': store, 'sku_id': sku, 'action': action, 'restock': '',
-                'target_store_id': target_store_id, 'bundle_with_sku': bundle_with_sku
-            })
-
-        elif 6 < gap <= 8:
-            action = 'clearance_sale_tier1_30_50'
-            keep_skus = [x['sku_id'] for x in action_plan if x['store_id']==store and x['action']=='keep_on_shelf_and_restock']
-            if keep_skus:
-                bundle_with_sku = keep_skus[0]
-            action_plan.append({
-                'store_id': store, 'sku_id': sku, 'action': action, 'restock': '',
-                'target_store_id': target_store_id, 'bundle_with_sku': bundle_with_sku
-            })
-
-        elif 4 < days_left - days_to_sell <= 6:
-            action = 'flash_sale_tier2_80_90'
-            keep_skus = [x['sku_id'] for x in action_plan if x['store_id']==store and x['action']=='keep_on_shelf_and_restock']
-            if keep_skus:
-                bundle_with_sku = keep_skus[0]
-            action_plan.append({
-                'store_id': store, 'sku_id': sku, 'action': action, 'restock': '',
-                'target_store_id': target_store_id, 'bundle_with_sku': bundle_with_sku
-            })
+    start = time.perf_counter()
+    action_df = decide_actions(merged, reroute, sell_factor)
+    print(f"⚡ Decided {len(action_df)} actions in {time.perf_counter() - start:.2f}s")
+    return finish_plan(merged, action_df, stores_df)
 
-        else:
-            action = 'donate'
-            action_plan.append({
-                'store_id': store, 'sku_id': sku, 'action': action, 'restock': '',
-                'target_store_id': target_store_id, 'bundle_with_sku': bundle_with_sku
-            })
-
-    action_df = pd.DataFrame(action_plan)
+def finish_plan(merged, action_df, stores_df):
+    """
+    Plan reroute transfers across all stores and save the action plan.
+    """
+    if REROUTE_MODE == 'optimize':
+        # Surplus of reroute rows goes to keep stores short of stock at least transport cost
+        store_geo = dict(zip(stores_df['store_id'].astype(str), stores_df['geo']))
+        transfers = plan_reroutes(merged, action_df, store_geo)
+        action_df = apply_transfers(action_df, transfers)
+        transfers.to_csv('reroute_plan.csv', index=False)
+        print("✅ Saved reroute transfers to reroute_plan.csv")
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     action_df.to_csv(f'actionplan.csv', index=False)
     print(f"✅ Saved action plan to actionplan.csv")
@@ -0,0 +1,203 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from decision_engine import RESTOCK_MULTIPLIER
+
+# Load env vars
+load_dotenv()
+
+# optimize (default): min-cost surplus -> deficit transfers | top_store: per-SKU idxmax store
+REROUTE_MODE = os.getenv("REROUTE_MODE", "optimize")
+REROUTE_SAME_GEO_COST = float(os.getenv("REROUTE_SAME_GEO_COST", "1"))
+REROUTE_CROSS_GEO_COST = float(os.getenv("REROUTE_CROSS_GEO_COST", "3"))
+REROUTE_UNIT_VALUE = float(os.getenv("REROUTE_UNIT_VALUE", "10"))  # saved by moving a unit instead of wasting it
+REROUTE_MAX_UNITS = int(os.getenv("REROUTE_MAX_UNITS", "0"))  # inbound cap per (store, sku), 0 = restock need only
+
+TRANSFER_COLUMNS = ['sku_id', 'from_store_id', 'to_store_id', 'units']
+
+def geo_cost(src_geo, dst_geo):
+    """
+    Transport cost per unit between stores of two geo classes.
+    """
+    return np.where(np.asarray(src_geo) == np.asarray(dst_geo), REROUTE_SAME_GEO_COST, REROUTE_CROSS_GEO_COST)
+
+def supply_and_demand(merged, action_df, restock_multiplier=RESTOCK_MULTIPLIER, max_units=REROUTE_MAX_UNITS):
+    """
+    Senders are reroute rows with stock above restock_multiplier x predicted
+    sales; receivers are keep rows that need a restock, capped at max_units.
+    Both come back as (sku_id, store_id, units) frames with integer units.
+    """
+    predicted = merged['predicted_sales'].to_numpy(dtype=np.float64)
+    stock = np.nan_to_num(merged['current_stock'].to_numpy(dtype=np.float64))
+    surplus = np.floor(np.maximum(0, stock - predicted * restock_multiplier))
+
+    action = action_df['action'].to_numpy()
+    restock = pd.to_numeric(action_df['restock'], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+    if max_units > 0:
+        restock = np.minimum(restock, max_units)
+
+    send = (action == 'reroute_to_high_demand_store') & (surplus > 0)
+    receive = (action == 'keep_on_shelf_and_restock') & (restock > 0)
+    sources = pd.DataFrame({'sku_id': action_df['sku_id'].to_numpy()[send],
+                            'store_id': action_df['store_id'].to_numpy()[send],
+                            'units': surplus[send].astype(np.int64)})
+    sinks = pd.DataFrame({'sku_id': action_df['sku_id'].to_numpy()[receive],
+                          'store_id': action_df['store_id'].to_numpy()[receive],
+                          'units': restock[receive].astype(np.int64)})
+    return sources, sinks
+
+def solve_geo_flows(sources, sinks, unit_value=REROUTE_UNIT_VALUE):
+    """
+    Min-cost transportation for all SKUs at once, aggregated to geo classes
+    (costs only depend on the pair of classes, so store-level flows with the
+    same class totals cost the same). One sparse LP solved with HiGHS; each
+    moved unit earns unit_value, so lanes costing more than that stay unused.
+    Returns (sku_id, src_geo, dst_geo, units).
+    """
+    from scipy.optimize import linprog
+    from scipy.sparse import coo_matrix
+
+    supply = sources.groupby(['sku_id', 'geo'], sort=False, observed=True)['units'].sum().reset_index()
+    demand = sinks.groupby(['sku_id', 'geo'], sort=False, observed=True)['units'].sum().reset_index()
+    supply['row'] = np.arange(len(supply))
+    demand['row'] = len(supply) + np.arange(len(demand))
+
+    lanes = supply.merge(demand, on='sku_id', suffixes=('_src', '_dst'))
+    lanes['gain'] = geo_cost(lanes['geo_src'], lanes['geo_dst']) - unit_value
+    lanes = lanes[lanes['gain'] < 0].reset_index(drop=True)
+    if lanes.empty:
+        return pd.DataFrame(columns=['sku_id', 'src_geo', 'dst_geo', 'units'])
+
+    n = len(lanes)
+    cols = np.arange(n)
+    A = coo_matrix((np.ones(2 * n), (np.concatenate([lanes['row_src'], lanes['row_dst']]),
+                                      np.concatenate([cols, cols]))),
+                   shape=(len(supply) + len(demand), n)).tocsr()
+    b = np.concatenate([supply['units'], demand['units']]).astype(np.float64)
+    result = linprog(lanes['gain'].to_numpy(), A_ub=A, b_ub=b, bounds=(0, None), method='highs')
+    if result.status != 0:
+        raise RuntimeError(f"Reroute LP failed: {result.message}")
+
+    # Transportation LPs with integer totals have integer optimal vertices
+    lanes['units'] = np.rint(result.x).astype(np.int64)
+    lanes = lanes[lanes['units'] > 0]
+    return lanes.rename(columns={'geo_src': 'src_geo', 'geo_dst': 'dst_geo'})[
+        ['sku_id', 'src_geo', 'dst_geo', 'units']].reset_index(drop=True)
+
+def _match(flow, src_group, src_units, dst_group, dst_units):
+    """
+    Northwest-corner split of flow[g] units of every group g between its
+    senders and receivers, vectorized over groups by laying them end to end
+    on one line. Inputs are sorted by group. Returns (src_pos, dst_pos, units).
+    """
+    base = np.cumsum(flow) - flow
+
+    def ends(group, units):
+        cum = pd.Series(units).groupby(group).cumsum().to_numpy()
+        return base[group] + np.minimum(cum, flow[group])
+
+    src_ends, dst_ends = ends(src_group, src_units), ends(dst_group, dst_units)
+    points = np.union1d(src_ends, dst_ends)
+    starts = np.concatenate([[0], points[:-1]])
+    size = points - starts
+    keep = size > 0
+    starts, size = starts[keep], size[keep]
+    return (np.searchsorted(src_ends, starts, side='right'),
+            np.searchsorted(dst_ends, starts, side='right'), size)
+
+def disaggregate(flows, sources, sinks):
+    """
+    Turn geo-class flows into store-to-store transfers, largest senders and
+    receivers first, one (src geo, dst geo) lane at a time so a store's
+    remaining units carry over to its next lane.
+    """
+    src_left = sources['units'].to_numpy(dtype=np.int64).copy()
+    dst_left = sinks['units'].to_numpy(dtype=np.int64).copy()
+    parts = []
+    for (src_geo, dst_geo), lane in flows.groupby(['src_geo', 'dst_geo'], sort=False):
+        skus = lane['sku_id'].to_numpy()
+        flow = lane['units'].to_numpy(dtype=np.int64)
+        code = pd.Series(np.arange(len(skus)), index=skus)
+
+        src = np.flatnonzero((sources['geo'].to_numpy() == src_geo) & (src_left > 0)
+                             & sources['sku_id'].isin(skus).to_numpy())
+        dst = np.flatnonzero((sinks['geo'].to_numpy() == dst_geo) & (dst_left > 0)
+                             & sinks['sku_id'].isin(skus).to_numpy())
+        src_group = code[sources['sku_id'].to_numpy()[src]].to_numpy()
+        dst_group = code[sinks['sku_id'].to_numpy()[dst]].to_numpy()
+        order = np.lexsort((-src_left[src], src_group))
+        src, src_group = src[order], src_group[order]
+        order = np.lexsort((-dst_left[dst], dst_group))
+        dst, dst_group = dst[order], dst_group[order]
+
+        # Never split more than both sides still hold
+        flow = np.minimum(flow, np.minimum(np.bincount(src_group, src_left[src], len(flow)),
+                                           np.bincount(dst_group, dst_left[dst], len(flow))).astype(np.int64))
+        i, j, units = _match(flow, src_group, src_left[src], dst_group, dst_left[dst])
+        i, j = src[i], dst[j]
+        np.subtract.at(src_left, i, units)
+        np.subtract.at(dst_left, j, units)
+        parts.append(pd.DataFrame({'sku_id': sources['sku_id'].to_numpy()[i],
+                                   'from_store_id': sources['store_id'].to_numpy()[i],
+                                   'to_store_id': sinks['store_id'].to_numpy()[j],
+                                   'units': units}))
+
+    if not parts:
+        return pd.DataFrame(columns=TRANSFER_COLUMNS)
+    transfers = pd.concat(parts, ignore_index=True)
+    return transfers.groupby(['sku_id', 'from_store_id', 'to_store_id'], sort=False,
+                             as_index=False)['units'].sum()
+
+def plan_reroutes(merged, action_df, store_geo, restock_multiplier=RESTOCK_MULTIPLIER):
+    """
+    Store-to-store transfers for every SKU moving reroute surplus to keep
+    stores short of stock at minimum transport cost. store_geo maps
+    store_id -> geo class; unknown stores get their own class.
+    """
+    sources, sinks = supply_and_demand(merged, action_df, restock_multiplier)
+    geo = pd.Series(store_geo).astype(str)
+    sources['geo'] = sources['store_id'].map(geo).fillna('unknown').to_numpy()
+    sinks['geo'] = sinks['store_id'].map(geo).fillna('unknown').to_numpy()
+
+    start = time.perf_counter()
+    flows = solve_geo_flows(sources, sinks)
+    transfers = disaggregate(flows, sources, sinks)
+    elapsed = time.perf_counter() - start
+
+    moved = int(transfers['units'].sum()) if len(transfers) else 0
+    print(f"🚚 Reroute plan: {moved} of {int(sources['units'].sum())} surplus units moved in "
+          f"{len(transfers)} transfers ({sources['sku_id'].nunique()} SKUs), solved in {elapsed:.2f}s")
+    return transfers
+
+def apply_transfers(action_df, transfers):
+    """
+    Set each reroute row's target_store_id to the store receiving most of its
+    units; reroute rows without a transfer keep no target.
+    """
+    action_df = action_df.copy()
+    is_reroute = (action_df['action'] == 'reroute_to_high_demand_store').to_numpy()
+    main = transfers.sort_values('units', ascending=False, kind='stable').drop_duplicates(['sku_id', 'from_store_id'])
+    main = main.set_index(['sku_id', 'from_store_id'])['to_store_id']
+    keys = pd.MultiIndex.from_arrays([action_df['sku_id'][is_reroute], action_df['store_id'][is_reroute]])
+    target = action_df['target_store_id'].to_numpy(dtype=object).copy()
+    target[is_reroute] = pd.Series(main.reindex(keys).to_numpy()).fillna('').to_numpy(dtype=object)
+    action_df['target_store_id'] = target
+    return action_df
+
+def benchmark(n_stores=3000, n_skus=200, geos=('hills', 'plains', 'beach')):
+    """
+    Plan reroutes for a synthetic fleet of n_stores x n_skus rows.
+    """
+    from decision_engine import synthetic_merged, reroute_targets, decide_actions
+
+    merged = synthetic_merged(n_stores, n_skus)
+    action_df = decide_actions(merged, reroute_targets(merged))
+    rng = np.random.default_rng(1)
+    store_geo = dict(zip(np.arange(n_stores).astype(str), rng.choice(geos, n_stores)))
+    transfers = plan_reroutes(merged, action_df, store_geo)
+    return transfers
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,163 @@
+import os
+import sys
+import json
+import time
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from decision_engine import (ACTIONS, KEEP_GAP, REROUTE_GAP, CLEARANCE_GAP, FLASH_GAP, RESTOCK_MULTIPLIER,
+                             days_and_gap, classify)
+
+# Load env vars
+load_dotenv()
+
+SCENARIO_WORKERS = int(os.getenv("SCENARIO_WORKERS", "0")) or os.cpu_count()
+
+# Current policy; every scenario overrides some of these
+BASE_SCENARIO = {
+    'keep_gap': KEEP_GAP, 'reroute_gap': REROUTE_GAP, 'clearance_gap': CLEARANCE_GAP, 'flash_gap': FLASH_GAP,
+    'restock_multiplier': RESTOCK_MULTIPLIER, 'horizon': 14,
+    'clearance_uplift': 1.5, 'flash_uplift': 3.0,  # assumed demand lift of the markdown tiers
+}
+DEFAULT_GRID = {'keep_gap': [12, 15, 18], 'reroute_gap': [8, 10], 'restock_multiplier': [1.5, 2, 3],
+                'horizon': [7, 14]}
+ACTION_SHORT = ['keep', 'reroute', 'clearance', 'flash', 'donate']
+GAP_ORDER = ['keep_gap', 'reroute_gap', 'clearance_gap', 'flash_gap']
+
+def expand_grid(grid=DEFAULT_GRID):
+    """
+    Scenarios from a grid: a dict of value lists (cartesian product) or a
+    list of dicts. Unset settings come from BASE_SCENARIO. Raises ValueError
+    unless keep_gap > reroute_gap > clearance_gap > flash_gap in every
+    scenario; otherwise a rule band is empty and its rows silently move on.
+    """
+    if isinstance(grid, dict):
+        keys = list(grid)
+        grid = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    scenarios = [dict(BASE_SCENARIO, **scenario) for scenario in grid]
+    bad = [s for s in scenarios if not all(s[a] > s[b] for a, b in zip(GAP_ORDER, GAP_ORDER[1:]))]
+    if bad:
+        gaps = ', '.join(str({k: s[k] for k in GAP_ORDER}) for s in bad[:3])
+        raise ValueError(f"{len(bad)} scenarios break keep_gap > reroute_gap > clearance_gap > flash_gap: {gaps}")
+    return scenarios
+
+def scenario_arrays(merged, sell_factor=1):
+    """
+    Per-row arrays every scenario shares; daily is predicted units per day.
+    """
+    predicted, stock, shelf_days, days_to_sell, gap = days_and_gap(merged, sell_factor)
+    return {'predicted': predicted, 'stock': stock, 'shelf_days': shelf_days, 'days_to_sell': days_to_sell,
+            'gap': gap, 'daily': predicted / sell_factor, 'sell_factor': sell_factor}
+
+def scenario_days(arrays, horizon):
+    """
+    (days_to_sell, gap, daily) for a scenario horizon. With sell_factor 1
+    predictions are already per day and the horizon only sets the stockout
+    window; otherwise the sell factor is the horizon that predicted_sales
+    covers, so the scenario horizon replaces it.
+    """
+    if arrays['sell_factor'] == 1:
+        return arrays['days_to_sell'], arrays['gap'], arrays['daily']
+    predicted = arrays['predicted']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_to_sell = np.where(predicted > 0, arrays['stock'] / predicted * horizon, np.inf)
+    return days_to_sell, arrays['shelf_days'] - days_to_sell, predicted / horizon
+
+def evaluate(arrays, scenario):
+    """
+    Action counts and projected units for one scenario: keep rows add their
+    restock, reroute rows ship their surplus out, markdown rows sell at the
+    uplifted rate and donate rows clear the shelf. Waste is on-hand stock
+    still unsold at the end of its shelf life; stockout is predicted demand
+    over the horizon that on-hand stock does not cover. Rerouted units are
+    counted as moved, not resold.
+    """
+    predicted, stock = arrays['predicted'], arrays['stock']
+    shelf_days = np.nan_to_num(arrays['shelf_days'])
+    horizon = scenario['horizon']
+    days_to_sell, gap, daily = scenario_days(arrays, horizon)
+    choice = classify(days_to_sell, arrays['shelf_days'], gap, scenario['keep_gap'],
+                      scenario['reroute_gap'], scenario['clearance_gap'], scenario['flash_gap'])
+
+    target = predicted * scenario['restock_multiplier']
+    restock = np.where(choice == 0, np.trunc(np.maximum(0, target - stock)), 0)
+    moved = np.where(choice == 1, np.floor(np.maximum(0, stock - target)), 0)
+    donated = np.where(choice == 4, stock, 0)
+    on_hand = stock + restock - moved - donated
+
+    uplift = np.select([choice == 2, choice == 3], [scenario['clearance_uplift'], scenario['flash_uplift']], 1.0)
+    rate = daily * uplift
+    waste = np.maximum(0, on_hand - rate * shelf_days)
+    stockout = np.maximum(0, daily * horizon - np.minimum(on_hand, rate * np.minimum(shelf_days, horizon)))
+
+    row = dict(scenario)
+    row.update(zip(ACTION_SHORT, np.bincount(choice, minlength=len(ACTIONS)).tolist()))
+    row.update({'restock_units': restock.sum(), 'reroute_units': moved.sum(), 'donated_units': donated.sum(),
+                'waste_units': waste.sum(), 'stockout_units': stockout.sum()})
+    return row
+
+_arrays = None
+
+def _init_worker(arrays):
+    global _arrays
+    _arrays = arrays
+
+def _evaluate_worker(scenario):
+    return evaluate(_arrays, scenario)
+
+def evaluate_grid(merged, sell_factor=1, scenarios=None, workers=SCENARIO_WORKERS):
+    """
+    Evaluate every scenario on the same predictions and stock, spread over a
+    process pool. Each worker receives the shared arrays once. Returns one
+    row per scenario.
+    """
+    scenarios = expand_grid() if scenarios is None else scenarios
+    arrays = scenario_arrays(merged, sell_factor)
+    workers = max(1, min(workers, len(scenarios)))
+
+    start = time.perf_counter()
+    if workers == 1:
+        rows = [evaluate(arrays, scenario) for scenario in scenarios]
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(arrays,)) as pool:
+            rows = list(pool.map(_evaluate_worker, scenarios,
+                                 chunksize=max(1, len(scenarios) // (workers * 4))))
+    elapsed = time.perf_counter() - start
+    print(f"⚖️ Evaluated {len(scenarios)} scenarios on {len(merged)} rows with {workers} workers "
+          f"in {elapsed:.2f}s")
+
+    table = pd.DataFrame(rows)
+    units = ['restock_units', 'reroute_units', 'donated_units', 'waste_units', 'stockout_units']
+    table[units] = table[units].round().astype(np.int64)
+    return table
+
+def print_table(table):
+    """
+    Compact view: the settings that vary, action counts and projected units.
+    """
+    varying = [k for k in BASE_SCENARIO if table[k].nunique() > 1]
+    columns = varying + ACTION_SHORT + ['restock_units', 'reroute_units', 'donated_units', 'waste_units',
+                                        'stockout_units']
+    print(table[columns].to_string(index=False))
+
+if __name__ == "__main__":
+    # python scenarios.py [grid.json] [--synthetic]
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    scenarios = None
+    if args:
+        with open(args[0]) as f:
+            scenarios = expand_grid(json.load(f))
+
+    if '--synthetic' in sys.argv:
+        from decision_engine import synthetic_merged
+        merged, sell_factor = synthetic_merged(2000, 500), 1
+    else:
+        from expiry_and_action import load_plan_inputs
+        _, merged, _, sell_factor = load_plan_inputs()
+
+    table = evaluate_grid(merged, sell_factor, scenarios)
+    print_table(table)
+    table.to_csv('scenarios.csv', index=False)
+    print("✅ Saved scenario table to scenarios.csv")
@@ -0,0 +1,121 @@
+import os
+import time
+from datetime import datetime
+from functools import partial
+import numpy as np
+import pandas as pd
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+import expiry_and_action
+from expiry_and_action import get_supabase_conn, load_plan_inputs, finish_plan
+import lstm_utils  # on sys.path via expiry_and_action
+from lstm_utils import fit_scaler, iter_sales_data
+from model_registry import current_artifacts
+from forecast import recent_step_days
+from decision_engine import decide_actions, reroute_targets, top_store_targets
+
+# Load env vars
+load_dotenv()
+
+ABC_WORKERS = int(os.getenv("ABC_WORKERS", "0")) or os.cpu_count()
+
+NO_TARGETS = pd.DataFrame(columns=['sku_id', 'target_store_id'])
+
+def shard_stores(n_shards):
+    """
+    Split the store_ids into n_shards contiguous ranges, so the merged plan
+    keeps the single-process (store, sku) row order.
+    """
+    conn = get_supabase_conn()
+    store_ids = pd.read_sql("SELECT store_id FROM stores ORDER BY store_id", conn)['store_id'].astype(str)
+    conn.close()
+    return [list(shard) for shard in np.array_split(store_ids.to_numpy(), n_shards) if len(shard)]
+
+def _init_worker(forecast_mode=None):
+    # The coordinator already brought the sales cache up to date
+    lstm_utils._cache_synced = True
+    if forecast_mode is not None:
+        expiry_and_action.FORECAST_MODE = forecast_mode
+
+def fleet_inputs():
+    """
+    Scaler and row spacing shared by every shard, worked out once here: a
+    legacy model without a saved scaler would otherwise have every worker
+    stream the whole fleet to refit it, and per-shard spacings could roll
+    shards forward by different steps.
+    """
+    scaler = None
+    artifacts = current_artifacts()
+    if (expiry_and_action.FORECAST_MODE != 'baseline' and artifacts is not None
+            and not os.path.exists(artifacts['scaler_file'])):
+        print("📦 Fitting the legacy scaler once for all shards...")
+        scaler, n_rows = fit_scaler(iter_sales_data(2021, datetime.utcnow().year))
+        print(f"✅ Streamed {n_rows} rows from sales_data")
+    step = recent_step_days()
+    print(f"📏 Sales rows are {step} day(s) apart")
+    return scaler, step
+
+def run_shard(stores, scaler=None, step=None):
+    """
+    Worker: stream, predict and decide for one shard of stores. Reroute
+    targets need every store, so they are left to the coordinator. A failed
+    forecast raises rather than falling back in this shard alone.
+    """
+    start = time.perf_counter()
+    pred_df, merged, _, sell_factor = load_plan_inputs(scaler=scaler, stores=stores, strict=True, step=step)
+    action_df = decide_actions(merged, NO_TARGETS, sell_factor)
+    return pred_df[['store_id', 'sku_id', 'predicted_sales']], merged, action_df, time.perf_counter() - start
+
+def run_shards(shards, workers, forecast_mode=None, scaler=None, step=None):
+    """
+    run_shard over every shard on a process pool; the first shard error is
+    raised here once the pool shuts down. forecast_mode overrides
+    FORECAST_MODE in the workers.
+    """
+    # spawn: TensorFlow state does not survive fork
+    with ProcessPoolExecutor(workers, mp_context=get_context('spawn'), initializer=_init_worker,
+                             initargs=(forecast_mode,)) as pool:
+        return list(pool.map(partial(run_shard, scaler=scaler, step=step), shards))
+
+def run_sharded_abc_logic(n_shards, workers=ABC_WORKERS):
+    """
+    Build the action plan with stores split across a process pool, then
+    merge the shard plans and resolve reroute targets across stores.
+    """
+    if lstm_utils.SALES_CACHE:
+        lstm_utils.update_sales_cache()
+    shards = shard_stores(n_shards)
+    scaler, step = fleet_inputs()
+    workers = max(1, min(workers, len(shards)))
+    print(f"🚀 Running {len(shards)} store shards on {workers} workers")
+
+    start = time.perf_counter()
+    try:
+        results = run_shards(shards, workers, scaler=scaler, step=step)
+    except Exception as e:
+        if expiry_and_action.FORECAST_MODE == 'baseline':
+            raise
+        # Fall back for the whole fleet, never for some shards only
+        print(f"⚠️ LSTM forecast failed in a shard ({e}), rerunning every shard on the baseline forecaster")
+        results = run_shards(shards, workers, forecast_mode='baseline', step=step)
+    elapsed = time.perf_counter() - start
+    busy = sum(r[3] for r in results)
+    print(f"⏱ Shards done in {elapsed:.1f}s ({busy:.1f}s of worker time, {busy / max(elapsed, 1e-9):.1f}x parallel)")
+
+    pred_df = pd.concat([r[0] for r in results], ignore_index=True)
+    merged = pd.concat([r[1] for r in results], ignore_index=True)
+    action_df = pd.concat([r[2] for r in results], ignore_index=True)
+
+    # Cross-store step: each SKU's top store over the whole fleet
+    is_reroute = (action_df['action'] == 'reroute_to_high_demand_store').to_numpy()
+    target = action_df['target_store_id'].to_numpy(dtype=object).copy()
+    target[is_reroute] = top_store_targets(action_df['store_id'].to_numpy()[is_reroute],
+                                           action_df['sku_id'].to_numpy()[is_reroute],
+                                           reroute_targets(pred_df))
+    action_df['target_store_id'] = target
+
+    conn = get_supabase_conn()
+    stores_df = pd.read_sql("SELECT store_id, geo FROM stores", conn)
+    conn.close()
+    return finish_plan(merged, action_df, stores_df)
@@ -1,15 +1,23 @@
 from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
 from supabase import create_client, Client
-import subprocess, os, markdown, re
+import subprocess, os, sys, markdown, re
+from typing import List
 from dotenv import load_dotenv
 import os
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 load_dotenv(os.path.join(BASE_DIR, ".env"))
 
+# Model code lives next to the pipeline scripts
+sys.path.append(os.path.join(BASE_DIR, "lstm_project"))
+sys.path.append(os.path.join(BASE_DIR, "abc_engine"))
+from model_service import ModelService, PredictionBatcher
+
 app = FastAPI()  # ✅ Only once!
 templates = Jinja2Templates(directory="backend/templates")
 app.mount("/static", StaticFiles(directory="backend/static"), name="static")
@@ -18,6 +26,27 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# ✅ Warm model: loaded once, hot-swapped when the registry's current version changes
+model_service = ModelService()
+batcher = PredictionBatcher(model_service)
+
+
+class PredictRequest(BaseModel):
+    # raw (unscaled) windows: [n][window_size][features]
+    windows: List[List[List[float]]]
+
+
+@app.on_event("startup")
+async def startup():
+    await run_in_threadpool(model_service.start)
+    await batcher.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    model_service.stop()
+    await batcher.stop()
+
 
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
@@ -46,19 +75,61 @@ async def loading(request: Request):
     return templates.TemplateResponse("loading.html", {"request": request})
 
 
+def run_processing():
+    base = os.path.dirname(__file__)
+    subprocess.run(["python", os.path.join(base, "lstm_project", "auto_update_autodb.py")], check=True)
+    subprocess.run(["python", os.path.join(base, "lstm_project", "retrain_lstm_if_needed.py")], check=True)
+    # Pick up a retrained model right away instead of waiting for the watcher
+    model_service.reload_if_changed()
+    # ABC logic runs in-process on the warm model, sharing the batched predictor.
+    # One snapshot, so a reload mid-run can't mix predictions, scaler and cache version
+    from expiry_and_action import run_abc_logic
+    snap = model_service.current
+    if snap is None:
+        run_abc_logic()
+    else:
+        run_abc_logic(predict=lambda X: batcher.predict_threadsafe(X, snap.model), scaler=snap.scaler,
+                      version=snap.version, window_size=snap.window_size)
+    subprocess.run(["python", os.path.join(base, "abc_engine", "create_store_reports.py")], check=True)
+
+
 @app.post("/start-processing")
 async def start_processing():
     try:
-        base = os.path.dirname(__file__)
-        subprocess.run(["python", os.path.join(base, "lstm_project", "auto_update_autodb.py")], check=True)
-        subprocess.run(["python", os.path.join(base, "lstm_project", "retrain_lstm_if_needed.py")], check=True)
-        subprocess.run(["python", os.path.join(base, "abc_engine","expiry_and_action.py")], check=True)
-        subprocess.run(["python", os.path.join(base, "abc_engine", "create_store_reports.py")], check=True)
-    except subprocess.CalledProcessError:
+        await run_in_threadpool(run_processing)
+    except Exception as e:
+        print(f"⚠️ Processing failed: {e}")
         return {"detail": "Failed to generate reports"}
     return RedirectResponse(url="/dashboard", status_code=303)
 
 
+@app.post("/predict")
+async def predict(req: PredictRequest):
+    if model_service.model is None or model_service.scaler is None:
+        return JSONResponse({"detail": "Model not loaded"}, status_code=503)
+    # Shape is checked before enqueueing: a bad request must not fail the coalesced batch
+    try:
+        X = model_service.scale_windows(req.windows)
+    except ValueError as e:
+        return JSONResponse({"detail": f"Bad windows: {e}"}, status_code=422)
+    preds = await batcher.predict(X)
+    return {
+        "predicted_sales_scaled": preds.tolist(),
+        "predicted_sales": model_service.unscale_sold(preds).tolist(),
+    }
+
+
+@app.get("/model")
+async def model_info():
+    return {
+        "loaded": model_service.model is not None,
+        "version": model_service.version,
+        "window_size": model_service.window_size,
+        "reloads": model_service.reloads,
+        "batching": batcher.stats,
+    }
+
+
 @app.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request):
     stores = supabase.table("stores").select("store_id, geo, religion").execute().data
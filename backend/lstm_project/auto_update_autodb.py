@@ -5,6 +5,12 @@ import requests
 from tqdm import tqdm
 from dotenv import load_dotenv
 import os
+import threading
+import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extras import execute_values
 
 load_dotenv()
 
@@ -25,6 +31,24 @@ TGT_DB = {
     'port': os.getenv('TGT_DB_PORT')
 }
 
+# "row" keeps the per-row INSERT path, "bulk" streams tables with COPY,
+# "parallel" copies sales_data partitions concurrently with checkpoints,
+# "series" upserts only changed (store_id, sku_id) series
+SYNC_MODE = os.getenv('SYNC_MODE', 'row')
+
+SALES_COLUMNS = [
+    "store_id", "sku_id", "year", "day", "date", "type_of_day",
+    "initial", "sold", "returns", "donations", "reroutes_in", "reroutes_out", "recycled", "final"
+]
+SALES_PK = "store_id, sku_id, year, day"
+
+# --- Parallel partitioned sync config ---
+SYNC_WORKERS = int(os.getenv('SYNC_WORKERS', '4'))
+SYNC_STORES_PER_PARTITION = int(os.getenv('SYNC_STORES_PER_PARTITION', '50'))
+
+# --- Per-series sync config ---
+SYNC_SERIES_BATCH = int(os.getenv('SYNC_SERIES_BATCH', '5000'))
+
 def get_today_date_from_ip():
     try:
         resp = requests.get("https://ipapi.co/json/")
@@ -90,12 +114,522 @@ def copy_sales_data_incremental(src_cur, tgt_cur):
         tgt_cur.execute(sql, row)
     print(f"✅ Done copying incremental sales_data")
 
+# --- Bulk (COPY) sync ---
+
+def _copy_out(src_conn, copy_sql, write_fd, errors):
+    """
+    Run COPY ... TO STDOUT on the source and write it into a pipe.
+    """
+    try:
+        with os.fdopen(write_fd, 'wb') as pipe, src_conn.cursor() as cur:
+            cur.copy_expert(copy_sql, pipe)
+    except Exception as e:
+        errors.append(e)
+
+def bulk_copy_table(src_conn, tgt_conn, table, columns, pk, where=None, params=None,
+                    label=None, before_commit=None, upsert=False):
+    """
+    Stream rows from src table into tgt table with COPY TO / COPY FROM.
+
+    Rows are piped straight from the source into a temp staging table and
+    merged with one INSERT ... SELECT, skipping duplicates by PK (or updating
+    rows that differ when upsert=True). The whole table is a single target
+    transaction; before_commit(tgt_cur, stats) runs inside it, right before
+    COMMIT.
+    """
+    label = label or table
+    print(f"🚚 Bulk copying: {label}")
+    started = time.perf_counter()
+    cols = ', '.join(columns)
+    staging = f"{table}_staging"
+
+    select_sql = f"SELECT {cols} FROM {table}"
+    if where:
+        select_sql += f" WHERE {where}"
+    with src_conn.cursor() as src_cur:
+        select_sql = src_cur.mogrify(select_sql, params).decode()
+
+    errors = []
+    writer = None
+    try:
+        with tgt_conn.cursor() as tgt_cur:
+            tgt_cur.execute(
+                f"CREATE TEMP TABLE {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+            read_fd, write_fd = os.pipe()
+            writer = threading.Thread(
+                target=_copy_out,
+                args=(src_conn, f"COPY ({select_sql}) TO STDOUT", write_fd, errors),
+                daemon=True
+            )
+            writer.start()
+            # Closing the read end on failure unblocks the writer thread
+            with os.fdopen(read_fd, 'rb') as pipe:
+                tgt_cur.copy_expert(f"COPY {staging} ({cols}) FROM STDIN", pipe)
+            writer.join()
+            if errors:
+                raise errors[0]
+
+            tgt_cur.execute(f"SELECT COUNT(*) FROM {staging}")
+            copied = tgt_cur.fetchone()[0]
+            if upsert:
+                pk_cols = [c.strip() for c in pk.split(',')]
+                updates = [c for c in columns if c not in pk_cols]
+                conflict_action = f"""DO UPDATE SET
+                    {', '.join(f'{c} = EXCLUDED.{c}' for c in updates)}
+                    WHERE ({', '.join(f'{table}.{c}' for c in updates)})
+                          IS DISTINCT FROM ({', '.join('EXCLUDED.' + c for c in updates)})"""
+            else:
+                conflict_action = "DO NOTHING"
+            tgt_cur.execute(f"""
+                INSERT INTO {table} ({cols})
+                SELECT {cols} FROM {staging}
+                ON CONFLICT ({pk}) {conflict_action}
+            """)
+            merged = tgt_cur.rowcount
+            if before_commit:
+                before_commit(tgt_cur, {'rows': copied, 'merged': merged, 'staging': staging})
+        tgt_conn.commit()
+    except Exception:
+        tgt_conn.rollback()
+        if writer is not None:
+            writer.join()
+        raise
+    finally:
+        # COPY TO opened a read transaction on the source; end it either way
+        src_conn.rollback()
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    rate = copied / elapsed
+    print(f"✅ Done: {label} — {copied} rows streamed, {merged} {'upserted' if upsert else 'new'}, "
+          f"{elapsed:.1f}s ({rate:,.0f} rows/s)")
+    return {'table': label, 'rows': copied, 'merged': merged,
+            'seconds': elapsed, 'rows_per_sec': rate}
+
+def bulk_copy_sales_data_incremental(src_conn, tgt_conn):
+    """
+    COPY-based variant of copy_sales_data_incremental.
+    """
+    with tgt_conn.cursor() as tgt_cur:
+        tgt_cur.execute("SELECT MAX(date) FROM sales_data")
+        max_date = tgt_cur.fetchone()[0]
+    tgt_conn.commit()
+
+    if max_date:
+        print(f"📦 Last copied date: {max_date} — copying new rows after this.")
+        return bulk_copy_table(src_conn, tgt_conn, "sales_data", SALES_COLUMNS, SALES_PK,
+                               where="date > %s", params=(max_date,))
+    print("📦 No data in target yet — copying all rows.")
+    return bulk_copy_table(src_conn, tgt_conn, "sales_data", SALES_COLUMNS, SALES_PK)
+
+def print_sync_report(stats):
+    """
+    Print per-table row counts and throughput of a bulk sync.
+    """
+    print("📊 Sync report:")
+    for s in stats:
+        print(f"   {s['table']:<12} {s['rows']:>12,} rows {s['merged']:>12,} new "
+              f"{s['seconds']:>8.1f}s {s['rows_per_sec']:>12,.0f} rows/s")
+
+def run_bulk_sync(src_conn, tgt_conn):
+    """
+    Copy small/static tables and incremental sales_data with COPY streaming.
+    """
+    stats = [
+        bulk_copy_table(src_conn, tgt_conn, "skus", ["sku_id", "name", "shelf_life_days"], pk="sku_id"),
+        bulk_copy_table(src_conn, tgt_conn, "stores", ["store_id", "geo", "religion"], pk="store_id"),
+        bulk_copy_table(src_conn, tgt_conn, "store_skus", ["store_id", "sku_id"], pk="store_id, sku_id"),
+        bulk_copy_sales_data_incremental(src_conn, tgt_conn),
+    ]
+    print_sync_report(stats)
+    return stats
+
+# --- Parallel partitioned sync ---
+
+def ensure_checkpoint_table(tgt_conn):
+    """
+    Create the per-partition checkpoint table on the target if missing.
+    """
+    with tgt_conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS sync_checkpoints (
+                partition_key TEXT PRIMARY KEY,
+                year INTEGER,
+                store_lo TEXT,
+                store_hi TEXT,
+                status TEXT,
+                src_rows BIGINT,
+                watermark DATE,
+                rows_copied BIGINT,
+                updated_at TIMESTAMPTZ DEFAULT now()
+            )
+        """)
+    tgt_conn.commit()
+
+def plan_partitions(src_conn, stores_per_partition=SYNC_STORES_PER_PARTITION):
+    """
+    Split source sales_data into (year, store_id range) partitions.
+
+    Each partition carries a fingerprint (row count, max date) taken from the
+    source, so a partition whose rows changed since its last checkpoint -
+    including late rows for earlier dates - is picked up again.
+    """
+    with src_conn.cursor() as cur:
+        # "C" collation keeps Postgres ordering in line with Python string comparison
+        cur.execute('SELECT store_id FROM stores ORDER BY store_id COLLATE "C"')
+        store_ids = [r[0] for r in cur.fetchall()]
+        cur.execute("""
+            SELECT year, store_id, COUNT(*), MAX(date)
+            FROM sales_data
+            GROUP BY year, store_id
+        """)
+        per_store = cur.fetchall()
+    src_conn.rollback()
+
+    ranges = [
+        (store_ids[i], store_ids[min(i + stores_per_partition, len(store_ids)) - 1])
+        for i in range(0, len(store_ids), stores_per_partition)
+    ]
+    lows = [lo for lo, _ in ranges]
+
+    partitions = {}
+    for year, store_id, n_rows, max_date in per_store:
+        idx = bisect_right(lows, store_id) - 1
+        if idx < 0 or store_id > ranges[idx][1]:
+            print(f"⚠️ store {store_id} has sales_data but no stores row; skipped")
+            continue
+        lo, hi = ranges[idx]
+        key = f"{year}:{lo}..{hi}"
+        part = partitions.setdefault(key, {
+            'key': key, 'year': year, 'store_lo': lo, 'store_hi': hi,
+            'src_rows': 0, 'watermark': None
+        })
+        part['src_rows'] += n_rows
+        if part['watermark'] is None or max_date > part['watermark']:
+            part['watermark'] = max_date
+    return sorted(partitions.values(), key=lambda p: p['key'])
+
+def pending_partitions(tgt_conn, partitions):
+    """
+    Drop partitions whose checkpoint is done with the same fingerprint.
+    """
+    with tgt_conn.cursor() as cur:
+        cur.execute("SELECT partition_key, status, src_rows, watermark FROM sync_checkpoints")
+        checkpoints = {r[0]: r[1:] for r in cur.fetchall()}
+    tgt_conn.commit()
+    return [
+        p for p in partitions
+        if checkpoints.get(p['key']) != ('done', p['src_rows'], p['watermark'])
+    ]
+
+def copy_partition(src_pool, tgt_pool, part):
+    """
+    Copy one (year, store range) partition and checkpoint it atomically.
+
+    The partition is marked running first; the done mark is written in the
+    same transaction as the merge, so a crash leaves it pending.
+    """
+    src_conn = src_pool.getconn()
+    tgt_conn = tgt_pool.getconn()
+    try:
+        with tgt_conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO sync_checkpoints (partition_key, year, store_lo, store_hi, status, updated_at)
+                VALUES (%s, %s, %s, %s, 'running', now())
+                ON CONFLICT (partition_key) DO UPDATE
+                SET status = 'running', updated_at = now()
+            """, (part['key'], part['year'], part['store_lo'], part['store_hi']))
+        tgt_conn.commit()
+
+        def mark_done(tgt_cur, stats):
+            tgt_cur.execute("""
+                UPDATE sync_checkpoints
+                SET status = 'done', src_rows = %s, watermark = %s,
+                    rows_copied = %s, updated_at = now()
+                WHERE partition_key = %s
+            """, (part['src_rows'], part['watermark'], stats['rows'], part['key']))
+
+        return bulk_copy_table(
+            src_conn, tgt_conn, "sales_data", SALES_COLUMNS, SALES_PK,
+            where='year = %s AND store_id COLLATE "C" BETWEEN %s AND %s',
+            params=(part['year'], part['store_lo'], part['store_hi']),
+            label=f"sales_data[{part['key']}]", before_commit=mark_done
+        )
+    finally:
+        src_pool.putconn(src_conn)
+        tgt_pool.putconn(tgt_conn)
+
+def run_parallel_sync(src_conn, tgt_conn, workers=SYNC_WORKERS):
+    """
+    Copy static tables, then sales_data partitions concurrently over a
+    connection pool. Finished partitions are checkpointed, so an interrupted
+    run resumes with only the unfinished or changed ones.
+    """
+    started = time.perf_counter()
+    stats = [
+        bulk_copy_table(src_conn, tgt_conn, "skus", ["sku_id", "name", "shelf_life_days"], pk="sku_id"),
+        bulk_copy_table(src_conn, tgt_conn, "stores", ["store_id", "geo", "religion"], pk="store_id"),
+        bulk_copy_table(src_conn, tgt_conn, "store_skus", ["store_id", "sku_id"], pk="store_id, sku_id"),
+    ]
+
+    ensure_checkpoint_table(tgt_conn)
+    partitions = plan_partitions(src_conn)
+    todo = pending_partitions(tgt_conn, partitions)
+    print(f"🧩 {len(partitions)} sales_data partitions, {len(todo)} to copy "
+          f"with {workers} workers.")
+
+    src_pool = ThreadedConnectionPool(1, workers, **SRC_DB)
+    tgt_pool = ThreadedConnectionPool(1, workers, **TGT_DB)
+    failed = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(copy_partition, src_pool, tgt_pool, p): p for p in todo}
+            for future in as_completed(futures):
+                part = futures[future]
+                try:
+                    stats.append(future.result())
+                except Exception as e:
+                    print(f"❌ Partition {part['key']} failed: {e}")
+                    failed.append(part['key'])
+    finally:
+        src_pool.closeall()
+        tgt_pool.closeall()
+
+    print_sync_report(stats)
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    total = sum(s['rows'] for s in stats)
+    print(f"📊 Total: {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+    if failed:
+        raise RuntimeError(f"{len(failed)} partitions failed and will be retried next run: {failed}")
+    return stats
+
+# --- Per-series change tracking ---
+
+def ensure_series_tables(tgt_conn):
+    """
+    Create the per-series watermark and changed-series manifest tables.
+    """
+    with tgt_conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS sync_series_watermarks (
+                store_id TEXT,
+                sku_id TEXT,
+                row_count BIGINT,
+                max_date DATE,
+                max_updated_at TIMESTAMPTZ,
+                checksum TEXT,
+                synced_at TIMESTAMPTZ,
+                PRIMARY KEY (store_id, sku_id)
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS sync_changed_series (
+                synced_at TIMESTAMPTZ,
+                store_id TEXT,
+                sku_id TEXT,
+                min_date DATE,
+                max_date DATE,
+                PRIMARY KEY (synced_at, store_id, sku_id)
+            )
+        """)
+    tgt_conn.commit()
+
+def source_has_updated_at(src_conn):
+    """
+    Check whether source sales_data carries an updated_at column.
+    """
+    with src_conn.cursor() as cur:
+        cur.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'sales_data' AND column_name = 'updated_at'
+        """)
+        found = cur.fetchone() is not None
+    src_conn.rollback()
+    return found
+
+def read_series_watermarks(tgt_conn):
+    """
+    Stored watermarks: {(store_id, sku_id): (row_count, max_date, max_updated_at, checksum)}.
+    """
+    with tgt_conn.cursor() as cur:
+        cur.execute("""
+            SELECT store_id, sku_id, row_count, max_date, max_updated_at, checksum
+            FROM sync_series_watermarks
+        """)
+        stored = {(r[0], r[1]): tuple(r[2:]) for r in cur.fetchall()}
+    tgt_conn.commit()
+    return stored
+
+def fetch_series_fingerprints(src_conn, use_updated_at, stored):
+    """
+    Return ({(store_id, sku_id): (row_count, max_date, max_updated_at, checksum)},
+    {(store_id, sku_id): (row_count, checksum)} of the rows up to the stored
+    max_date, or None with updated_at) for every series in source sales_data.
+
+    With an updated_at column the max timestamp identifies changes. Without
+    one the checksum is a sum of per-row md5 hashes, so one pass gives both
+    the whole-series value and the value over the rows the last sync already
+    copied; only those older rows need comparing to catch corrected values.
+    """
+    with src_conn.cursor() as cur:
+        if use_updated_at:
+            cur.execute("""
+                SELECT store_id, sku_id, COUNT(*), MAX(date), MAX(updated_at)::timestamptz, NULL
+                FROM sales_data
+                GROUP BY store_id, sku_id
+            """)
+            rows = cur.fetchall()
+        else:
+            cols = ', '.join(f"s.{c}" for c in SALES_COLUMNS)
+            known = list(stored)
+            cur.execute(f"""
+                SELECT store_id, sku_id, COUNT(*), MAX(date), NULL::timestamptz, SUM(h)::text,
+                       COUNT(*) FILTER (WHERE synced), (SUM(h) FILTER (WHERE synced))::text
+                FROM (
+                    SELECT s.store_id, s.sku_id, s.date, s.date <= w.max_date AS synced,
+                           ('x' || left(md5(ROW({cols})::text), 15))::bit(60)::bigint AS h
+                    FROM sales_data s
+                    LEFT JOIN unnest(%s::text[], %s::text[], %s::date[]) AS w(store_id, sku_id, max_date)
+                      ON w.store_id = s.store_id AND w.sku_id = s.sku_id
+                ) t
+                GROUP BY store_id, sku_id
+            """, ([k[0] for k in known], [k[1] for k in known], [stored[k][1] for k in known]))
+            rows = cur.fetchall()
+    src_conn.rollback()
+    fingerprints = {(r[0], r[1]): tuple(r[2:6]) for r in rows}
+    older = None if use_updated_at else {(r[0], r[1]): tuple(r[6:8]) for r in rows}
+    return fingerprints, older
+
+def changed_series(stored, fingerprints, older=None):
+    """
+    Compare source fingerprints with stored watermarks.
+    Returns [(store_id, sku_id, since)] for series that are new or changed,
+    where since is the previous max_updated_at (updated_at detection) or
+    max_date (checksum detection) to copy after, or None to copy the whole
+    series: new series, and series whose already-synced rows changed.
+    """
+    changed = []
+    for key, fp in fingerprints.items():
+        previous = stored.get(key)
+        if previous == fp:
+            continue
+        if previous is None:
+            since = None
+        elif older is None:
+            since = previous[2]
+        elif older.get(key) == (previous[0], previous[3]):
+            since = previous[1]
+        else:
+            since = None
+        changed.append((key[0], key[1], since))
+    return changed
+
+def copy_changed_series(src_conn, tgt_conn, batch, fingerprints, use_updated_at, synced_at):
+    """
+    Upsert the rows of one batch of changed series (only those after each
+    series' since, when set) and record their new watermarks and manifest
+    entries, with the date range actually copied, in the same transaction.
+    """
+    stores = [c[0] for c in batch]
+    skus = [c[1] for c in batch]
+    if use_updated_at:
+        # Only rows touched since the series' previous watermark
+        where = """EXISTS (
+            SELECT 1 FROM unnest(%s::text[], %s::text[], %s::timestamptz[]) AS c(store_id, sku_id, since)
+            WHERE c.store_id = sales_data.store_id AND c.sku_id = sales_data.sku_id
+              AND (c.since IS NULL OR sales_data.updated_at > c.since)
+        )"""
+        params = (stores, skus, [c[2] for c in batch])
+    else:
+        # Only rows after the series' previous max_date, unless its older rows changed
+        where = """EXISTS (
+            SELECT 1 FROM unnest(%s::text[], %s::text[], %s::date[]) AS c(store_id, sku_id, since)
+            WHERE c.store_id = sales_data.store_id AND c.sku_id = sales_data.sku_id
+              AND (c.since IS NULL OR sales_data.date > c.since)
+        )"""
+        params = (stores, skus, [c[2] for c in batch])
+
+    def record(tgt_cur, stats):
+        execute_values(tgt_cur, """
+            INSERT INTO sync_series_watermarks
+                (store_id, sku_id, row_count, max_date, max_updated_at, checksum, synced_at)
+            VALUES %s
+            ON CONFLICT (store_id, sku_id) DO UPDATE SET
+                row_count = EXCLUDED.row_count, max_date = EXCLUDED.max_date,
+                max_updated_at = EXCLUDED.max_updated_at, checksum = EXCLUDED.checksum,
+                synced_at = EXCLUDED.synced_at
+        """, [(c[0], c[1], *fingerprints[(c[0], c[1])], synced_at) for c in batch])
+        tgt_cur.execute(f"""
+            INSERT INTO sync_changed_series (synced_at, store_id, sku_id, min_date, max_date)
+            SELECT %s, store_id, sku_id, MIN(date), MAX(date)
+            FROM {stats['staging']}
+            GROUP BY store_id, sku_id
+            ON CONFLICT DO NOTHING
+        """, (synced_at,))
+
+    return bulk_copy_table(
+        src_conn, tgt_conn, "sales_data", SALES_COLUMNS, SALES_PK,
+        where=where, params=params, label=f"sales_data[{len(batch)} series]",
+        before_commit=record, upsert=True
+    )
+
+def run_series_sync(src_conn, tgt_conn, batch_size=SYNC_SERIES_BATCH):
+    """
+    Incremental sync keyed on per-(store_id, sku_id) watermarks.
+
+    Only series whose source fingerprint changed are copied, and of those only
+    the rows past their watermark unless already-synced rows were corrected;
+    upserts make corrected rows replace stale ones. Each run writes the series it touched
+    to sync_changed_series under one synced_at, for downstream stages.
+    """
+    stats = [
+        bulk_copy_table(src_conn, tgt_conn, "skus", ["sku_id", "name", "shelf_life_days"], pk="sku_id"),
+        bulk_copy_table(src_conn, tgt_conn, "stores", ["store_id", "geo", "religion"], pk="store_id"),
+        bulk_copy_table(src_conn, tgt_conn, "store_skus", ["store_id", "sku_id"], pk="store_id, sku_id"),
+    ]
+
+    ensure_series_tables(tgt_conn)
+    use_updated_at = source_has_updated_at(src_conn)
+    print(f"🔎 Change detection by {'updated_at' if use_updated_at else 'row checksum'}.")
+    stored = read_series_watermarks(tgt_conn)
+    fingerprints, older = fetch_series_fingerprints(src_conn, use_updated_at, stored)
+    changed = changed_series(stored, fingerprints, older)
+    full = sum(c[2] is None for c in changed)
+    print(f"📦 {len(changed)} of {len(fingerprints)} series changed since last sync ({full} copied in full).")
+
+    with tgt_conn.cursor() as cur:
+        cur.execute("SELECT now()")
+        synced_at = cur.fetchone()[0]
+    tgt_conn.commit()
+
+    for i in range(0, len(changed), batch_size):
+        batch = changed[i:i + batch_size]
+        stats.append(copy_changed_series(src_conn, tgt_conn, batch, fingerprints,
+                                         use_updated_at, synced_at))
+
+    print_sync_report(stats)
+    print(f"📝 Changed-series manifest written with synced_at={synced_at}")
+    return stats
+
 def main():
     today = get_today_date_from_ip()
 
     print("🔗 Connecting to source and target DBs...")
     src_conn = psycopg2.connect(**SRC_DB)
     tgt_conn = psycopg2.connect(**TGT_DB)
+
+    if SYNC_MODE in ('bulk', 'parallel', 'series'):
+        if SYNC_MODE == 'bulk':
+            run_bulk_sync(src_conn, tgt_conn)
+        elif SYNC_MODE == 'parallel':
+            run_parallel_sync(src_conn, tgt_conn)
+        else:
+            run_series_sync(src_conn, tgt_conn)
+        src_conn.close()
+        tgt_conn.close()
+        print("✅ Sync complete!")
+        return
+
     src_cur = src_conn.cursor()
     tgt_cur = tgt_conn.cursor()
 
@@ -0,0 +1,230 @@
+import os
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from lstm_utils import iter_sales_data, db_sales_stats
+from forecast import count_row_steps, spread_steps, step_days
+
+# ✅ Load environment variables
+load_dotenv()
+
+BASELINE_METHOD = os.getenv("BASELINE_METHOD", "auto")  # auto | seasonal | ses | croston
+BASELINE_HISTORY_DAYS = int(os.getenv("BASELINE_HISTORY_DAYS", "56"))
+BASELINE_INTERMITTENT = float(os.getenv("BASELINE_INTERMITTENT", "0.3"))  # zero-row share for croston
+
+# --- Data ---
+
+def demand_matrix(end_date=None, days=BASELINE_HISTORY_DAYS, chunks=None, stores=None, step=None):
+    """
+    'sold' of every (store, sku) series over the `days` days ending at
+    end_date (default: latest date in the DB), one column per step of the
+    data's row spacing (a day on daily data, a week on weekly data), as an
+    (n_series, days // step) float32 matrix with NaN where a series has no
+    row. Returns (Y, keys, end_date, step).
+    stores optionally limits the read to a shard of store_ids; step, if
+    given, is used instead of the spacing measured on this read.
+    """
+    if end_date is None:
+        _, end_date = db_sales_stats()
+        if end_date is None:
+            raise ValueError("No sales data for the baseline forecaster!")
+    end = pd.Timestamp(end_date)
+    start = end - pd.Timedelta(days=days - 1)
+    if chunks is None:
+        chunks = iter_sales_data(start.year, end.year, after_date=start - pd.Timedelta(days=1), stores=stores)
+
+    parts = [c.loc[c['date'] <= end, ['store_id', 'sku_id', 'date', 'sold']] for c in chunks]
+    df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['store_id', 'sku_id', 'date', 'sold'])
+    df = df.sort_values(['store_id', 'sku_id', 'date'], kind='stable')
+    steps = {}
+    for _ in count_row_steps([df], steps):
+        pass
+    step = step or step_days(steps)
+
+    # Columns count back from end_date, so each row lands in its own step
+    n_cols = max(1, days // step)
+    codes, keys = pd.MultiIndex.from_arrays([df['store_id'].astype(str), df['sku_id'].astype(str)]).factorize()
+    cols = n_cols - 1 - (end - pd.to_datetime(df['date'])).dt.days.to_numpy() // step
+    ok = cols >= 0
+
+    Y = np.zeros((len(keys), n_cols), dtype=np.float32)
+    np.add.at(Y, (codes[ok], cols[ok]), df['sold'].to_numpy(dtype=np.float32)[ok])
+    seen = np.zeros(Y.shape, dtype=bool)
+    seen[codes[ok], cols[ok]] = True
+    Y[~seen] = np.nan
+    keys = pd.DataFrame({'store_id': keys.get_level_values(0), 'sku_id': keys.get_level_values(1)})
+    return Y, keys, end, step
+
+# --- Vectorized models: every series updated together, one column per step ---
+
+def _nanmean(a):
+    """
+    Row means ignoring NaN; 0 for rows with no observations.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nan_to_num(np.nanmean(a, axis=1)) if a.shape[1] else np.zeros(len(a))
+
+def ses(Y, horizon, alpha=0.3):
+    """
+    Simple exponential smoothing; flat forecast at the final level.
+    """
+    level = _nanmean(Y[:, :7])
+    for t in range(Y.shape[1]):
+        y = Y[:, t]
+        level = np.where(np.isnan(y), level, alpha * y + (1 - alpha) * level)
+    return np.repeat(level[:, None], horizon, axis=1)
+
+def seasonal_smoothing(Y, horizon, alpha=0.2, gamma=0.1, period=7):
+    """
+    Additive level + season exponential smoothing (Holt-Winters without
+    trend); period is the season length in columns. Plain ses below 2.
+    """
+    if period < 2:
+        return ses(Y, horizon, alpha)
+    n, T = Y.shape
+    level = _nanmean(Y[:, :period])
+    season = np.zeros((n, period), dtype=np.float64)
+    for t in range(T):
+        y = Y[:, t]
+        ok = ~np.isnan(y)
+        s = season[:, t % period]
+        level = np.where(ok, alpha * (y - s) + (1 - alpha) * level, level)
+        season[:, t % period] = np.where(ok, gamma * (y - level) + (1 - gamma) * s, s)
+    steps = (T + np.arange(horizon)) % period
+    return level[:, None] + season[:, steps]
+
+def croston(Y, horizon, alpha=0.1):
+    """
+    Croston's method for intermittent demand: smooths non-zero demand size
+    and the interval between demands; forecasts their ratio per column.
+    """
+    n, T = Y.shape
+    z = _nanmean(np.where(Y > 0, Y, np.nan))
+    n_demand = (Y > 0).sum(axis=1)
+    p = np.where(n_demand > 0, np.maximum(T, 1) / np.maximum(n_demand, 1), 1.0)
+    q = np.ones(n)
+    for t in range(T):
+        y = Y[:, t]
+        ok = ~np.isnan(y)
+        demand = ok & (y > 0)
+        z = np.where(demand, alpha * y + (1 - alpha) * z, z)
+        p = np.where(demand, alpha * q + (1 - alpha) * p, p)
+        q = np.where(demand, 1, q + ok)
+    return np.repeat((z / p)[:, None], horizon, axis=1)
+
+METHODS = {'ses': ses, 'seasonal': seasonal_smoothing, 'croston': croston}
+
+def fit_forecast(Y, horizon, method=BASELINE_METHOD, step=1):
+    """
+    Forecasts (n_series, horizon) in real units per column of Y, clipped at
+    zero. step is the column length in days; the seasonal model uses a
+    weekly period. 'auto' uses croston for intermittent series and seasonal
+    smoothing for the rest.
+    """
+    period = 7 // step
+    if method == 'auto':
+        observed = (~np.isnan(Y)).sum(axis=1)
+        zero_share = (Y == 0).sum(axis=1) / np.maximum(observed, 1)
+        intermittent = zero_share > BASELINE_INTERMITTENT
+        forecast = np.where(intermittent[:, None], croston(Y, horizon),
+                            seasonal_smoothing(Y, horizon, period=period))
+    elif method == 'seasonal':
+        forecast = seasonal_smoothing(Y, horizon, period=period)
+    else:
+        forecast = METHODS[method](Y, horizon)
+    return np.maximum(forecast, 0).astype(np.float32)
+
+def baseline_series_demand(horizon, method=BASELINE_METHOD, days=BASELINE_HISTORY_DAYS, stores=None, step=None):
+    """
+    Same shape as the LSTM horizon forecast in expiry_and_action: one row per
+    series with date, horizon_demand and predicted_sales (units per day).
+    """
+    Y, keys, end, step = demand_matrix(days=days, stores=stores, step=step)
+    start = time.perf_counter()
+    demand = spread_steps(fit_forecast(Y, -(-horizon // step), method, step), step, horizon)
+    elapsed = time.perf_counter() - start
+    print(f"📈 Baseline ({method}) forecast {len(keys)} series x {horizon} days in {elapsed * 1000:.1f} ms")
+    pred_df = keys.copy()
+    pred_df['date'] = end
+    pred_df['horizon_demand'] = demand.sum(axis=1)
+    pred_df['predicted_sales'] = pred_df['horizon_demand'] / horizon
+    return pred_df
+
+# --- Holdout benchmark ---
+
+def benchmark(horizon=14, days=BASELINE_HISTORY_DAYS, with_lstm=True):
+    """
+    Fit on history up to the last `horizon` days (rounded up to whole rows),
+    forecast the held-out rows and compare per-day MAE / holdout-total MAE
+    per method, and against the LSTM rollout when a model is available.
+    Only cells with a row in the holdout are scored.
+    """
+    Y_all, keys, end, step = demand_matrix(days=days + horizon)
+    steps = -(-horizon // step)
+    Y, actual = Y_all[:, :-steps], Y_all[:, -steps:]
+    observed = ~np.isnan(actual)
+    results = {}
+
+    def score(name, forecast, seconds):
+        ok = observed & ~np.isnan(forecast)
+        rows = ok.any(axis=1)
+        err = np.abs(forecast - actual)[ok] / step
+        total_err = np.where(ok, forecast, 0).sum(axis=1) - np.where(ok, actual, 0).sum(axis=1)
+        results[name] = {'daily_mae': float(err.mean()) if err.size else float('nan'),
+                         'total_mae': float(np.abs(total_err[rows]).mean()) if rows.any() else float('nan'),
+                         'ms': seconds * 1000}
+
+    for method in ('ses', 'seasonal', 'croston', 'auto'):
+        start = time.perf_counter()
+        forecast = fit_forecast(Y, steps, method, step)
+        score(method, forecast, time.perf_counter() - start)
+
+    if with_lstm:
+        try:
+            demand, seconds = _lstm_holdout_forecast(keys, end - pd.Timedelta(days=steps * step), steps * step)
+            # Back from units per day to units per row
+            score('lstm', demand.reshape(len(demand), steps, step).sum(axis=2), seconds)
+        except Exception as e:
+            print(f"⚠️ LSTM not benchmarked: {e}")
+
+    print(f"📊 Holdout: last {steps} rows ({steps * step} days), {int(observed.any(axis=1).sum())} series")
+    for name, r in results.items():
+        print(f"   {name:>8}: per-day MAE {r['daily_mae']:.3f}, {steps * step}-day total MAE {r['total_mae']:.2f}, "
+              f"{r['ms']:.1f} ms")
+    return results
+
+def _lstm_holdout_forecast(keys, cutoff, horizon):
+    """
+    LSTM rollout from each series' last window on or before cutoff, aligned to keys.
+    """
+    from lstm_utils import iter_series_windows
+    from model_registry import load_current
+    from forecast import count_row_steps, forecast_horizon, step_days
+
+    model, scaler, manifest = load_current()
+    steps = {}
+    chunks = count_row_steps((c[c['date'] <= cutoff] for c in iter_sales_data(2021, cutoff.year, order='series')),
+                             steps)
+    X_parts, meta_parts = [], []
+    for X, _, meta in iter_series_windows(chunks, scaler, manifest['window_size'], with_meta=True, last_n=1):
+        X_parts.append(X)
+        meta_parts.append(meta)
+    meta = pd.concat(meta_parts, ignore_index=True)
+
+    start = time.perf_counter()
+    demand = forecast_horizon(lambda X: model.predict(X, verbose=0).reshape(-1), np.concatenate(X_parts),
+                              scaler, horizon, step_days(steps))
+    seconds = time.perf_counter() - start
+
+    index = pd.MultiIndex.from_arrays([meta['store_id'].astype(str), meta['sku_id'].astype(str)])
+    pos = index.get_indexer(pd.MultiIndex.from_frame(keys[['store_id', 'sku_id']]))
+    aligned = np.full((len(keys), horizon), np.nan, dtype=np.float32)
+    aligned[pos >= 0] = demand[pos[pos >= 0]]
+    return aligned, seconds
+
+# --- Entrypoint ---
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,225 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from dotenv import load_dotenv
+from lstm_utils import (FEATURES, compact_sales_frame, fetch_series_tail, iter_sales_data,
+                        iter_series_windows, predict_in_batches)
+
+# ✅ Load environment variables
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DRIFT_STATE_FILE = os.path.join(BASE_DIR, 'drift_state.json')
+DRIFT_SERIES_FILE = os.path.join(BASE_DIR, 'drift_series.npz')
+
+# Thresholds; any one of them triggers a retrain
+DRIFT_MSE_RATIO = float(os.getenv("DRIFT_MSE_RATIO", "1.5"))            # running MSE vs baseline
+DRIFT_SERIES_FRAC = float(os.getenv("DRIFT_SERIES_FRAC", "0.2"))        # share of drifting series
+DRIFT_RANGE_EXCURSION = float(os.getenv("DRIFT_RANGE_EXCURSION", "0.1"))  # beyond scaler min/max, in ranges
+DRIFT_MIN_WINDOWS = int(os.getenv("DRIFT_MIN_WINDOWS", "14"))           # per series before it counts
+DRIFT_BASELINE_DAYS = int(os.getenv("DRIFT_BASELINE_DAYS", "28"))
+DRIFT_MAX_DAYS = int(os.getenv("DRIFT_MAX_DAYS", "90"))                 # retrain anyway after this
+
+# --- State ---
+
+def read_drift_state():
+    """
+    Monitor state: watermark (last date scored), trained_through (end of the
+    data the model was last tuned on), baseline_mse, feature min/max seen
+    since then, and totals. None before the first run.
+    """
+    if not os.path.exists(DRIFT_STATE_FILE):
+        return None
+    with open(DRIFT_STATE_FILE) as f:
+        return json.load(f)
+
+def write_drift_state(state):
+    tmp = DRIFT_STATE_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, DRIFT_STATE_FILE)
+
+def load_series_stats():
+    """
+    Running per-series error sums since the last retrain: store_id, sku_id, count, sse.
+    """
+    if not os.path.exists(DRIFT_SERIES_FILE):
+        return pd.DataFrame({'store_id': pd.Series(dtype=str), 'sku_id': pd.Series(dtype=str),
+                             'count': pd.Series(dtype='int64'), 'sse': pd.Series(dtype='float64')})
+    with np.load(DRIFT_SERIES_FILE) as data:
+        return pd.DataFrame({k: data[k] for k in ('store_id', 'sku_id', 'count', 'sse')})
+
+def save_series_stats(stats):
+    tmp = DRIFT_SERIES_FILE + ".tmp.npz"
+    np.savez(tmp,
+             store_id=stats['store_id'].astype(str).to_numpy(dtype=str),
+             sku_id=stats['sku_id'].astype(str).to_numpy(dtype=str),
+             count=stats['count'].to_numpy(dtype=np.int64),
+             sse=stats['sse'].to_numpy(dtype=np.float64))
+    os.replace(tmp, DRIFT_SERIES_FILE)
+
+def reset_drift(trained_through, baseline_mse, scaler, watermark=None):
+    """
+    Start a fresh monitoring period after a retrain (or on the first run).
+    """
+    write_drift_state({
+        'watermark': str(pd.Timestamp(watermark or trained_through).date()),
+        'trained_through': str(pd.Timestamp(trained_through).date()),
+        'baseline_mse': float(baseline_mse),
+        'retrained_at': datetime.utcnow().strftime("%Y-%m-%d"),
+        'feature_min': [float(v) for v in scaler.data_min_],
+        'feature_max': [float(v) for v in scaler.data_max_],
+        'windows': 0,
+        'sse': 0.0,
+    })
+    save_series_stats(load_series_stats().iloc[0:0])
+
+def rebaseline_drift(baseline_mse, scaler, watermark):
+    """
+    Restart the drift statistics from watermark with a new baseline MSE,
+    keeping retrained_at and trained_through: the model itself is unchanged,
+    so DRIFT_MAX_DAYS still counts from its last retrain.
+    """
+    state = read_drift_state()
+    state.update({
+        'watermark': str(pd.Timestamp(watermark).date()),
+        'baseline_mse': float(baseline_mse),
+        'feature_min': [float(v) for v in scaler.data_min_],
+        'feature_max': [float(v) for v in scaler.data_max_],
+        'windows': 0,
+        'sse': 0.0,
+    })
+    write_drift_state(state)
+    save_series_stats(load_series_stats().iloc[0:0])
+
+# --- Scoring new data ---
+
+def iter_windows_after(scaler, after_date, window_size=5, with_features=None):
+    """
+    (X, y, meta) for windows whose target date is after after_date. The last
+    window_size rows of each series up to after_date are read as window
+    context, whatever the spacing of the rows. with_features, if a dict,
+    collects raw per-feature min/max of the new rows.
+    """
+    after = pd.Timestamp(after_date)
+    context = fetch_series_tail(after, window_size)
+    context_keys = pd.MultiIndex.from_arrays([context['store_id'].astype(str), context['sku_id'].astype(str)])
+    seen = set()
+
+    def chunks():
+        for chunk in iter_sales_data(after.year, datetime.utcnow().year, after_date=after, order='series'):
+            if with_features is not None:
+                new = chunk[FEATURES].to_numpy(dtype=np.float64)
+                if len(new):
+                    lo, hi = np.nanmin(new, axis=0), np.nanmax(new, axis=0)
+                    with_features['min'] = lo if 'min' not in with_features else np.fmin(with_features['min'], lo)
+                    with_features['max'] = hi if 'max' not in with_features else np.fmax(with_features['max'], hi)
+
+            # Put each series' context rows in front of its first new row,
+            # keeping the chunk's series order (a series may span chunks)
+            keys = pd.MultiIndex.from_arrays([chunk['store_id'].astype(str), chunk['sku_id'].astype(str)])
+            codes, uniques = keys.factorize()
+            fresh = [key for key in uniques if key not in seen]
+            seen.update(fresh)
+            in_chunk = context_keys.isin(fresh)
+            ctx = context[in_chunk]
+            if len(ctx):
+                ctx_codes = uniques.get_indexer(context_keys[in_chunk])
+                chunk = pd.concat([ctx, chunk], ignore_index=True)
+                order = np.lexsort((np.arange(len(chunk)), np.concatenate([ctx_codes, codes])))
+                chunk = compact_sales_frame(chunk.iloc[order].reset_index(drop=True))
+            yield chunk
+
+    for X, y, meta in iter_series_windows(chunks(), scaler, window_size, with_meta=True):
+        new = (meta['date'] > after).to_numpy()
+        if new.any():
+            yield X[new], y[new], meta[new].reset_index(drop=True)
+
+def score_new_windows(model, scaler, after_date, window_size=5):
+    """
+    Predict the windows added since after_date once and aggregate squared
+    errors per series. Returns (per-series stats, feature min/max, max date).
+    """
+    features = {}
+    parts = []
+    max_date = None
+    for X, y, meta in iter_windows_after(scaler, after_date, window_size, with_features=features):
+        err = (predict_in_batches(model, X) - y) ** 2
+        part = pd.DataFrame({'store_id': meta['store_id'].astype(str), 'sku_id': meta['sku_id'].astype(str),
+                             'count': 1, 'sse': err.astype(np.float64)})
+        parts.append(part.groupby(['store_id', 'sku_id'], as_index=False).sum())
+        batch_max = meta['date'].max()
+        max_date = batch_max if max_date is None else max(max_date, batch_max)
+    if parts:
+        stats = pd.concat(parts).groupby(['store_id', 'sku_id'], as_index=False).sum()
+    else:
+        stats = load_series_stats().iloc[0:0]
+    return stats, features, max_date
+
+def update_drift(model, scaler, window_size=5):
+    """
+    Fold windows newer than the watermark into the running statistics and
+    return (state, series_stats). Only new data is read and predicted.
+    """
+    state = read_drift_state()
+    new_stats, features, max_date = score_new_windows(model, scaler, state['watermark'], window_size)
+    if max_date is None:
+        return state, load_series_stats()
+
+    stats = pd.concat([load_series_stats(), new_stats]).groupby(['store_id', 'sku_id'], as_index=False).sum()
+    save_series_stats(stats)
+
+    if 'min' in features:
+        state['feature_min'] = np.fmin(state['feature_min'], features['min']).tolist()
+        state['feature_max'] = np.fmax(state['feature_max'], features['max']).tolist()
+    state['windows'] += int(new_stats['count'].sum())
+    state['sse'] += float(new_stats['sse'].sum())
+    state['watermark'] = str(pd.Timestamp(max_date).date())
+    write_drift_state(state)
+    print(f"📈 Scored {int(new_stats['count'].sum())} new windows through {state['watermark']}")
+    return state, stats
+
+def drift_report(state, stats, scaler):
+    """
+    Compare running statistics with the thresholds. Returns a dict with the
+    measures, the reasons that fired and 'triggered'.
+    """
+    baseline = max(state['baseline_mse'], 1e-12)
+    mse = state['sse'] / state['windows'] if state['windows'] else 0.0
+
+    counted = stats[stats['count'] >= DRIFT_MIN_WINDOWS]
+    series_mse = counted['sse'] / counted['count']
+    drifting = float((series_mse > DRIFT_MSE_RATIO * baseline).mean()) if len(counted) else 0.0
+
+    data_range = np.where(scaler.data_range_ > 0, scaler.data_range_, 1.0)
+    below = (scaler.data_min_ - np.asarray(state['feature_min'])) / data_range
+    above = (np.asarray(state['feature_max']) - scaler.data_max_) / data_range
+    excursion = np.maximum(np.maximum(below, above), 0)
+
+    days = (datetime.utcnow() - datetime.strptime(state['retrained_at'], "%Y-%m-%d")).days
+    reasons = []
+    if state['windows'] and mse > DRIFT_MSE_RATIO * baseline:
+        reasons.append(f"MSE {mse:.5f} > {DRIFT_MSE_RATIO}x baseline {baseline:.5f}")
+    if drifting > DRIFT_SERIES_FRAC:
+        reasons.append(f"{drifting:.0%} of series drifting")
+    if excursion.max() > DRIFT_RANGE_EXCURSION:
+        worst = FEATURES[int(excursion.argmax())]
+        reasons.append(f"'{worst}' {excursion.max():.0%} outside scaler range")
+    if days >= DRIFT_MAX_DAYS:
+        reasons.append(f"{days} days since last retrain")
+
+    return {
+        'mse': mse, 'baseline_mse': baseline, 'drifting_series': drifting,
+        'excursion': dict(zip(FEATURES, excursion.round(4).tolist())),
+        'days': days, 'reasons': reasons, 'triggered': bool(reasons),
+    }
+
+def print_drift_report(report):
+    print(f"📊 Running MSE {report['mse']:.5f} (baseline {report['baseline_mse']:.5f}), "
+          f"{report['drifting_series']:.0%} series drifting, "
+          f"max range excursion {max(report['excursion'].values()):.0%}, "
+          f"{report['days']} days since retrain")
+    for reason in report['reasons']:
+        print(f"⚠️ Drift: {reason}")
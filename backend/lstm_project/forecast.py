@@ -0,0 +1,97 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from lstm_utils import FEATURES, db_sales_stats, iter_sales_data
+
+# ✅ Load environment variables
+load_dotenv()
+
+FORECAST_HORIZON = int(os.getenv("FORECAST_HORIZON", "14"))
+SOLD_IDX = FEATURES.index('sold')
+
+def inverse_sold(preds, scaler):
+    """
+    Undo the MinMax scaling of the 'sold' column only.
+    """
+    return (np.asarray(preds, dtype=np.float32) - scaler.min_[SOLD_IDX]) / scaler.scale_[SOLD_IDX]
+
+def rollout(predict, windows, horizon=FORECAST_HORIZON):
+    """
+    Recursive H-step rollout over all series at once. windows is the latest
+    scaled (n_series, window_size, features) window of each series; each step
+    runs one batched predict, appends a row with 'sold' set to the prediction
+    (other features carried forward from the last observed day) and slides
+    the window. Returns scaled predictions of shape (n_series, horizon).
+    """
+    window = np.array(windows, dtype=np.float32)
+    out = np.empty((len(window), horizon), dtype=np.float32)
+    for step in range(horizon):
+        preds = np.asarray(predict(window), dtype=np.float32).reshape(-1)
+        out[:, step] = preds
+        next_row = window[:, -1:, :].copy()
+        next_row[:, 0, SOLD_IDX] = preds
+        window = np.concatenate([window[:, 1:], next_row], axis=1)
+    return out
+
+def count_row_steps(chunks, counts):
+    """
+    Pass series-ordered chunks through, tallying the days between consecutive
+    rows of the same series into the counts dict (days -> rows).
+    """
+    for chunk in chunks:
+        same = ((chunk['store_id'] == chunk['store_id'].shift())
+                & (chunk['sku_id'] == chunk['sku_id'].shift())).to_numpy()
+        days = pd.to_datetime(chunk['date']).diff().dt.days.to_numpy()[same]
+        for d, n in zip(*np.unique(days[days > 0], return_counts=True)):
+            counts[int(d)] = counts.get(int(d), 0) + int(n)
+        yield chunk
+
+def step_days(counts):
+    """
+    Median spacing in days of the rows tallied by count_row_steps: 1 for
+    daily data, 7 for weekly. 1 when nothing was tallied.
+    """
+    if not counts:
+        return 1
+    days = np.array(sorted(counts))
+    cum = np.cumsum([counts[d] for d in days])
+    return int(days[np.searchsorted(cum, cum[-1] / 2)])
+
+def recent_step_days(days=90):
+    """
+    Row spacing of the whole fleet over its last `days` days of data, for
+    runs that forecast part of the fleet at a time (store shards).
+    """
+    _, end = db_sales_stats()
+    if end is None:
+        return 1
+    start = pd.Timestamp(end) - pd.Timedelta(days=days)
+    steps = {}
+    for _ in count_row_steps(iter_sales_data(start.year, pd.Timestamp(end).year, after_date=start,
+                                             order='series'), steps):
+        pass
+    return step_days(steps)
+
+def forecast_horizon(predict, windows, scaler, horizon=FORECAST_HORIZON, step=1):
+    """
+    Daily 'sold' forecasts in real units, shape (n_series, horizon), clipped
+    at zero. predict is a model's batched predict(X) function. Each rollout
+    step is one row, i.e. `step` days (see step_days); steps are rolled until
+    the horizon is covered and each one is spread evenly over its days.
+    """
+    steps = -(-horizon // step)
+    start = time.perf_counter()
+    demand = np.maximum(inverse_sold(rollout(predict, windows, steps), scaler), 0)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"📈 Forecast {len(demand)} series x {horizon} days ({steps} steps of {step} days) in {elapsed:.2f}s "
+          f"({len(demand) / elapsed:,.0f} series-forecasts/s)")
+    return spread_steps(demand, step, horizon)
+
+def spread_steps(demand, step, horizon):
+    """
+    Per-row forecasts (n_series, steps) as units per day over the first
+    `horizon` days, each row's units spread evenly over its `step` days.
+    """
+    return np.repeat(np.asarray(demand) / step, step, axis=1)[:, :horizon]
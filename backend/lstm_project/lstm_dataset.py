@@ -0,0 +1,204 @@
+import os
+import json
+import shutil
+import joblib
+import numpy as np
+import tensorflow as tf
+from dotenv import load_dotenv
+from lstm_utils import (FEATURES, iter_sales_data, iter_series_frames, build_window_index,
+                        fit_scaler_with_dates, split_cutoff, iter_series_windows, db_sales_stats)
+
+# ✅ Load environment variables
+load_dotenv()
+
+BATCH_SIZE = int(os.getenv("TRAIN_BATCH_SIZE", "32"))
+SHUFFLE_BUFFER = int(os.getenv("TRAIN_SHUFFLE_BUFFER", "100000"))
+SEED = int(os.getenv("TRAIN_SEED", "42"))
+WINDOW_CACHE_DIR = os.getenv("WINDOW_CACHE_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'window_cache')
+
+def _series_chunks(start_year, end_year, window_size, cutoff, subset):
+    """
+    Generator factory for tf.data: yields (raw features in series order,
+    target row positions) for the train or val side of the date cutoff.
+    Scaling and window gathering happen later, in parallel, inside the pipeline.
+    """
+    cutoff = np.datetime64(cutoff)
+
+    def gen():
+        for frame in iter_series_frames(iter_sales_data(start_year, end_year, order='series')):
+            index = build_window_index(frame, window_size)
+            ends = index['window_ends']
+            dates = frame['date'].to_numpy()[index['order'][ends]]
+            keep = dates < cutoff if subset == 'train' else dates >= cutoff
+            if keep.any():
+                features = frame[FEATURES].to_numpy(dtype=np.float32)[index['order']]
+                yield features, ends[keep].astype(np.int64)
+    return gen
+
+def make_window_dataset(start_year, end_year, scaler, cutoff, subset='train', window_size=5,
+                        batch_size=BATCH_SIZE, shuffle=None, seed=SEED):
+    """
+    tf.data pipeline of (X, y) batches streamed from the sales store in chunks.
+    Windows are built per series in parallel map calls, then shuffled (train
+    only by default), batched and prefetched. Memory is bounded by the chunk
+    size and the shuffle buffer, not by the dataset.
+    """
+    if shuffle is None:
+        shuffle = subset == 'train'
+
+    n_features = len(FEATURES)
+    ds = tf.data.Dataset.from_generator(
+        _series_chunks(start_year, end_year, window_size, cutoff, subset),
+        output_signature=(
+            tf.TensorSpec(shape=(None, n_features), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.int64),
+        ),
+    ).prefetch(2)  # keep the DB reader ahead of the windowing workers
+
+    # MinMaxScaler.transform is x * scale_ + min_
+    scale = tf.constant(scaler.scale_, dtype=tf.float32)
+    offset = tf.constant(scaler.min_, dtype=tf.float32)
+    steps = tf.range(-window_size, 0, dtype=tf.int64)
+    sold_idx = FEATURES.index('sold')
+
+    def to_windows(features, ends):
+        scaled = features * scale + offset
+        X = tf.gather(scaled, ends[:, None] + steps)
+        y = tf.gather(scaled[:, sold_idx], ends)
+        return X, y
+
+    ds = ds.map(to_windows, num_parallel_calls=tf.data.AUTOTUNE, deterministic=True).unbatch()
+    if shuffle:
+        ds = ds.shuffle(SHUFFLE_BUFFER, seed=seed, reshuffle_each_iteration=True)
+    return ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+def make_train_val_datasets(start_year, end_year, window_size=5, train_frac=0.8,
+                            batch_size=BATCH_SIZE, seed=SEED):
+    """
+    Fit the scaler in one streaming pass, pick the date cutoff, and return
+    (train_ds, val_ds, scaler, cutoff). Windows whose target date is before
+    the cutoff train, the rest validate; cutoff is None when there is no data.
+    """
+    scaler, n_rows, date_counts = fit_scaler_with_dates(iter_sales_data(start_year, end_year))
+    print(f"✅ Streamed {n_rows} rows.")
+    cutoff = split_cutoff(date_counts, train_frac)
+    if cutoff is None:
+        return None, None, scaler, None
+    print(f"📅 Training on windows before {cutoff:%Y-%m-%d}, validating from then on.")
+
+    train_ds = make_window_dataset(start_year, end_year, scaler, cutoff, 'train',
+                                   window_size, batch_size, seed=seed)
+    val_ds = make_window_dataset(start_year, end_year, scaler, cutoff, 'val',
+                                 window_size, batch_size, seed=seed)
+    return train_ds, val_ds, scaler, cutoff
+
+def has_batches(ds):
+    """
+    True if the dataset yields at least one batch (reads only up to it).
+    """
+    return any(True for _ in ds.take(1))
+
+# --- On-disk window cache (shared by tuner workers) ---
+
+def _window_cache_manifest(cache_dir):
+    path = os.path.join(cache_dir, 'manifest.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def build_window_cache(start_year, end_year, cache_dir=WINDOW_CACHE_DIR, window_size=5,
+                       train_frac=0.8):
+    """
+    Materialize the scaled train/val windows once as raw float32 files that
+    every process can memory-map. Reused as long as the years, window size
+    and the DB fingerprint (row count, max date) are unchanged.
+    """
+    source = list(db_sales_stats())
+    key = {'years': [start_year, end_year], 'window_size': window_size,
+           'train_frac': train_frac, 'source': source}
+    manifest = _window_cache_manifest(cache_dir)
+    if manifest and manifest['key'] == key:
+        print(f"✅ Reusing window cache in {cache_dir}")
+        return manifest
+
+    print("⚙️ Building window cache...")
+    scaler, n_rows, date_counts = fit_scaler_with_dates(iter_sales_data(start_year, end_year))
+    cutoff = split_cutoff(date_counts, train_frac)
+    if cutoff is None:
+        raise ValueError("No sales data to train on!")
+
+    tmp_dir = cache_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    files = {name: open(os.path.join(tmp_dir, f'{name}.bin'), 'wb')
+             for name in ('X_train', 'y_train', 'X_val', 'y_val')}
+    counts = {'train': 0, 'val': 0}
+    try:
+        chunks = iter_sales_data(start_year, end_year, order='series')
+        for X, y, meta in iter_series_windows(chunks, scaler, window_size, with_meta=True):
+            train = (meta['date'] < cutoff).to_numpy()
+            for split, mask in (('train', train), ('val', ~train)):
+                if mask.any():
+                    files[f'X_{split}'].write(np.ascontiguousarray(X[mask], dtype=np.float32).tobytes())
+                    files[f'y_{split}'].write(np.ascontiguousarray(y[mask], dtype=np.float32).tobytes())
+                    counts[split] += int(mask.sum())
+    finally:
+        for f in files.values():
+            f.close()
+
+    joblib.dump(scaler, os.path.join(tmp_dir, 'scaler.pkl'))
+    manifest = {'key': key, 'counts': counts, 'cutoff': str(cutoff.date()),
+                'shape': [window_size, len(FEATURES)]}
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+    print(f"✅ Cached {counts['train']} train / {counts['val']} val windows in {cache_dir}")
+    return manifest
+
+def load_window_cache(cache_dir=WINDOW_CACHE_DIR):
+    """
+    Memory-map the cached windows: returns (arrays, scaler, manifest) where
+    arrays holds read-only X_train, y_train, X_val, y_val.
+    """
+    manifest = _window_cache_manifest(cache_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No window cache in {cache_dir}; run build_window_cache first")
+    window_size, n_features = manifest['shape']
+    arrays = {}
+    for split, n in manifest['counts'].items():
+        for name, shape in ((f'X_{split}', (n, window_size, n_features)), (f'y_{split}', (n,))):
+            path = os.path.join(cache_dir, f'{name}.bin')
+            arrays[name] = (np.memmap(path, dtype=np.float32, mode='r', shape=shape) if n
+                            else np.empty(shape, dtype=np.float32))
+    scaler = joblib.load(os.path.join(cache_dir, 'scaler.pkl'))
+    return arrays, scaler, manifest
+
+def cached_window_dataset(X, y, batch_size=BATCH_SIZE, shuffle=False, seed=SEED, block=65536):
+    """
+    tf.data pipeline over memory-mapped windows. Reads go through the OS page
+    cache, so workers share one copy of the data instead of each loading it.
+    Shuffling permutes blocks, then windows inside each block.
+    """
+    n = len(y)
+    epoch = [0]
+
+    def gen():
+        rng = np.random.default_rng(seed + epoch[0])
+        epoch[0] += 1
+        starts = np.arange(0, n, block)
+        if shuffle:
+            rng.shuffle(starts)
+        for start in starts:
+            idx = np.arange(start, min(start + block, n))
+            if shuffle:
+                rng.shuffle(idx)
+            yield X[idx], y[idx]
+
+    ds = tf.data.Dataset.from_generator(gen, output_signature=(
+        tf.TensorSpec(shape=(None,) + X.shape[1:], dtype=tf.float32),
+        tf.TensorSpec(shape=(None,), dtype=tf.float32),
+    ))
+    return ds.unbatch().batch(batch_size).prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,251 @@
+import os
+import sys
+import time
+import json
+import shutil
+import tempfile
+import numpy as np
+from dotenv import load_dotenv
+
+# ✅ Load environment variables
+load_dotenv()
+
+MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'base_lstm_model.h5')
+INFERENCE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'base_lstm_model.npz')
+EXPORT_WEIGHTS_DTYPE = os.getenv("EXPORT_WEIGHTS_DTYPE", "float32")  # float32 | float16 | int8
+# numpy (default): exported weights, no TensorFlow import | keras: the .h5 model
+INFERENCE_RUNTIME = os.getenv("INFERENCE_RUNTIME", "numpy")
+
+# Weight matrices that get float16/int8 storage; biases always stay float32
+MATRICES = ('lstm_kernel', 'lstm_recurrent', 'dense_kernel')
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+ACTIVATIONS = {'tanh': np.tanh, 'sigmoid': _sigmoid}
+
+
+class NumpyLSTM:
+    """
+    Forward pass of the base model (LSTM -> Dense) in NumPy.
+
+    predict() matches keras Model.predict's call shape, so it drops into
+    predict_in_batches and run_abc_logic unchanged. Gate order follows Keras:
+    input, forget, cell, output.
+    """
+
+    def __init__(self, weights, activation='tanh', recurrent_activation='sigmoid'):
+        self.W = weights['lstm_kernel']
+        self.U = weights['lstm_recurrent']
+        self.b = weights['lstm_bias']
+        self.Wd = weights['dense_kernel']
+        self.bd = weights['dense_bias']
+        self.units = self.U.shape[0]
+        self.activation = ACTIVATIONS[activation]
+        self.recurrent_activation = ACTIVATIONS[recurrent_activation]
+
+    def predict(self, X, batch_size=None, verbose=0):
+        X = np.asarray(X, dtype=np.float32)
+        n, steps, n_features = X.shape
+        u = self.units
+        # Input projection for every timestep in one matmul
+        xw = (X.reshape(-1, n_features) @ self.W + self.b).reshape(n, steps, 4 * u)
+        h = np.zeros((n, u), dtype=np.float32)
+        c = np.zeros((n, u), dtype=np.float32)
+        for t in range(steps):
+            z = xw[:, t] + h @ self.U
+            i = self.recurrent_activation(z[:, :u])
+            f = self.recurrent_activation(z[:, u:2 * u])
+            g = self.activation(z[:, 2 * u:3 * u])
+            o = self.recurrent_activation(z[:, 3 * u:])
+            c = f * c + i * g
+            h = o * self.activation(c)
+        return h @ self.Wd + self.bd
+
+
+def _quantize(w, dtype):
+    """
+    Encode a float32 matrix for storage. int8 uses a symmetric per-column scale.
+    """
+    if dtype == 'float32':
+        return {'': w.astype(np.float32)}
+    if dtype == 'float16':
+        return {'': w.astype(np.float16)}
+    if dtype == 'int8':
+        scale = np.abs(w).max(axis=0) / 127.0
+        scale[scale == 0] = 1.0
+        return {'': np.round(w / scale).astype(np.int8), '_scale': scale.astype(np.float32)}
+    raise ValueError(f"Unsupported weights dtype: {dtype}")
+
+def _dequantize(data, name):
+    # asarray keeps float32 memory-mapped arrays mapped instead of copying them
+    w = np.asarray(data[name], dtype=np.float32)
+    if f'{name}_scale' in data:
+        w = w * data[f'{name}_scale']
+    return w
+
+def export_inference_model(model, path=INFERENCE_FILE, dtype=EXPORT_WEIGHTS_DTYPE):
+    """
+    Write the weights of a Sequential([LSTM, Dense]) keras model to a .npz the
+    NumPy runtime can load without TensorFlow. A path not ending in .npz gets
+    a directory of .npy files plus config.json instead, which loads
+    memory-mapped. Written to a temp name and renamed, so readers never see
+    a partial export.
+    """
+    lstm, dense = model.layers
+    lstm_cfg, dense_cfg = lstm.get_config(), dense.get_config()
+    if type(lstm).__name__ != 'LSTM' or type(dense).__name__ != 'Dense':
+        raise ValueError("Only LSTM -> Dense models can be exported")
+    if lstm_cfg.get('return_sequences') or dense_cfg.get('activation') != 'linear':
+        raise ValueError("Unsupported LSTM/Dense configuration for export")
+
+    kernel, recurrent, bias = lstm.get_weights()
+    dense_kernel, dense_bias = dense.get_weights()
+    weights = {'lstm_kernel': kernel, 'lstm_recurrent': recurrent, 'dense_kernel': dense_kernel}
+
+    config = {
+        'activation': lstm_cfg['activation'],
+        'recurrent_activation': lstm_cfg['recurrent_activation'],
+        'dtype': dtype,
+    }
+    arrays = {
+        'lstm_bias': bias.astype(np.float32),
+        'dense_bias': dense_bias.astype(np.float32),
+    }
+    for name in MATRICES:
+        for suffix, arr in _quantize(weights[name], dtype).items():
+            arrays[name + suffix] = arr
+
+    if path.endswith('.npz'):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **arrays, **config)
+        os.replace(tmp_path, path)
+        size_kb = os.path.getsize(path) / 1024
+    else:
+        tmp_path = path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp_path, f'{name}.npy'), arr)
+        with open(os.path.join(tmp_path, 'config.json'), 'w') as f:
+            json.dump(config, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        size_kb = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 1024
+    print(f"📦 Exported {dtype} inference weights to {os.path.basename(path)} ({size_kb:.1f} KB)")
+    return path
+
+def load_inference_model(path=INFERENCE_FILE):
+    """
+    Load an exported model into the NumPy runtime (no TensorFlow import).
+    Directory exports are memory-mapped rather than read into memory.
+    """
+    if os.path.isdir(path):
+        with open(os.path.join(path, 'config.json')) as f:
+            config = json.load(f)
+        data = {os.path.splitext(name)[0]: np.load(os.path.join(path, name), mmap_mode='r')
+                for name in os.listdir(path) if name.endswith('.npy')}
+    else:
+        with np.load(path) as npz:
+            data = {k: npz[k] for k in npz.files}
+        config = {k: str(data.pop(k)) for k in ('activation', 'recurrent_activation', 'dtype')}
+
+    weights = {name: _dequantize(data, name) for name in MATRICES}
+    weights['lstm_bias'] = np.asarray(data['lstm_bias'])
+    weights['dense_bias'] = np.asarray(data['dense_bias'])
+    return NumpyLSTM(weights, config['activation'], config['recurrent_activation'])
+
+def inference_model_is_current(path=INFERENCE_FILE, model_file=MODEL_FILE):
+    """
+    True if the export exists and is not older than the keras model it came from.
+    """
+    if not os.path.exists(path):
+        return False
+    return not os.path.exists(model_file) or os.path.getmtime(path) >= os.path.getmtime(model_file)
+
+def load_forecaster(model_file=MODEL_FILE, path=INFERENCE_FILE, runtime=INFERENCE_RUNTIME):
+    """
+    Model for predictions: the NumPy runtime when its export is current,
+    otherwise the keras model (TensorFlow imported only then).
+    """
+    if runtime == 'numpy' and inference_model_is_current(path, model_file):
+        print("⚡ Using exported NumPy inference runtime")
+        return load_inference_model(path)
+    if runtime == 'numpy':
+        print("⚠️ No up-to-date exported model; falling back to keras (run lstm_export.py)")
+    from tensorflow import keras
+    return keras.models.load_model(model_file)
+
+def check_parity(keras_model, runtime, n_windows=2048, window_size=5, n_features=8, seed=0):
+    """
+    Compare runtime predictions with keras on random scaled windows.
+    Returns the max absolute difference.
+    """
+    X = np.random.default_rng(seed).random((n_windows, window_size, n_features), dtype=np.float32)
+    expected = keras_model.predict(X, verbose=0).reshape(-1)
+    actual = runtime.predict(X).reshape(-1)
+    return float(np.max(np.abs(expected - actual)))
+
+def benchmark(model_file=MODEL_FILE, path=INFERENCE_FILE, n_windows=100000, window_size=5,
+              n_features=8, batch_size=4096, repeats=3):
+    """
+    Startup time (import + load) and predictions/s of the NumPy runtime vs keras.
+    """
+    from lstm_utils import predict_in_batches
+    X = np.random.default_rng(0).random((n_windows, window_size, n_features), dtype=np.float32)
+    results = {}
+
+    def timed_predict(model):
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            predict_in_batches(model, X, batch_size=batch_size)
+            best = min(best, time.perf_counter() - start)
+        return n_windows / best
+
+    start = time.perf_counter()
+    runtime = load_inference_model(path)
+    results['numpy'] = (time.perf_counter() - start, timed_predict(runtime))
+
+    start = time.perf_counter()
+    from tensorflow import keras
+    keras_model = keras.models.load_model(model_file)
+    results['keras'] = (time.perf_counter() - start, timed_predict(keras_model))
+
+    for name, (startup, rate) in results.items():
+        print(f"📊 {name:>5}: startup {startup:.2f}s, {rate:,.0f} predictions/s")
+    return results
+
+# --- Entrypoint ---
+if __name__ == "__main__":
+    # python lstm_export.py [export|parity|bench] [float32|float16|int8]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'export'
+    dtype = sys.argv[2] if len(sys.argv) > 2 else EXPORT_WEIGHTS_DTYPE
+
+    # Work on the registry's current version (legacy files if there is none)
+    from model_registry import current_artifacts
+    artifacts = current_artifacts()
+    if artifacts is None:
+        print("⚠️ No model to export")
+        sys.exit(2)
+
+    if command == 'bench':
+        benchmark(artifacts['model_file'], artifacts['inference_path'])
+    else:
+        from tensorflow import keras
+        keras_model = keras.models.load_model(artifacts['model_file'])
+        if command == 'export':
+            export_inference_model(keras_model, artifacts['inference_path'], dtype=dtype)
+        elif command == 'parity':
+            tolerance = {'float32': 1e-4, 'float16': 1e-2, 'int8': 5e-2}[dtype]
+            # Export to a scratch file so the served export is left alone
+            path = os.path.join(tempfile.gettempdir(), f'parity_lstm_{dtype}.npz')
+            export_inference_model(keras_model, path, dtype=dtype)
+            diff = check_parity(keras_model, load_inference_model(path))
+            status = "✅" if diff <= tolerance else "⚠️"
+            print(f"{status} {dtype} max |keras - numpy| = {diff:.2e} (tolerance {tolerance:.0e})")
+            if diff > tolerance:
+                sys.exit(1)
+        else:
+            print(f"⚠️ Unknown command: {command}")
+            sys.exit(2)
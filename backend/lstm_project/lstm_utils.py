@@ -1,17 +1,51 @@
 import os
+import json
+from functools import lru_cache
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
 from sklearn.preprocessing import MinMaxScaler
-import joblib
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 # ✅ Load environment variables
 load_dotenv()
 
+SALES_COLUMNS = ['store_id', 'sku_id', 'year', 'day', 'date', 'type_of_day',
+                 'initial', 'sold', 'returns', 'donations',
+                 'reroutes_in', 'reroutes_out', 'recycled', 'final']
+
+FEATURES = ['initial', 'sold', 'returns', 'donations',
+            'reroutes_in', 'reroutes_out', 'recycled', 'final']
+
+# Compact dtypes for streamed batches; counters are int32 since aggregated
+# (e.g. weekly) rows can exceed int16
+SALES_DTYPES = {
+    'store_id': 'category', 'sku_id': 'category', 'type_of_day': 'category',
+    'year': 'int16', 'day': 'int16',
+    'initial': 'int32', 'final': 'int32',
+    'sold': 'int32', 'returns': 'int32', 'donations': 'int32',
+    'reroutes_in': 'int32', 'reroutes_out': 'int32', 'recycled': 'int32',
+}
+
+CHUNK_SIZE = int(os.getenv("SALES_CHUNK_SIZE", "50000"))
+
+SALES_ORDER = {
+    'date': "date, store_id, sku_id",
+    'series': "store_id, sku_id, date",
+}
+
+# --- Local columnar cache (Arrow IPC segments, memory-mapped on read) ---
+SALES_CACHE = os.getenv("SALES_CACHE", "0") == "1"
+SALES_CACHE_DIR = os.getenv("SALES_CACHE_DIR",
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales_cache"))
+_cache_synced = False
+
+@lru_cache(maxsize=1)
 def get_engine():
     """
     Create SQLAlchemy engine for autodb using environment variables.
+    The engine (and its connection pool) is shared by every caller.
     """
     dbname = os.getenv("AUTODB_NAME")
     user = os.getenv("AUTODB_USER")
@@ -20,74 +54,592 @@ def get_engine():
     port = os.getenv("AUTODB_PORT", "5432")   # default to 5432 if not set
     return create_engine(f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{dbname}")
 
+def compact_sales_frame(df):
+    """
+    Cast a sales_data frame to compact dtypes (category ids, small ints, datetime64 date).
+    Counter columns holding NULLs are left as floats. Raises ValueError rather
+    than letting a value wrap around its integer dtype.
+    """
+    for col, dtype in SALES_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype != 'category' and df[col].isna().any():
+            df[col] = df[col].astype('float32')
+        elif dtype != 'category':
+            limits = np.iinfo(dtype)
+            if len(df) and (df[col].min() < limits.min or df[col].max() > limits.max):
+                raise ValueError(f"sales_data.{col} has values outside {dtype} "
+                                 f"[{df[col].min()}, {df[col].max()}]")
+            df[col] = df[col].astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+    return df
+
+def iter_sales_data(start_year, end_year, chunk_size=CHUNK_SIZE, series=None,
+                    after_date=None, use_cache=None, order='date', stores=None):
+    """
+    Stream sales_data between given years using a server-side cursor, in date
+    order or, with order='series', grouped by (store_id, sku_id) then date.
+    Yields compact DataFrames of at most chunk_size rows.
+    series optionally limits the read to (store_id, sku_id) pairs, e.g. the
+    output of fetch_changed_series; stores to a set of store_ids (a shard);
+    after_date keeps only later rows.
+    With SALES_CACHE=1 the rows come from the local cache, which is
+    brought up to date once per process.
+    """
+    if use_cache is None:
+        use_cache = SALES_CACHE
+    if use_cache:
+        yield from iter_cached_sales(start_year, end_year, chunk_size, series, after_date, order, stores)
+        return
+
+    params = {'start_date': f"{start_year}-01-01", 'end_date': f"{end_year}-12-31",
+              'start_year': int(start_year), 'end_year': int(end_year)}
+    extra_filter = ""
+    if series is not None:
+        series = pd.DataFrame(series, columns=['store_id', 'sku_id'])
+        params['stores'] = series['store_id'].astype(str).tolist()
+        params['skus'] = series['sku_id'].astype(str).tolist()
+        extra_filter += """
+          AND (store_id, sku_id) IN (
+              SELECT * FROM unnest(CAST(:stores AS text[]), CAST(:skus AS text[])))"""
+    if stores is not None:
+        params['shard_stores'] = [str(s) for s in stores]
+        extra_filter += "\n          AND store_id = ANY(CAST(:shard_stores AS text[]))"
+    if after_date is not None:
+        params['after_date'] = str(pd.Timestamp(after_date).date())
+        extra_filter += "\n          AND date > :after_date"
+    query = text(f"""
+        SELECT {', '.join(SALES_COLUMNS)}
+        FROM sales_data
+        WHERE year BETWEEN :start_year AND :end_year  -- lets Postgres prune year partitions
+          AND date >= :start_date AND date <= :end_date{extra_filter}
+        ORDER BY {SALES_ORDER[order]}
+    """)
+    with get_engine().connect().execution_options(
+            stream_results=True, max_row_buffer=chunk_size) as conn:
+        for chunk in pd.read_sql(query, conn, params=params, chunksize=chunk_size):
+            yield compact_sales_frame(chunk)
+
+def fetch_series_tail(through_date, n_rows, start_year=2021, use_cache=None):
+    """
+    The last n_rows rows of every series on or before through_date, counted
+    in rows rather than days so it works at any data granularity. Returned
+    as one compact frame in (store_id, sku_id, date) order.
+    """
+    if use_cache is None:
+        use_cache = SALES_CACHE
+    through = pd.Timestamp(through_date)
+    if use_cache:
+        frames = [c[c['date'] <= through] for c in iter_cached_sales(start_year, through.year, order='series')]
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=SALES_COLUMNS)
+        df = compact_sales_frame(df)
+        return df.groupby(['store_id', 'sku_id'], sort=False, observed=True).tail(n_rows).reset_index(drop=True)
+
+    query = text(f"""
+        SELECT {', '.join(SALES_COLUMNS)}
+        FROM (
+            SELECT {', '.join(SALES_COLUMNS)},
+                   ROW_NUMBER() OVER (PARTITION BY store_id, sku_id ORDER BY date DESC) AS rn
+            FROM sales_data
+            WHERE year BETWEEN :start_year AND :end_year
+              AND date <= :through_date
+        ) tail
+        WHERE rn <= :n_rows
+        ORDER BY {SALES_ORDER['series']}
+    """)
+    params = {'start_year': int(start_year), 'end_year': through.year,
+              'through_date': str(through.date()), 'n_rows': int(n_rows)}
+    with get_engine().connect() as conn:
+        return compact_sales_frame(pd.read_sql(query, conn, params=params))
+
+# --- Local columnar sales cache ---
+
+def _cache_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('store_id', pa.string()), ('sku_id', pa.string()),
+        ('year', pa.int16()), ('day', pa.int16()), ('date', pa.date32()),
+        ('type_of_day', pa.string()),
+        *[(c, pa.int32()) for c in FEATURES],
+    ])
+
+def _manifest_path():
+    return os.path.join(SALES_CACHE_DIR, "manifest.json")
+
+def read_cache_manifest():
+    """
+    Return the cache manifest: {'watermark': 'YYYY-MM-DD' or None, 'rows': int, 'segments': [...]}.
+    """
+    if not os.path.exists(_manifest_path()):
+        return {'watermark': None, 'rows': 0, 'segments': []}
+    with open(_manifest_path()) as f:
+        return json.load(f)
+
+def _write_manifest(manifest):
+    tmp = _manifest_path() + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, _manifest_path())
+
+def db_sales_stats(through_date=None):
+    """
+    Row count and max date of sales_data in the DB, optionally up to a date.
+    """
+    where = "WHERE date <= :through" if through_date else ""
+    with get_engine().connect() as conn:
+        count, max_date = conn.execute(
+            text(f"SELECT COUNT(*), MAX(date) FROM sales_data {where}"),
+            {'through': through_date}
+        ).one()
+    return count, (str(max_date) if max_date else None)
+
+def check_sales_cache():
+    """
+    Compare cached rows with the DB up to the cache watermark.
+    True when they match, i.e. no late or deleted rows behind the watermark.
+    """
+    manifest = read_cache_manifest()
+    if manifest['watermark'] is None:
+        return manifest['rows'] == 0
+    count, _ = db_sales_stats(manifest['watermark'])
+    ok = count == manifest['rows']
+    if not ok:
+        print(f"⚠️ Sales cache mismatch: {manifest['rows']} cached vs {count} in DB "
+              f"up to {manifest['watermark']}")
+    return ok
+
+def update_sales_cache(chunk_size=CHUNK_SIZE):
+    """
+    Append rows newer than the cache watermark as a new Arrow IPC segment.
+    Rebuilds from scratch when the consistency check fails.
+    """
+    import pyarrow as pa
+
+    os.makedirs(SALES_CACHE_DIR, exist_ok=True)
+    manifest = read_cache_manifest()
+    if not check_sales_cache():
+        print("♻️ Rebuilding sales cache...")
+        for seg in manifest['segments']:
+            path = os.path.join(SALES_CACHE_DIR, seg)
+            if os.path.exists(path):
+                os.remove(path)
+        manifest = {'watermark': None, 'rows': 0, 'segments': []}
+        _write_manifest(manifest)
+
+    _, db_max = db_sales_stats()
+    if db_max is None or (manifest['watermark'] and db_max <= manifest['watermark']):
+        print(f"✅ Sales cache up to date ({manifest['rows']} rows through {manifest['watermark']})")
+        return manifest
+
+    schema = _cache_schema()
+    seg = f"part-{len(manifest['segments']):05d}.arrow"
+    tmp = os.path.join(SALES_CACHE_DIR, seg + ".tmp")
+    rows = 0
+    watermark = manifest['watermark']
+    start_year = int(watermark[:4]) if watermark else 1900
+    with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+        for chunk in iter_sales_data(start_year, int(db_max[:4]), chunk_size,
+                                     after_date=watermark, use_cache=False):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+            watermark = str(chunk['date'].max().date())
+    if not rows:
+        os.remove(tmp)
+        return manifest
+    os.replace(tmp, os.path.join(SALES_CACHE_DIR, seg))
+
+    manifest = {'watermark': watermark, 'rows': manifest['rows'] + rows,
+                'segments': manifest['segments'] + [seg]}
+    _write_manifest(manifest)
+    print(f"✅ Appended {rows} rows to sales cache (now {manifest['rows']} through {watermark})")
+    return manifest
+
+def open_sales_cache():
+    """
+    Open all cache segments zero-copy (memory-mapped) as one Arrow table.
+    """
+    import pyarrow as pa
+    manifest = read_cache_manifest()
+    tables = [
+        pa.ipc.open_file(pa.memory_map(os.path.join(SALES_CACHE_DIR, seg), 'r')).read_all()
+        for seg in manifest['segments']
+    ]
+    return pa.concat_tables(tables) if tables else _cache_schema().empty_table()
+
+def iter_cached_sales(start_year, end_year, chunk_size=CHUNK_SIZE, series=None, after_date=None,
+                      order='date', stores=None):
+    """
+    Same contract as iter_sales_data, served from the local cache.
+    """
+    global _cache_synced
+    if not _cache_synced:
+        update_sales_cache(chunk_size)
+        _cache_synced = True
+
+    start = pd.Timestamp(f"{start_year}-01-01")
+    end = pd.Timestamp(f"{end_year}-12-31")
+    if after_date is not None:
+        start = max(start, pd.Timestamp(after_date) + pd.Timedelta(days=1))
+    if series is not None:
+        series = pd.DataFrame(series, columns=['store_id', 'sku_id'])
+        keys = pd.MultiIndex.from_frame(series.astype(str))
+
+    table = open_sales_cache()
+    if stores is not None:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        table = table.filter(pc.is_in(table['store_id'], value_set=pa.array([str(s) for s in stores])))
+    if order == 'series':
+        # Segments are in date order; gather series-ordered batches by index
+        import pyarrow.compute as pc
+        sort_idx = pc.sort_indices(table, sort_keys=[('store_id', 'ascending'),
+                                                     ('sku_id', 'ascending'),
+                                                     ('date', 'ascending')])
+        batches = (table.take(sort_idx[i:i + chunk_size]) for i in range(0, len(sort_idx), chunk_size))
+    else:
+        batches = table.to_batches(max_chunksize=chunk_size)
+
+    for batch in batches:
+        chunk = compact_sales_frame(batch.to_pandas())
+        chunk = chunk[(chunk['date'] >= start) & (chunk['date'] <= end)]
+        if series is not None:
+            pairs = pd.MultiIndex.from_arrays([chunk['store_id'].astype(str), chunk['sku_id'].astype(str)])
+            chunk = chunk[pairs.isin(keys)]
+        if len(chunk):
+            yield chunk.reset_index(drop=True)
+
 def fetch_sales_data(start_year, end_year):
     """
     Fetch full sales_data from autodb between given years.
     """
     print("🔍 Fetching sales_data from autodb...")
-    engine = get_engine()
-    query = f"""
-        SELECT store_id, sku_id, year, day, date, type_of_day,
-               initial, sold, returns, donations, reroutes_in, reroutes_out, recycled, final
-        FROM sales_data
-        WHERE date >= '{start_year}-01-01' AND date <= '{end_year}-12-31'
-        ORDER BY date
-    """
-    df = pd.read_sql(query, engine)
+    chunks = list(iter_sales_data(start_year, end_year))
+    if chunks:
+        df = pd.concat(chunks, ignore_index=True)
+        # Per-chunk categories differ, so concat falls back to object
+        df = compact_sales_frame(df)
+    else:
+        df = pd.DataFrame(columns=SALES_COLUMNS)
     print(f"✅ Fetched {len(df)} rows from sales_data")
     return df
 
-def preprocess(df, window_size=5):
+def fetch_changed_series(synced_at=None):
+    """
+    Fetch the changed-series manifest written by the per-series sync.
+    Defaults to the latest sync run; returns store_id, sku_id, min_date, max_date.
+    """
+    query = text("""
+        SELECT store_id, sku_id, min_date, max_date
+        FROM sync_changed_series
+        WHERE synced_at = COALESCE(CAST(:synced_at AS timestamptz),
+                                   (SELECT MAX(synced_at) FROM sync_changed_series))
+    """)
+    with get_engine().connect() as conn:
+        df = pd.read_sql(query, conn, params={'synced_at': synced_at})
+    print(f"✅ {len(df)} changed series in sync manifest")
+    return df
+
+def fit_scaler(chunks):
+    """
+    Fit a MinMaxScaler over streamed sales chunks with partial_fit.
+    Returns the scaler and the number of rows seen.
+    """
+    scaler = MinMaxScaler()
+    n_rows = 0
+    for chunk in chunks:
+        if len(chunk):
+            scaler.partial_fit(chunk[FEATURES])
+            n_rows += len(chunk)
+    return scaler, n_rows
+
+def fit_scaler_with_dates(chunks):
+    """
+    Like fit_scaler, but also count rows per date for split_cutoff.
+    Returns scaler, n_rows and a date-sorted Series of row counts.
+    """
+    date_counts = []
+
+    def counted(chunks):
+        for chunk in chunks:
+            date_counts.append(chunk['date'].value_counts())
+            yield chunk
+
+    scaler, n_rows = fit_scaler(counted(chunks))
+    if date_counts:
+        counts = pd.concat(date_counts).groupby(level=0).sum().sort_index()
+    else:
+        counts = pd.Series(dtype='int64')
+    return scaler, n_rows, counts
+
+def split_cutoff(date_counts, train_frac=0.8):
+    """
+    First date of the validation period: rows before it make up about
+    train_frac of the data. Deterministic for a given dataset.
+    """
+    if date_counts.empty:
+        return None
+    cum = date_counts.cumsum() / date_counts.sum()
+    after = cum[cum > train_frac]
+    return after.index[0] if len(after) else date_counts.index[-1]
+
+def _make_windows(scaled, window_size):
+    """
+    Build LSTM input windows and 'sold' targets from a scaled feature array.
+    X is a read-only strided view over scaled (no copy): X[j] is
+    scaled[j:j + window_size] and y[j] is the 'sold' value right after it.
+    """
+    n_features = scaled.shape[1]
+    if len(scaled) <= window_size:
+        return (np.empty((0, window_size, n_features), dtype=scaled.dtype),
+                np.empty(0, dtype=scaled.dtype))
+    X = sliding_window_view(scaled, (window_size, n_features))[:-1, 0]
+    y = scaled[window_size:, FEATURES.index('sold')]  # predict 'sold'
+    return X, y
+
+def iter_window_batches(X, y=None, batch_size=4096):
+    """
+    Materialize strided windows batch by batch as contiguous arrays.
+    Yields X batches, or (X, y) batches when y is given.
+    """
+    for start in range(0, len(X), batch_size):
+        X_batch = np.ascontiguousarray(X[start:start + batch_size])
+        if y is None:
+            yield X_batch
+        else:
+            yield X_batch, np.ascontiguousarray(y[start:start + batch_size])
+
+def predict_in_batches(model, X, batch_size=4096):
+    """
+    Run model.predict over strided windows without materializing all of X.
+    """
+    preds = [model.predict(X_batch, verbose=0).reshape(-1)
+             for X_batch in iter_window_batches(X, batch_size=batch_size)]
+    return np.concatenate(preds) if preds else np.empty(0, dtype=np.float32)
+
+def iter_windows(chunks, scaler, window_size=5, with_meta=False):
+    """
+    Turn streamed sales chunks into (X, y) or (X, y, meta) batches.
+
+    The last window_size rows of each chunk are carried into the next one, so
+    the windows are identical to running preprocess over the concatenated data.
+    meta is a DataFrame of store_id, sku_id, date aligned with y.
+    """
+    tail = np.empty((0, len(FEATURES)), dtype=np.float32)
+    for chunk in chunks:
+        if not len(chunk):
+            continue
+        scaled = scaler.transform(chunk[FEATURES]).astype(np.float32)
+        combined = np.concatenate([tail, scaled])
+        X, y = _make_windows(combined, window_size)
+        tail = combined[-window_size:]
+        if not len(X):
+            continue
+        if with_meta:
+            meta = chunk[['store_id', 'sku_id', 'date']].iloc[len(chunk) - len(X):]
+            yield X, y, meta.reset_index(drop=True)
+        else:
+            yield X, y
+
+# --- Series-aware window index ---
+
+def _offset_dtype(n):
+    return np.int32 if n < np.iinfo(np.int32).max else np.int64
+
+def build_window_index(df, window_size=5):
+    """
+    Precompute LSTM windows per (store_id, sku_id) series, sorted by date.
+
+    Returns a dict of compact integer arrays:
+      order          row permutation that groups df by series, then date
+      series_offsets CSR offsets of each series in sorted order
+      window_offsets CSR offsets of each series' windows
+      window_ends    sorted position of each window's target row
+      window_series  series code of each window
+    plus series_keys (store_id, sku_id per code) and window_size. A window
+    never spans two series.
+    """
+    n = len(df)
+    dtype = _offset_dtype(n + 1)
+    store = df['store_id'].astype(str).to_numpy()
+    sku = df['sku_id'].astype(str).to_numpy()
+    order = np.lexsort((df['date'].to_numpy(), sku, store)).astype(dtype)
+
+    s_store, s_sku = store[order], sku[order]
+    new_series = np.ones(n, dtype=bool)
+    new_series[1:] = (s_store[1:] != s_store[:-1]) | (s_sku[1:] != s_sku[:-1])
+    series_starts = np.flatnonzero(new_series)
+    series_offsets = np.append(series_starts, n).astype(dtype)
+
+    n_windows = np.maximum(np.diff(series_offsets) - window_size, 0)
+    window_offsets = np.concatenate([[0], np.cumsum(n_windows)]).astype(dtype)
+    window_series = np.repeat(np.arange(len(series_starts), dtype=np.int32), n_windows)
+    within = np.arange(window_offsets[-1], dtype=dtype) - window_offsets[window_series]
+    window_ends = (series_offsets[window_series] + window_size + within).astype(dtype)
+
+    return {
+        'window_size': window_size,
+        'order': order,
+        'series_offsets': series_offsets,
+        'window_offsets': window_offsets,
+        'window_ends': window_ends,
+        'window_series': window_series,
+        'series_keys': pd.DataFrame({'store_id': s_store[series_starts],
+                                     'sku_id': s_sku[series_starts]}),
+    }
+
+def series_codes(index, series):
+    """
+    Map (store_id, sku_id) pairs to series codes of the index; unknown pairs are dropped.
+    """
+    keys = index['series_keys'].assign(code=np.arange(len(index['series_keys'])))
+    wanted = pd.DataFrame(series, columns=['store_id', 'sku_id']).astype(str)
+    return wanted.merge(keys, on=['store_id', 'sku_id'])['code'].to_numpy()
+
+def select_windows(index, last_n=None, series=None):
+    """
+    Positions into index['window_ends'] for all windows, the last_n windows
+    of every series, and/or only the given (store_id, sku_id) series.
+    """
+    offsets = index['window_offsets']
+    if series is None:
+        if last_n is None:
+            return np.arange(offsets[-1], dtype=offsets.dtype)
+        codes = np.arange(len(offsets) - 1)
+    else:
+        codes = series_codes(index, series)
+    starts, ends = offsets[codes], offsets[codes + 1]
+    if last_n is not None:
+        starts = np.maximum(starts, ends - last_n)
+    lengths = ends - starts
+    return (np.arange(lengths.sum(), dtype=offsets.dtype)
+            + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths))
+
+def gather_windows(scaled_sorted, index, selection=None):
+    """
+    Materialize X, y for the selected windows from features already in
+    index['order'] (scaled[index['order']]). Only selected windows are copied.
+    """
+    ends = index['window_ends'] if selection is None else index['window_ends'][selection]
+    window_size = index['window_size']
+    X, _ = _make_windows(scaled_sorted, window_size)
+    return X[ends - window_size], scaled_sorted[ends, FEATURES.index('sold')]
+
+def window_meta(df, index, selection=None):
+    """
+    store_id, sku_id, date of each selected window's target row, as a dict of arrays.
+    """
+    ends = index['window_ends'] if selection is None else index['window_ends'][selection]
+    rows = index['order'][ends]
+    return {col: df[col].to_numpy()[rows] for col in ('store_id', 'sku_id', 'date')}
+
+def save_window_index(index, path):
+    arrays = {k: v for k, v in index.items() if isinstance(v, np.ndarray)}
+    np.savez(path, window_size=index['window_size'],
+             series_store=index['series_keys']['store_id'].to_numpy(dtype=str),
+             series_sku=index['series_keys']['sku_id'].to_numpy(dtype=str), **arrays)
+
+def load_window_index(path):
+    with np.load(path) as data:
+        index = {k: data[k] for k in data.files if k not in ('series_store', 'series_sku')}
+        index['window_size'] = int(index['window_size'])
+        index['series_keys'] = pd.DataFrame({'store_id': data['series_store'],
+                                             'sku_id': data['series_sku']})
+    return index
+
+def iter_series_frames(chunks):
+    """
+    Regroup series-ordered chunks (order='series') so each yielded frame holds
+    only complete series. The last series of a chunk may continue in the next
+    one, so it is held back and prepended to the following chunk.
+    """
+    carry = None
+    for chunk in chunks:
+        if not len(chunk):
+            continue
+        frame = chunk if carry is None else pd.concat([carry, chunk], ignore_index=True)
+        last = ((frame['store_id'] == frame['store_id'].iloc[-1])
+                & (frame['sku_id'] == frame['sku_id'].iloc[-1])).to_numpy()
+        carry = frame[last]
+        if not last.all():
+            yield frame[~last]
+    if carry is not None and len(carry):
+        yield carry
+
+def iter_series_windows(chunks, scaler, window_size=5, with_meta=False, last_n=None, stats=None):
+    """
+    Series-aware counterpart of iter_windows for chunks read with
+    order='series'; see iter_series_frames. No window crosses a series.
+    last_n keeps only each series' most recent windows. A stats dict, if
+    given, accumulates 'windows' (available) and 'selected' counts.
+    """
+    def windows(frame):
+        if not len(frame):
+            return
+        index = build_window_index(frame, window_size)
+        selection = select_windows(index, last_n=last_n)
+        if stats is not None:
+            stats['windows'] = stats.get('windows', 0) + int(index['window_offsets'][-1])
+            stats['selected'] = stats.get('selected', 0) + len(selection)
+        if not len(selection):
+            return
+        scaled = scaler.transform(frame[FEATURES]).astype(np.float32)[index['order']]
+        X, y = gather_windows(scaled, index, selection)
+        if with_meta:
+            yield X, y, pd.DataFrame(window_meta(frame, index, selection))
+        else:
+            yield X, y
+
+    for frame in iter_series_frames(chunks):
+        yield from windows(frame)
+
+def preprocess(df, window_size=5, index=None):
     """
     Scale numerical columns and create LSTM input windows.
+    With a window index (build_window_index) windows are built per series.
     """
     print("⚙️ Preprocessing data...")
 
-    features = ['initial', 'sold', 'returns', 'donations', 
-                'reroutes_in', 'reroutes_out', 'recycled', 'final']
+    features = FEATURES
 
     scaler = MinMaxScaler()
     scaled = scaler.fit_transform(df[features])
+    # The scaler is saved with its model by model_registry.publish_model
 
-    # Save scaler locally for later inference/retrain
-    joblib.dump(scaler, "scaler.pkl")
-    print("✅ Saved scaler to scaler.pkl")
-
-    X, y = [], []
-    for i in range(window_size, len(scaled)):
-        X.append(scaled[i - window_size:i])
-        y.append(scaled[i][features.index('sold')])  # predict 'sold'
-
-    X, y = np.array(X), np.array(y)
+    if index is not None:
+        X, y = gather_windows(scaled[index['order']], index)
+    else:
+        X, y = _make_windows(scaled, window_size)
     print(f"✅ Created sequences: X shape {X.shape}, y shape {y.shape}")
     return X, y, scaler
 
-def preprocess_with_meta(df, window_size=5):
+def preprocess_with_meta(df, window_size=5, index=None):
     """
-    Same as preprocess, but also return metadata (store_id, sku_id, date).
+    Same as preprocess, but also return metadata (store_id, sku_id, date)
+    as a dict of arrays aligned with y.
     """
     print("⚙️ Preprocessing data with metadata...")
 
-    features = ['initial', 'sold', 'returns', 'donations', 
-                'reroutes_in', 'reroutes_out', 'recycled', 'final']
+    features = FEATURES
 
     scaler = MinMaxScaler()
     scaled = scaler.fit_transform(df[features])
 
-    joblib.dump(scaler, "scaler.pkl")
-    print("✅ Saved scaler to scaler.pkl")
-
-    X, y, meta = [], [], []
+    if index is not None:
+        X, y = gather_windows(scaled[index['order']], index)
+        meta = window_meta(df, index)
+        print(f"✅ Created sequences: X shape {X.shape}, y shape {y.shape}")
+        return X, y, meta
 
-    for i in range(window_size, len(scaled)):
-        X.append(scaled[i - window_size:i])
-        y.append(scaled[i][features.index('sold')])
-        meta.append({
-            'store_id': df.iloc[i]['store_id'],
-            'sku_id': df.iloc[i]['sku_id'],
-            'date': df.iloc[i]['date']
-        })
+    X, y = _make_windows(scaled, window_size)
+    # Columnar metadata aligned with y (pd.DataFrame(meta) gives one row per window)
+    meta = {
+        'store_id': df['store_id'].to_numpy()[window_size:],
+        'sku_id': df['sku_id'].to_numpy()[window_size:],
+        'date': df['date'].to_numpy()[window_size:],
+    }
 
-    X, y = np.array(X), np.array(y)
     print(f"✅ Created sequences: X shape {X.shape}, y shape {y.shape}")
     return X, y, meta
@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import joblib
+import numpy as np
+from datetime import datetime
+from dotenv import load_dotenv
+from lstm_utils import FEATURES
+from lstm_export import (EXPORT_WEIGHTS_DTYPE, INFERENCE_RUNTIME, export_inference_model,
+                         load_inference_model, inference_model_is_current)
+
+# ✅ Load environment variables
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR") or os.path.join(BASE_DIR, 'model_registry')
+
+# Pre-registry artifacts, still served when the registry is empty
+LEGACY_MODEL_FILE = os.path.join(BASE_DIR, 'base_lstm_model.h5')
+LEGACY_INFERENCE_FILE = os.path.join(BASE_DIR, 'base_lstm_model.npz')
+LEGACY_SCALER_FILE = os.path.join(BASE_DIR, 'scaler.pkl')
+
+# Files inside a version directory
+MODEL_NAME = 'model.h5'
+WEIGHTS_NAME = 'weights'
+SCALER_NAME = 'scaler.pkl'
+MANIFEST_NAME = 'manifest.json'
+
+_loaded = {}
+
+# --- Layout ---
+
+def _versions_dir(registry_dir=REGISTRY_DIR):
+    return os.path.join(registry_dir, 'versions')
+
+def version_dir(version, registry_dir=REGISTRY_DIR):
+    return os.path.join(_versions_dir(registry_dir), version)
+
+def current_version(registry_dir=REGISTRY_DIR):
+    """
+    Version hash the CURRENT pointer refers to, or None for an empty registry.
+    """
+    path = os.path.join(registry_dir, 'CURRENT')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read().strip() or None
+
+def set_current(version, registry_dir=REGISTRY_DIR):
+    """
+    Atomically point CURRENT at an existing version.
+    """
+    if not os.path.isdir(version_dir(version, registry_dir)):
+        raise ValueError(f"Unknown model version: {version}")
+    tmp = os.path.join(registry_dir, 'CURRENT.tmp')
+    with open(tmp, 'w') as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(registry_dir, 'CURRENT'))
+
+def read_manifest(version, registry_dir=REGISTRY_DIR):
+    with open(os.path.join(version_dir(version, registry_dir), MANIFEST_NAME)) as f:
+        return json.load(f)
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    """
+    Manifests of all published versions, oldest first.
+    """
+    if not os.path.isdir(_versions_dir(registry_dir)):
+        return []
+    manifests = [read_manifest(v, registry_dir) for v in os.listdir(_versions_dir(registry_dir))
+                 if os.path.exists(os.path.join(version_dir(v, registry_dir), MANIFEST_NAME))]
+    return sorted(manifests, key=lambda m: m['created_at'])
+
+# --- Publishing ---
+
+def _content_hash(weights_dir, scaler, features, window_size):
+    """
+    Hash of what determines predictions: exported weights, scaler params,
+    feature list and window size. Identical models map to the same version.
+    """
+    h = hashlib.sha256(json.dumps({'features': list(features), 'window_size': window_size}).encode())
+    for name in sorted(os.listdir(weights_dir)):
+        with open(os.path.join(weights_dir, name), 'rb') as f:
+            h.update(name.encode())
+            h.update(f.read())
+    for attr in ('min_', 'scale_', 'data_min_', 'data_max_'):
+        h.update(np.asarray(getattr(scaler, attr), dtype=np.float64).tobytes())
+    return h.hexdigest()[:16]
+
+def publish_model(model, scaler, metrics=None, window_size=5, features=FEATURES,
+                  make_current=True, dtype=EXPORT_WEIGHTS_DTYPE, registry_dir=REGISTRY_DIR):
+    """
+    Store model, exported weights, scaler and manifest as one content-addressed
+    version. Everything is written to a staging directory and renamed into
+    place, and CURRENT is switched last, so readers never see a half-published
+    model or a scaler from another version. Returns the version hash.
+    """
+    os.makedirs(_versions_dir(registry_dir), exist_ok=True)
+    staging = os.path.join(registry_dir, f'.staging-{os.getpid()}-{time.time_ns()}')
+    os.makedirs(staging)
+    try:
+        model.save(os.path.join(staging, MODEL_NAME))
+        export_inference_model(model, os.path.join(staging, WEIGHTS_NAME), dtype=dtype)
+        joblib.dump(scaler, os.path.join(staging, SCALER_NAME))
+
+        version = _content_hash(os.path.join(staging, WEIGHTS_NAME), scaler, features, window_size)
+        manifest = {
+            'version': version,
+            'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'features': list(features),
+            'window_size': window_size,
+            'weights_dtype': dtype,
+            'metrics': {k: float(v) for k, v in (metrics or {}).items()},
+        }
+        with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        target = version_dir(version, registry_dir)
+        if os.path.isdir(target):
+            print(f"ℹ️ Model version {version} already published")
+        else:
+            os.replace(staging, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    if make_current:
+        set_current(version, registry_dir)
+    print(f"📦 Published model version {version}{' (current)' if make_current else ''}")
+    return version
+
+# --- Loading ---
+
+def _legacy_version(stamp):
+    h = hashlib.sha256(repr(stamp).encode())
+    return 'legacy-' + h.hexdigest()[:10]
+
+def current_artifacts(registry_dir=REGISTRY_DIR):
+    """
+    Paths and manifest of the current model: the registry's CURRENT version,
+    else the legacy files next to this script, else None.
+    """
+    version = current_version(registry_dir)
+    if version is not None:
+        vdir = version_dir(version, registry_dir)
+        return {
+            'version': version,
+            'model_file': os.path.join(vdir, MODEL_NAME),
+            'inference_path': os.path.join(vdir, WEIGHTS_NAME),
+            'scaler_file': os.path.join(vdir, SCALER_NAME),
+            'manifest': read_manifest(version, registry_dir),
+        }
+    if not os.path.exists(LEGACY_MODEL_FILE):
+        return None
+    stamp = [(os.stat(p).st_mtime_ns, os.stat(p).st_size) if os.path.exists(p) else None
+             for p in (LEGACY_MODEL_FILE, LEGACY_INFERENCE_FILE, LEGACY_SCALER_FILE)]
+    return {
+        'version': _legacy_version(stamp),
+        'model_file': LEGACY_MODEL_FILE,
+        'inference_path': LEGACY_INFERENCE_FILE,
+        'scaler_file': LEGACY_SCALER_FILE,
+        'manifest': {'features': FEATURES, 'window_size': 5, 'metrics': {}, 'legacy': True},
+    }
+
+def load_keras_model(artifacts=None):
+    from tensorflow import keras
+    artifacts = artifacts or current_artifacts()
+    return keras.models.load_model(artifacts['model_file'])
+
+def load_current(runtime=INFERENCE_RUNTIME, registry_dir=REGISTRY_DIR):
+    """
+    (model, scaler, manifest) of the current version. The NumPy runtime maps
+    the exported weights; keras is used when asked for or when there is no
+    export. Returns the already-loaded objects while the version is unchanged.
+    """
+    artifacts = current_artifacts(registry_dir)
+    if artifacts is None:
+        raise FileNotFoundError("No model published yet; run train_base_lstm.py")
+    key = (artifacts['version'], runtime)
+    if _loaded.get('key') == key:
+        return _loaded['model'], _loaded['scaler'], _loaded['manifest']
+
+    manifest = artifacts['manifest']
+    if list(manifest['features']) != FEATURES:
+        raise ValueError(f"Model {artifacts['version']} was trained on different features: {manifest['features']}")
+
+    if runtime == 'numpy' and inference_model_is_current(artifacts['inference_path'], artifacts['model_file']):
+        print(f"⚡ Using NumPy inference runtime for model {artifacts['version']}")
+        model = load_inference_model(artifacts['inference_path'])
+    else:
+        if runtime == 'numpy':
+            print("⚠️ No up-to-date exported model; falling back to keras (run lstm_export.py)")
+        model = load_keras_model(artifacts)
+    scaler = joblib.load(artifacts['scaler_file']) if os.path.exists(artifacts['scaler_file']) else None
+
+    _loaded.update(key=key, model=model, scaler=scaler, manifest=dict(manifest, version=artifacts['version']))
+    return _loaded['model'], _loaded['scaler'], _loaded['manifest']
+
+# --- Entrypoint ---
+if __name__ == "__main__":
+    # python model_registry.py [list | use <version> | import]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    if command == 'list':
+        current = current_version()
+        for m in list_versions():
+            marker = '➡️' if m['version'] == current else '  '
+            print(f"{marker} {m['version']}  {m['created_at']}  {m['weights_dtype']}  {m['metrics']}")
+    elif command == 'use':
+        set_current(sys.argv[2])
+        print(f"✅ Current model is now {sys.argv[2]}")
+    elif command == 'import':
+        # Publish the pre-registry base_lstm_model.h5 + scaler.pkl as a version
+        from tensorflow import keras
+        publish_model(keras.models.load_model(LEGACY_MODEL_FILE), joblib.load(LEGACY_SCALER_FILE))
+    else:
+        print(f"⚠️ Unknown command: {command}")
+        sys.exit(2)
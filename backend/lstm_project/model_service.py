@@ -0,0 +1,189 @@
+import os
+import asyncio
+import threading
+import numpy as np
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from lstm_utils import FEATURES, predict_in_batches
+from model_registry import REGISTRY_DIR, current_artifacts, load_current
+
+# ✅ Load environment variables
+load_dotenv()
+
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "5"))
+PREDICT_MAX_BATCH = int(os.getenv("PREDICT_MAX_BATCH", "4096"))
+PREDICT_MAX_WAIT_MS = float(os.getenv("PREDICT_MAX_WAIT_MS", "5"))
+
+# One loaded version: everything that must come from the same model
+ModelSnapshot = namedtuple('ModelSnapshot', ['model', 'scaler', 'version', 'window_size'])
+
+
+class ModelService:
+    """
+    Keeps the current registry model and its scaler loaded in memory and
+    swaps in a new version when the registry's CURRENT pointer moves.
+
+    Readers take self.model / self.scaler without locking: a reload builds the
+    new objects first and then swaps the references, so in-flight predictions
+    finish on the old model. Callers that need several of them to agree read
+    self.current, a ModelSnapshot swapped in one assignment.
+    """
+
+    def __init__(self, registry_dir=REGISTRY_DIR):
+        self.registry_dir = registry_dir
+        self.model = None
+        self.scaler = None
+        self.version = None
+        self.window_size = None
+        self.current = None
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def reload_if_changed(self):
+        """
+        Reload model and scaler if the current version hash changed. Returns
+        True on reload. A broken version keeps the current model; the next
+        check retries.
+        """
+        with self._lock:
+            try:
+                artifacts = current_artifacts(self.registry_dir)
+                if artifacts is None or artifacts['version'] == self.version:
+                    return False
+                model, scaler, manifest = load_current(registry_dir=self.registry_dir)
+            except Exception as e:
+                print(f"⚠️ Model reload failed, keeping current model: {e}")
+                return False
+            self.model, self.scaler, self.version = model, scaler, manifest['version']
+            self.window_size = manifest['window_size']
+            self.current = ModelSnapshot(model, scaler, self.version, self.window_size)
+            self.reloads += 1
+            print(f"✅ Loaded model version {self.version} (reload #{self.reloads})")
+            return True
+
+    def _watch(self, interval):
+        while not self._stop.wait(interval):
+            self.reload_if_changed()
+
+    def start(self, interval=MODEL_RELOAD_INTERVAL):
+        """
+        Load the model now and poll the registry for a new version in a daemon thread.
+        """
+        self.reload_if_changed()
+        threading.Thread(target=self._watch, args=(interval,), daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def scale_windows(self, windows):
+        """
+        Scale raw (n, window, features) windows with the loaded scaler.
+        Raises ValueError unless the shape is (n >= 1, window_size, len(FEATURES)).
+        """
+        windows = np.asarray(windows, dtype=np.float32)
+        expected = (self.window_size, len(FEATURES))
+        if windows.ndim != 3 or len(windows) == 0 or windows.shape[1:] != expected:
+            raise ValueError(f"expected shape (n>=1, {expected[0]}, {expected[1]}), got {windows.shape}")
+        n, w, f = windows.shape
+        return self.scaler.transform(windows.reshape(-1, f)).reshape(n, w, f).astype(np.float32)
+
+    def unscale_sold(self, preds):
+        """
+        Map scaled 'sold' predictions back to units (inverse MinMax for one column).
+        """
+        idx = FEATURES.index('sold')
+        return (np.asarray(preds) - self.scaler.min_[idx]) / self.scaler.scale_[idx]
+
+
+class PredictionBatcher:
+    """
+    Coalesces concurrent predict requests into single model.predict calls.
+
+    Requests queue up on the event loop; a background task takes everything
+    that arrives within max_wait_ms (up to max_batch windows), runs one predict
+    on a dedicated thread and hands each caller its slice of the result.
+    A request may pin a model (from a ModelSnapshot); only requests for the
+    same model share a batch, and unpinned ones use the service's current model.
+    """
+
+    def __init__(self, service, max_batch=PREDICT_MAX_BATCH, max_wait_ms=PREDICT_MAX_WAIT_MS):
+        self.service = service
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = ThreadPoolExecutor(max_workers=1)  # one predict at a time
+        self.loop = None
+        self.queue = None
+        self.task = None
+        self.stats = {'requests': 0, 'batches': 0, 'windows': 0}
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+        self.executor.shutdown(wait=False)
+
+    async def predict(self, X, model=None):
+        """
+        Predict scaled windows X of shape (n, window, features); returns n floats.
+        """
+        fut = self.loop.create_future()
+        await self.queue.put((X, fut, model))
+        return await fut
+
+    def predict_threadsafe(self, X, model=None):
+        """
+        Blocking predict for worker threads (e.g. run_abc_logic in a threadpool).
+        """
+        return asyncio.run_coroutine_threadsafe(self.predict(X, model), self.loop).result()
+
+    def _predict(self, X, model=None):
+        model = model if model is not None else self.service.model
+        if model is None:
+            raise RuntimeError("No model loaded")
+        return predict_in_batches(model, X, batch_size=self.max_batch)
+
+    async def _run(self):
+        pending = None
+        while True:
+            items = [pending if pending is not None else await self.queue.get()]
+            pending = None
+            model = items[0][2]
+            n = len(items[0][0])
+            deadline = self.loop.time() + self.max_wait
+            while n < self.max_batch:
+                timeout = deadline - self.loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item[2] is not model:
+                    # Pinned to another model: it starts the next batch
+                    pending = item
+                    break
+                items.append(item)
+                n += len(item[0])
+
+            try:
+                X = items[0][0] if len(items) == 1 else np.concatenate([x for x, _, _ in items])
+                preds = await self.loop.run_in_executor(self.executor, self._predict, X, model)
+            except Exception as e:
+                for _, fut, _ in items:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            self.stats['requests'] += len(items)
+            self.stats['batches'] += 1
+            self.stats['windows'] += len(X)
+            offsets = np.cumsum([len(x) for x, _, _ in items])[:-1]
+            for (_, fut, _), part in zip(items, np.split(preds, offsets)):
+                if not fut.done():
+                    fut.set_result(part)
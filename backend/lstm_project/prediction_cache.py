@@ -0,0 +1,154 @@
+import os
+import glob
+import fcntl
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+# ✅ Load environment variables
+load_dotenv()
+
+PREDICTION_CACHE = os.getenv("PREDICTION_CACHE", "1") == "1"
+PREDICTION_CACHE_DIR = os.getenv("PREDICTION_CACHE_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'prediction_cache')
+
+KEY_COLUMNS = ['store_id', 'sku_id', 'date']
+
+def model_version(version, scaler=None, runtime=''):
+    """
+    Short hash of the registry model version, the scaler's min/scale and the
+    runtime that serves predictions. Any change gives a new cache namespace.
+    """
+    h = hashlib.sha256(f'{version}|{runtime}'.encode())
+    if scaler is not None:
+        h.update(np.asarray(scaler.min_, dtype=np.float64).tobytes())
+        h.update(np.asarray(scaler.scale_, dtype=np.float64).tobytes())
+    return h.hexdigest()[:16]
+
+def invalidate_prediction_cache(cache_dir=PREDICTION_CACHE_DIR):
+    """
+    Drop every cached prediction, e.g. after a new model is saved. Versions
+    a running job still holds are left for the next open to drop.
+    """
+    if os.path.isdir(cache_dir):
+        for version in os.listdir(cache_dir):
+            _drop_unused(os.path.join(cache_dir, version))
+        print("🧹 Prediction cache invalidated")
+
+def _drop_unused(path):
+    """
+    Delete another version's cache directory unless a run holds its lock.
+    """
+    if not os.path.isdir(path):
+        return
+    with open(os.path.join(path, '.lock'), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class PredictionCache:
+    """
+    Persistent predictions keyed by (store_id, sku_id, window end date) under
+    one model version. Each run appends its new predictions as an .npz
+    segment; other versions' segments are dropped on open unless a run still
+    holds them. stores, if given, keeps only that shard's rows in memory.
+    """
+
+    def __init__(self, version, cache_dir=PREDICTION_CACHE_DIR, stores=None):
+        self.version = version
+        self.dir = os.path.join(cache_dir, version)
+        self.hits = 0
+        self.misses = 0
+        self._new = []
+
+        # Shared lock on this version until flush, so no other run deletes it
+        os.makedirs(self.dir, exist_ok=True)
+        self._lock = open(os.path.join(self.dir, '.lock'), 'a')
+        fcntl.flock(self._lock, fcntl.LOCK_SH)
+        for stale in os.listdir(cache_dir):
+            if stale != version:
+                _drop_unused(os.path.join(cache_dir, stale))
+
+        shard = None if stores is None else np.array([str(s) for s in stores])
+        parts = []
+        # Segments being written are named .tmp-*, so the glob never sees them
+        for path in sorted(glob.glob(os.path.join(self.dir, 'seg_*.npz'))):
+            with np.load(path) as data:
+                part = {k: data[k] for k in data.files}
+            if shard is not None:
+                keep = np.isin(part['store_id'], shard)
+                part = {k: v[keep] for k, v in part.items()}
+            parts.append(part)
+        if parts:
+            keys = {k: np.concatenate([p[k] for p in parts]) for k in KEY_COLUMNS}
+            self.values = np.concatenate([p['predicted_sales'] for p in parts])
+        else:
+            keys = {'store_id': np.empty(0, dtype=str), 'sku_id': np.empty(0, dtype=str),
+                    'date': np.empty(0, dtype='datetime64[ns]')}
+            self.values = np.empty(0, dtype=np.float32)
+        self.index = pd.MultiIndex.from_arrays([keys[k] for k in KEY_COLUMNS])
+        # Overlapping runs can both write a window; lookups need unique keys
+        unique = ~self.index.duplicated(keep='last')
+        if not unique.all():
+            self.index, self.values = self.index[unique], self.values[unique]
+        print(f"📦 Prediction cache {version}: {len(self.values)} cached windows")
+
+    @staticmethod
+    def _keys(meta):
+        return pd.MultiIndex.from_arrays([
+            meta['store_id'].astype(str).to_numpy(),
+            meta['sku_id'].astype(str).to_numpy(),
+            pd.to_datetime(meta['date']).to_numpy(),
+        ])
+
+    def lookup(self, meta):
+        """
+        Cached predictions for a window meta frame: (preds, miss_mask).
+        preds is NaN where miss_mask is True.
+        """
+        pos = self.index.get_indexer(self._keys(meta)) if len(self.index) else np.full(len(meta), -1)
+        miss = pos < 0
+        preds = np.full(len(meta), np.nan, dtype=np.float32)
+        preds[~miss] = self.values[pos[~miss]]
+        self.misses += int(miss.sum())
+        self.hits += int(len(meta) - miss.sum())
+        return preds, miss
+
+    def add(self, meta, preds):
+        if len(meta):
+            self._new.append((meta[KEY_COLUMNS].copy(), np.asarray(preds, dtype=np.float32)))
+
+    def flush(self):
+        """
+        Write predictions added this run as a new segment and release the
+        version lock.
+        """
+        if not self._new:
+            self._lock.close()
+            return
+        meta = pd.concat([m for m, _ in self._new], ignore_index=True)
+        preds = np.concatenate([p for _, p in self._new])
+        os.makedirs(self.dir, exist_ok=True)
+        seg = len(glob.glob(os.path.join(self.dir, 'seg_*.npz')))
+        # pid keeps segments of concurrent writers (sharded ABC workers) apart
+        name = f'seg_{seg:05d}_{os.getpid()}.npz'
+        path = os.path.join(self.dir, name)
+        tmp_path = os.path.join(self.dir, f'.tmp-{name}')
+        np.savez(tmp_path,
+                 store_id=meta['store_id'].astype(str).to_numpy(dtype=str),
+                 sku_id=meta['sku_id'].astype(str).to_numpy(dtype=str),
+                 date=pd.to_datetime(meta['date']).to_numpy(dtype='datetime64[ns]'),
+                 predicted_sales=preds)
+        os.replace(tmp_path, path)
+        self._new = []
+        self._lock.close()
+
+    def report(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        print(f"📊 Prediction cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)")
@@ -1,19 +1,26 @@
 import os
+import sys
 import joblib
 import numpy as np
+import pandas as pd
 from datetime import datetime
-from tensorflow import keras
-from lstm_utils import fetch_sales_data, preprocess
-from sklearn.metrics import mean_squared_error
+from lstm_utils import db_sales_stats, split_cutoff, predict_in_batches
+from forecast import SOLD_IDX, inverse_sold
+from model_registry import current_artifacts, load_current, load_keras_model, publish_model
+from prediction_cache import invalidate_prediction_cache
+from drift_monitor import (DRIFT_BASELINE_DAYS, DRIFT_RANGE_EXCURSION, read_drift_state, reset_drift,
+                           rebaseline_drift, update_drift, drift_report, print_drift_report, score_new_windows,
+                           iter_windows_after)
 from dotenv import load_dotenv
 
 # ✅ Load environment variables
 load_dotenv()
 
 # --- Config ---
-LAST_RETRAIN_FILE = 'last_retrain.txt'
-MODEL_FILE = os.path.join(os.path.dirname(__file__), 'base_lstm_model.h5')
-SCALER_FILE = 'scaler.pkl'
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LAST_RETRAIN_FILE = os.path.join(BASE_DIR, 'last_retrain.txt')
+FINE_TUNE_EPOCHS = int(os.getenv("FINE_TUNE_EPOCHS", "20"))
+FINE_TUNE_PATIENCE = int(os.getenv("FINE_TUNE_PATIENCE", "2"))
 
 # --- Functions ---
 
@@ -37,51 +44,183 @@ def update_last_retrain_date():
 
 def retrain_and_evaluate():
     """
-    Fetch data, retrain model, compare performance, and save if better.
+    Stream data, retrain model, compare performance, and save if better.
+    Data flows through a tf.data pipeline chunk by chunk, so memory stays
+    flat as history grows.
     """
-    print("🔍 Fetching latest data from autodb...")
-    df = fetch_sales_data(2021, 2024)  # adjust years if needed
-    print(f"✅ Fetched {len(df)} rows.")
+    # TensorFlow is only needed here, so importing this module for
+    # days_since_last_retrain stays light
+    from tensorflow import keras
+    from lstm_dataset import make_train_val_datasets, has_batches
 
-    print("⚙️ Preprocessing data...")
-    X, y, scaler = preprocess(df, window_size=5)
+    window_size = 5
 
-    split = int(len(X) * 0.8)
-    X_train, X_val = X[:split], X[split:]
-    y_train, y_val = y[:split], y[split:]
+    print("🔍 Fitting scaler on latest data from autodb...")
+    # 80/20 split by target date, so every series contributes to both sides
+    train_ds, val_ds, scaler, cutoff = make_train_val_datasets(2021, 2024, window_size)  # adjust years if needed
+    if cutoff is None or not has_batches(val_ds):
+        print("⚠️ No validation windows; keeping existing model.")
+        return
 
     print("📦 Loading existing model...")
-    old_model = keras.models.load_model(MODEL_FILE)
+    old_model = load_keras_model()
+    old_model.compile(optimizer='adam', loss='mse')
 
     print("📈 Retraining model...")
     retrained_model = keras.models.clone_model(old_model)
     retrained_model.set_weights(old_model.get_weights())
     retrained_model.compile(optimizer='adam', loss='mse')
-    retrained_model.fit(X_train, y_train, epochs=5, batch_size=32, verbose=1)
+    retrained_model.fit(train_ds, epochs=5, verbose=1)
 
     print("🔍 Evaluating models on validation data...")
-    old_preds = old_model.predict(X_val)
-    retrained_preds = retrained_model.predict(X_val)
-
-    old_mse = mean_squared_error(y_val, old_preds)
-    retrained_mse = mean_squared_error(y_val, retrained_preds)
+    old_mse = old_model.evaluate(val_ds, verbose=0)
+    retrained_mse = retrained_model.evaluate(val_ds, verbose=0)
 
     print(f"✅ Old model MSE: {old_mse:.4f}")
     print(f"✅ Retrained model MSE: {retrained_mse:.4f}")
 
     if retrained_mse < old_mse:
-        retrained_model.save(MODEL_FILE)
-        joblib.dump(scaler, SCALER_FILE)
+        publish_model(retrained_model, scaler, {'val_mse': retrained_mse}, window_size)
+        invalidate_prediction_cache()
         update_last_retrain_date()
+        _, max_date = db_sales_stats()
+        reset_drift(max_date, retrained_mse, scaler)
         print("🎉 Retrained model is better! Saved as new base model.")
     else:
         print("⚖️ Old model performs better; keeping existing model.")
 
+def establish_baseline(model, scaler, window_size=5):
+    """
+    First run of the drift monitor: score the last DRIFT_BASELINE_DAYS of
+    windows to get the model's reference MSE.
+    """
+    _, max_date = db_sales_stats()
+    if max_date is None:
+        print("⚠️ No sales data; nothing to monitor.")
+        return
+    start = pd.Timestamp(max_date) - pd.Timedelta(days=DRIFT_BASELINE_DAYS)
+    stats, _, _ = score_new_windows(model, scaler, start, window_size)
+    n = int(stats['count'].sum())
+    baseline = float(stats['sse'].sum()) / n if n else 0.0
+    reset_drift(start, baseline, scaler, watermark=max_date)
+    print(f"📏 Drift baseline MSE {baseline:.5f} over {n} windows since {start:%Y-%m-%d}")
+
+def rescale_windows(X, y, src, dst):
+    """
+    Windows and 'sold' targets scaled with src, re-expressed in dst's
+    scaling (MinMax scaling is affine per feature).
+    """
+    X_real = (X - src.min_) / src.scale_
+    y_real = inverse_sold(y, src)
+    return ((X_real * dst.scale_ + dst.min_).astype(np.float32),
+            (y_real * dst.scale_[SOLD_IDX] + dst.min_[SOLD_IDX]).astype(np.float32))
+
+def fine_tune_on_new_window(state, report, window_size=5):
+    """
+    Fine-tune the current model only on windows newer than the data it was
+    last tuned on, with early stopping, and save it if it beats the old model
+    on the newest 20% of those windows. The models are compared in real
+    units, each fed windows in its own scaling.
+    """
+    from tensorflow import keras
+
+    # Private copies: the loaded scaler is shared with load_current's cache
+    artifacts = current_artifacts()
+    base_scaler = joblib.load(artifacts['scaler_file'])
+    scaler = joblib.load(artifacts['scaler_file'])
+    widened = max(report['excursion'].values()) > DRIFT_RANGE_EXCURSION
+    if widened:
+        # New values fall outside the scaler's range: widen it before tuning
+        scaler.partial_fit(np.array([state['feature_min'], state['feature_max']]))
+
+    print(f"📦 Loading windows since {state['trained_through']}...")
+    parts = list(iter_windows_after(scaler, state['trained_through'], window_size))
+    if not parts:
+        print("⚠️ No new windows to fine-tune on.")
+        # Nothing to tune on; restart the statistics so the trigger doesn't refire every run
+        rebaseline_drift(state['baseline_mse'], base_scaler, watermark=state['watermark'])
+        return
+    X = np.concatenate([p[0] for p in parts])
+    y = np.concatenate([p[1] for p in parts])
+    dates = pd.concat([p[2]['date'] for p in parts], ignore_index=True)
+    cutoff = split_cutoff(dates.value_counts().sort_index(), 0.8)
+    train = (dates < cutoff).to_numpy()
+    if not train.any() or train.all():
+        print("⚠️ Not enough new data for a train/validation split.")
+        rebaseline_drift(state['baseline_mse'], base_scaler, watermark=state['watermark'])
+        return
+    X_val, y_val = X[~train], y[~train]
+
+    # The old model was trained on the original scaling, not the widened one
+    X_old, y_old = rescale_windows(X_val, y_val, scaler, base_scaler) if widened else (X_val, y_val)
+    old_model = load_keras_model(artifacts)
+    old_model.compile(optimizer='adam', loss='mse')
+    old_mse = old_model.evaluate(X_old, y_old, verbose=0)
+
+    print(f"📈 Fine-tuning on {int(train.sum())} new windows...")
+    tuned_model = keras.models.clone_model(old_model)
+    tuned_model.set_weights(old_model.get_weights())
+    tuned_model.compile(optimizer='adam', loss='mse')
+    history = tuned_model.fit(
+        X[train], y[train], validation_data=(X_val, y_val),
+        epochs=FINE_TUNE_EPOCHS, batch_size=32, verbose=1,
+        callbacks=[keras.callbacks.EarlyStopping(monitor='val_loss', patience=FINE_TUNE_PATIENCE,
+                                                 restore_best_weights=True)]
+    )
+    tuned_mse = min(history.history['val_loss'])  # weights restored to this epoch
+
+    # Scaled MSEs under different scalers don't compare; units sold do
+    y_real = inverse_sold(y_val, scaler)
+    old_units = float(np.mean((inverse_sold(predict_in_batches(old_model, X_old), base_scaler) - y_real) ** 2))
+    tuned_units = float(np.mean((inverse_sold(predict_in_batches(tuned_model, X_val), scaler) - y_real) ** 2))
+    print(f"✅ Old model MSE: {old_mse:.4f} ({old_units:.2f} units²)")
+    print(f"✅ Fine-tuned model MSE: {tuned_mse:.4f} ({tuned_units:.2f} units²)")
+
+    max_date = dates.max()
+    if tuned_units < old_units:
+        publish_model(tuned_model, scaler, {'val_mse': tuned_mse, 'previous_val_mse': old_mse,
+                                            'val_mse_units': tuned_units,
+                                            'previous_val_mse_units': old_units}, window_size)
+        invalidate_prediction_cache()
+        update_last_retrain_date()
+        reset_drift(max_date, tuned_mse, scaler)
+        print("🎉 Fine-tuned model is better! Saved as new base model.")
+    else:
+        # Re-baseline the statistics so the same drift doesn't fire every run;
+        # the model is unchanged, so its retrain dates stay as they are
+        rebaseline_drift(old_mse, base_scaler, watermark=max_date)
+        print("⚖️ Old model performs better; keeping existing model.")
+
+def check_drift_and_retrain(window_size=5):
+    """
+    Update drift statistics with new data and fine-tune only when they cross
+    a threshold.
+    """
+    artifacts = current_artifacts()
+    if artifacts is None or not os.path.exists(artifacts['scaler_file']):
+        print("⚠️ No saved scaler yet; running a full retrain.")
+        retrain_and_evaluate()
+        return
+
+    model, scaler, manifest = load_current()
+    window_size = manifest['window_size']
+    if read_drift_state() is None:
+        establish_baseline(model, scaler, window_size)
+        return
+
+    state, stats = update_drift(model, scaler, window_size)
+    report = drift_report(state, stats, scaler)
+    print_drift_report(report)
+    if report['triggered']:
+        fine_tune_on_new_window(state, report, window_size)
+    else:
+        print("✅ No drift detected; skipping retrain.")
+
 # --- Entrypoint ---
 if __name__ == "__main__":
     days = days_since_last_retrain()
     print(f"⏱ Last retrain was {days} days ago.")
-    if days >= 30:
+    if '--full' in sys.argv:
         retrain_and_evaluate()
     else:
-        print("✅ No retraining needed yet (less than 30 days).")
+        check_drift_and_retrain()
@@ -1,7 +1,27 @@
+import os
+import sys
+import glob
+import json
+import time
+import threading
+import subprocess
 import tensorflow as tf
 from tensorflow import keras
 from keras_tuner.tuners import Hyperband
-from lstm_utils import fetch_sales_data, preprocess
+from dotenv import load_dotenv
+from lstm_dataset import build_window_cache, load_window_cache, cached_window_dataset
+from model_registry import publish_model
+
+# ✅ Load environment variables
+load_dotenv()
+
+# single (default): one process | parallel: local keras-tuner chief + workers
+TUNE_MODE = os.getenv("TUNE_MODE", "single")
+TUNE_WORKERS = int(os.getenv("TUNE_WORKERS", "2"))
+TUNE_ORACLE_PORT = os.getenv("TUNE_ORACLE_PORT", "8000")
+TUNE_REPORT_INTERVAL = float(os.getenv("TUNE_REPORT_INTERVAL", "60"))
+TUNER_DIR = 'hyperband_dir'
+PROJECT_NAME = 'base_lstm'
 
 def build_model(hp):
     model = keras.Sequential([
@@ -19,20 +39,110 @@ def build_model(hp):
     )
     return model
 
-if __name__ == "__main__":
-    df = fetch_sales_data(2021, 2024)
-    X, y, _ = preprocess(df, window_size=5)
-
-    tuner = Hyperband(
+def make_tuner():
+    return Hyperband(
         build_model,
         objective='val_loss',
         max_epochs=10,
         factor=3,
-        directory='hyperband_dir',
-        project_name='base_lstm'
+        directory=TUNER_DIR,
+        project_name=PROJECT_NAME
     )
 
-    tuner.search(X, y, epochs=10, validation_split=0.2)
+def pin_worker_threads():
+    """
+    Pin this process to the CPUs in TUNER_CPUS and size TF's thread pools to
+    match, so parallel workers don't oversubscribe cores.
+    """
+    cpus = os.getenv("TUNER_CPUS")
+    if not cpus:
+        return
+    cpus = [int(c) for c in cpus.split(',')]
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    tf.config.threading.set_intra_op_parallelism_threads(len(cpus))
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+def run_search():
+    """
+    Run tuner.search on the cached windows. Under KERASTUNER_TUNER_ID this is
+    one chief or worker of a distributed search.
+    """
+    pin_worker_threads()
+    arrays, _, _ = load_window_cache()
+    train_ds = cached_window_dataset(arrays['X_train'], arrays['y_train'], shuffle=True)
+    val_ds = cached_window_dataset(arrays['X_val'], arrays['y_val'])
+    make_tuner().search(train_ds, validation_data=val_ds, epochs=10)
+
+def report_progress(started, stop, interval=TUNE_REPORT_INTERVAL):
+    """
+    Print completed trials, trials/hour and the best val_loss so far, read
+    from the trial.json files the oracle writes.
+    """
+    pattern = os.path.join(TUNER_DIR, PROJECT_NAME, 'trial_*', 'trial.json')
+    while not stop.wait(interval):
+        scores = []
+        for path in glob.glob(pattern):
+            try:
+                with open(path) as f:
+                    trial = json.load(f)
+            except (OSError, ValueError):
+                continue  # being written
+            if trial.get('status') == 'COMPLETED' and trial.get('score') is not None:
+                scores.append(trial['score'])
+        hours = (time.time() - started) / 3600
+        best = f"{min(scores):.5f}" if scores else "n/a"
+        print(f"📊 {len(scores)} trials done, {len(scores) / hours:.1f} trials/hour, best val_loss {best}")
+
+def run_parallel_search(workers=TUNE_WORKERS):
+    """
+    Start a keras-tuner chief (oracle) and `workers` trial processes on this
+    machine, each pinned to its own slice of CPUs, and wait for them.
+    """
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count()))
+    per_worker = max(len(cpus) // workers, 1)
+    base_env = dict(os.environ, KERASTUNER_ORACLE_IP='127.0.0.1', KERASTUNER_ORACLE_PORT=TUNE_ORACLE_PORT)
+    script = os.path.abspath(__file__)
+
+    chief = subprocess.Popen([sys.executable, script], env=dict(base_env, KERASTUNER_TUNER_ID='chief'))
+    procs = []
+    for i in range(workers):
+        worker_cpus = cpus[(i * per_worker) % len(cpus):][:per_worker]
+        env = dict(base_env, KERASTUNER_TUNER_ID=f'tuner{i}', TUNER_CPUS=','.join(map(str, worker_cpus)))
+        procs.append(subprocess.Popen([sys.executable, script], env=env))
+    print(f"🚀 Started chief + {workers} workers ({per_worker} CPUs each)")
+
+    failed = [p.args for p in procs if p.wait() != 0]
+    chief.terminate()  # the oracle keeps serving after the last trial
+    chief.wait()
+    if failed:
+        raise RuntimeError(f"{len(failed)} tuner workers failed")
+
+if __name__ == "__main__":
+    if os.getenv("KERASTUNER_TUNER_ID"):
+        # Spawned by run_parallel_search
+        run_search()
+        sys.exit(0)
+
+    # Windowed data is built once and memory-mapped by every trial process
+    build_window_cache(2021, 2024, window_size=5)
+    _, scaler, _ = load_window_cache()
+
+    started = time.time()
+    stop = threading.Event()
+    threading.Thread(target=report_progress, args=(started, stop), daemon=True).start()
+    try:
+        if TUNE_MODE == 'parallel':
+            run_parallel_search()
+        else:
+            run_search()
+    finally:
+        stop.set()
+    print(f"⏱ Search took {(time.time() - started) / 60:.1f} min")
+
+    tuner = make_tuner()
     best_model = tuner.get_best_models(num_models=1)[0]
-    best_model.save('base_lstm_model.h5')
-    print("✅ Base LSTM model saved as base_lstm_model.h5")
+    best_trial = tuner.oracle.get_best_trials(num_trials=1)[0]
+    # Model, scaler and window settings are published together as one version
+    publish_model(best_model, scaler, {'val_loss': best_trial.score}, window_size=5)
+    print("✅ Base LSTM model published to the model registry")
@@ -1,99 +1,465 @@
+import os
+import queue
+import threading
+import time
+import datetime
+from concurrent.futures import ThreadPoolExecutor
 import psycopg2
+from psycopg2.extras import execute_values
 from tqdm import tqdm
 import firebase_admin
 from firebase_admin import credentials, firestore
 
-# --- Initialize Firebase ---
-cred = credentials.Certificate("serviceAccountKey.json")
-firebase_admin.initialize_app(cred)
-db = firestore.client()
-
-# --- Initialize Postgres connection ---
-pg_conn = psycopg2.connect(
-    dbname='mywhackdb',
-    user='myuser',
-    password='rafaelnadal',
-    host='localhost'
-)
-pg_conn.autocommit = True
-pg_cur = pg_conn.cursor()
-
-# --- Fetch SKUs ---
-print("Fetching SKUs from Firestore...")
-sku_docs = list(db.collection('skus').stream())
-print(f"Found {len(sku_docs)} SKUs.")
-
-# --- Fetch Stores ---
-print("Fetching Stores from Firestore...")
-store_docs = list(db.collection('stores').stream())
-print(f"Found {len(store_docs)} stores.")
-
-# --- Insert SKUs ---
-print("Inserting SKUs into Postgres...")
-for doc in tqdm(sku_docs):
-    sku = doc.to_dict()
-    pg_cur.execute("""
-        INSERT INTO skus (sku_id, name, shelf_life_days)
-        VALUES (%s, %s, %s)
-        ON CONFLICT (sku_id) DO NOTHING
-    """, (doc.id, sku.get('name'), sku.get('shelf_life_days')))
-
-# --- Insert Stores & store_skus & sales_data ---
-print("Inserting Stores, Store-SKUs and Sales Data into Postgres...")
-for doc in tqdm(store_docs):
+# --- Config ---
+# To run against local emulators:
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 PG_HOST=localhost ETL_MODE=pipeline python firestore_to_postgres.py
+PG_CONFIG = {
+    'dbname': os.getenv('PG_NAME', 'mywhackdb'),
+    'user': os.getenv('PG_USER', 'myuser'),
+    'password': os.getenv('PG_PASSWORD', 'rafaelnadal'),
+    'host': os.getenv('PG_HOST', 'localhost'),
+    'port': os.getenv('PG_PORT', '5432')
+}
+
+# "sequential" keeps the row-by-row path, "pipeline" overlaps Firestore reads with batched writes
+ETL_MODE = os.getenv('ETL_MODE', 'sequential')
+ETL_WRITERS = int(os.getenv('ETL_WRITERS', '4'))
+ETL_BATCH_ROWS = int(os.getenv('ETL_BATCH_ROWS', '20000'))
+
+# "embedded" = sales_data array inside each store doc, "sharded" = stores/{id}/sales subcollection
+FIRESTORE_LAYOUT = os.getenv('FIRESTORE_LAYOUT', 'embedded')
+ETL_READ_PARTITIONS = int(os.getenv('ETL_READ_PARTITIONS', '8'))
+# Sharded layout only: YYYY-MM-DD, or "auto" for the latest date already in Postgres
+ETL_SINCE = os.getenv('ETL_SINCE')
+
+SALES_FIELDS = ['day', 'date', 'type_of_day', 'initial', 'sold', 'returns',
+                'donations', 'reroutes_in', 'reroutes_out', 'recycled', 'final']
+
+def init_firestore():
+    """
+    Return a Firestore client; uses the emulator when FIRESTORE_EMULATOR_HOST is set.
+    """
+    if os.getenv('FIRESTORE_EMULATOR_HOST'):
+        from google.cloud import firestore as gcloud_firestore
+        return gcloud_firestore.Client(project=os.getenv('GOOGLE_CLOUD_PROJECT', 'demo-mywhack'))
+    cred = credentials.Certificate("serviceAccountKey.json")
+    firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+def store_rows(doc):
+    """
+    Flatten one store document into its stores row, store_skus rows and a
+    generator of sales_data rows.
+    """
     store = doc.to_dict()
     details = store.get('details', {})
-    sales_data = store.get('sales_data', [])
-
     store_id = doc.id
-    geo = details.get('geo')
-    religion = details.get('religion')
-    skus = details.get('skus', [])
-
-    # Insert into stores table
-    pg_cur.execute("""
-        INSERT INTO stores (store_id, geo, religion)
-        VALUES (%s, %s, %s)
-        ON CONFLICT (store_id) DO NOTHING
-    """, (store_id, geo, religion))
-
-    # Insert into store_skus table
-    for sku_id in skus:
+    store_row = (store_id, details.get('geo'), details.get('religion'))
+    sku_rows = [(store_id, sku_id) for sku_id in details.get('skus', [])]
+
+    def sales():
+        for entry in store.get('sales_data', []):
+            sku_id = entry.get('sku')
+            year = entry.get('year')
+            for dp in entry.get('data', []):
+                yield (store_id, sku_id, year, *(dp.get(f) for f in SALES_FIELDS))
+
+    return store_row, sku_rows, sales()
+
+# --- Sequential ETL ---
+
+def run_sequential(db, pg_conn):
+    pg_conn.autocommit = True
+    pg_cur = pg_conn.cursor()
+
+    # --- Fetch SKUs ---
+    print("Fetching SKUs from Firestore...")
+    sku_docs = list(db.collection('skus').stream())
+    print(f"Found {len(sku_docs)} SKUs.")
+
+    # --- Fetch Stores ---
+    print("Fetching Stores from Firestore...")
+    store_docs = list(db.collection('stores').stream())
+    print(f"Found {len(store_docs)} stores.")
+
+    # --- Insert SKUs ---
+    print("Inserting SKUs into Postgres...")
+    for doc in tqdm(sku_docs):
+        sku = doc.to_dict()
         pg_cur.execute("""
-            INSERT INTO store_skus (store_id, sku_id)
-            VALUES (%s, %s)
-            ON CONFLICT DO NOTHING
-        """, (store_id, sku_id))
+            INSERT INTO skus (sku_id, name, shelf_life_days)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (sku_id) DO NOTHING
+        """, (doc.id, sku.get('name'), sku.get('shelf_life_days')))
+
+    # --- Insert Stores & store_skus & sales_data ---
+    print("Inserting Stores, Store-SKUs and Sales Data into Postgres...")
+    for doc in tqdm(store_docs):
+        store = doc.to_dict()
+        details = store.get('details', {})
+        sales_data = store.get('sales_data', [])
+
+        store_id = doc.id
+        geo = details.get('geo')
+        religion = details.get('religion')
+        skus = details.get('skus', [])
 
-    # Insert into sales_data table
-    for entry in sales_data:
-        sku_id = entry.get('sku')
-        year = entry.get('year')
-        data_points = entry.get('data', [])
+        # Insert into stores table
+        pg_cur.execute("""
+            INSERT INTO stores (store_id, geo, religion)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (store_id) DO NOTHING
+        """, (store_id, geo, religion))
 
-        for dp in data_points:
+        # Insert into store_skus table
+        for sku_id in skus:
             pg_cur.execute("""
-                INSERT INTO sales_data (
-                    store_id, sku_id, year, day, date, type_of_day,
-                    initial, sold, returns, donations, reroutes_in, reroutes_out, recycled, final
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                store_id, sku_id, year,
-                dp.get('day'),
-                dp.get('date'),
-                dp.get('type_of_day'),
-                dp.get('initial'),
-                dp.get('sold'),
-                dp.get('returns'),
-                dp.get('donations'),
-                dp.get('reroutes_in'),
-                dp.get('reroutes_out'),
-                dp.get('recycled'),
-                dp.get('final')
-            ))
-
-print("✅ ETL completed! Data now in Postgres.")
-
-# --- Cleanup ---
-pg_cur.close()
-pg_conn.close()
+                INSERT INTO store_skus (store_id, sku_id)
+                VALUES (%s, %s)
+                ON CONFLICT DO NOTHING
+            """, (store_id, sku_id))
+
+        # Insert into sales_data table
+        for entry in sales_data:
+            sku_id = entry.get('sku')
+            year = entry.get('year')
+            data_points = entry.get('data', [])
+
+            for dp in data_points:
+                pg_cur.execute("""
+                    INSERT INTO sales_data (
+                        store_id, sku_id, year, day, date, type_of_day,
+                        initial, sold, returns, donations, reroutes_in, reroutes_out, recycled, final
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (
+                    store_id, sku_id, year,
+                    dp.get('day'),
+                    dp.get('date'),
+                    dp.get('type_of_day'),
+                    dp.get('initial'),
+                    dp.get('sold'),
+                    dp.get('returns'),
+                    dp.get('donations'),
+                    dp.get('reroutes_in'),
+                    dp.get('reroutes_out'),
+                    dp.get('recycled'),
+                    dp.get('final')
+                ))
+    pg_cur.close()
+
+# --- Pipelined ETL ---
+
+def _new_batch():
+    return {'stores': {}, 'store_skus': [], 'sales_data': []}
+
+def iter_store_batches(store_docs, batch_rows=ETL_BATCH_ROWS):
+    """
+    Group streamed store documents into write batches of about batch_rows
+    sales rows. Every batch carries the stores rows its sales rows reference,
+    so batches can be committed independently and in any order.
+    """
+    batch = _new_batch()
+    for doc in store_docs:
+        store_row, sku_rows, sales = store_rows(doc)
+        batch['stores'][store_row[0]] = store_row
+        batch['store_skus'].extend(sku_rows)
+        for row in sales:
+            if store_row[0] not in batch['stores']:
+                batch['stores'][store_row[0]] = store_row
+            batch['sales_data'].append(row)
+            if len(batch['sales_data']) >= batch_rows:
+                yield batch
+                batch = _new_batch()
+    if batch['stores'] or batch['sales_data']:
+        yield batch
+
+def write_batch(pg_cur, batch):
+    """
+    Insert one batch with multi-row VALUES; the caller owns the transaction.
+    """
+    # Sorted store ids keep lock order consistent across concurrent writers
+    if batch['stores']:
+        execute_values(pg_cur, """
+            INSERT INTO stores (store_id, geo, religion) VALUES %s
+            ON CONFLICT (store_id) DO NOTHING
+        """, sorted(batch['stores'].values()))
+    if batch['store_skus']:
+        execute_values(pg_cur, """
+            INSERT INTO store_skus (store_id, sku_id) VALUES %s
+            ON CONFLICT DO NOTHING
+        """, batch['store_skus'])
+    if batch['sales_data']:
+        execute_values(pg_cur, """
+            INSERT INTO sales_data (
+                store_id, sku_id, year, day, date, type_of_day,
+                initial, sold, returns, donations, reroutes_in, reroutes_out, recycled, final
+            ) VALUES %s
+            ON CONFLICT (store_id, sku_id, year, day) DO NOTHING
+        """, batch['sales_data'], page_size=5000)
+
+def _writer(pg_config, batches, errors, stats, lock):
+    """
+    Consume batches until the None sentinel, one transaction per batch.
+    After an error the worker keeps draining so the producer never blocks.
+    """
+    conn = psycopg2.connect(**pg_config)
+    try:
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            if errors:
+                continue
+            try:
+                with conn, conn.cursor() as cur:
+                    write_batch(cur, batch)
+                with lock:
+                    stats['batches'] += 1
+                    stats['rows'] += len(batch['sales_data'])
+            except Exception as e:
+                errors.append(e)
+    finally:
+        conn.close()
+
+def load_skus(db, pg_conn):
+    print("Fetching SKUs from Firestore...")
+    rows = []
+    for doc in db.collection('skus').stream():
+        sku = doc.to_dict()
+        rows.append((doc.id, sku.get('name'), sku.get('shelf_life_days')))
+    with pg_conn, pg_conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO skus (sku_id, name, shelf_life_days) VALUES %s
+            ON CONFLICT (sku_id) DO NOTHING
+        """, rows)
+    print(f"✅ Inserted {len(rows)} SKUs.")
+
+def run_writers(pg_config, batch_iter, writers=ETL_WRITERS):
+    """
+    Feed batches from batch_iter to a pool of writer threads, each batch in
+    its own transaction. Returns {'batches', 'rows'}.
+    """
+    batches = queue.Queue(maxsize=writers * 2)
+    errors = []
+    stats = {'batches': 0, 'rows': 0}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=_writer, args=(pg_config, batches, errors, stats, lock), daemon=True)
+        for _ in range(writers)
+    ]
+    for t in threads:
+        t.start()
+
+    try:
+        for batch in tqdm(batch_iter, desc="Batches"):
+            if errors:
+                break
+            batches.put(batch)
+    finally:
+        for _ in threads:
+            batches.put(None)
+        for t in threads:
+            t.join()
+
+    if errors:
+        raise errors[0]
+    return stats
+
+def run_pipeline(db, pg_config=PG_CONFIG, writers=ETL_WRITERS, batch_rows=ETL_BATCH_ROWS):
+    """
+    Stream store documents from Firestore while a pool of writer threads
+    inserts batches into Postgres, each batch in its own transaction.
+    """
+    started = time.perf_counter()
+    pg_conn = psycopg2.connect(**pg_config)
+    try:
+        load_skus(db, pg_conn)
+    finally:
+        pg_conn.close()
+
+    print(f"Streaming stores from Firestore into {writers} writers...")
+    store_docs = db.collection('stores').stream()
+    stats = run_writers(pg_config, iter_store_batches(store_docs, batch_rows), writers)
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"✅ Wrote {stats['rows']} sales rows in {stats['batches']} batches, "
+          f"{elapsed:.1f}s ({stats['rows'] / elapsed:,.0f} rows/s)")
+    return stats
+
+# --- Sharded layout: stores/{store_id}/sales/{sku}_{year} ---
+
+def load_stores(db, pg_conn):
+    """
+    Insert stores and store_skus from the (details-only) store documents.
+    """
+    print("Fetching Stores from Firestore...")
+    store_data, sku_data = [], []
+    for doc in db.collection('stores').stream():
+        details = doc.to_dict().get('details') or {}
+        store_data.append((doc.id, details.get('geo'), details.get('religion')))
+        sku_data.extend((doc.id, sku_id) for sku_id in details.get('skus', []))
+    with pg_conn, pg_conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO stores (store_id, geo, religion) VALUES %s
+            ON CONFLICT (store_id) DO NOTHING
+        """, store_data)
+        execute_values(cur, """
+            INSERT INTO store_skus (store_id, sku_id) VALUES %s
+            ON CONFLICT DO NOTHING
+        """, sku_data)
+    print(f"✅ Inserted {len(store_data)} stores.")
+
+def shard_queries(db, since=None, partitions=ETL_READ_PARTITIONS):
+    """
+    Split the sales collection-group read into independent queries.
+
+    A full export uses Firestore partition cursors. An incremental export
+    splits [since, today] into date_to ranges so only shards holding rows on
+    or after since are read.
+    """
+    group = db.collection_group('sales')
+    if since is None:
+        return [p.query() for p in group.get_partitions(partitions)]
+
+    start = datetime.date.fromisoformat(str(since))
+    today = datetime.date.today()
+    step = max((today - start).days // partitions, 1)
+    bounds = [start + datetime.timedelta(days=i * step) for i in range(partitions)]
+    bounds = [b for b in bounds if b < today] or [start]
+    queries = []
+    for i, lo in enumerate(bounds):
+        query = group.where('date_to', '>=', lo.isoformat())
+        if i + 1 < len(bounds):
+            query = query.where('date_to', '<', bounds[i + 1].isoformat())
+        queries.append(query)
+    return queries
+
+def iter_sales_shards(db, since=None, partitions=ETL_READ_PARTITIONS):
+    """
+    Stream shard documents from all partition queries in parallel.
+    """
+    queries = shard_queries(db, since, partitions)
+    docs = queue.Queue(maxsize=1000)
+    done = object()
+    stop = threading.Event()
+
+    def put(item):
+        # Give up once the consumer is gone, so no reader blocks on a full queue
+        while not stop.is_set():
+            try:
+                docs.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read(query):
+        try:
+            for doc in query.stream():
+                if not put(doc):
+                    return
+        except Exception as e:
+            put(e)
+        finally:
+            put(done)
+
+    print(f"Reading sales shards with {len(queries)} parallel partition queries...")
+    with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+        try:
+            for query in queries:
+                executor.submit(read, query)
+            remaining = len(queries)
+            while remaining:
+                item = docs.get()
+                if item is done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            # On error or early close: release the readers before the executor joins them
+            stop.set()
+            while True:
+                try:
+                    docs.get_nowait()
+                except queue.Empty:
+                    break
+
+def iter_shard_batches(shard_docs, since=None, batch_rows=ETL_BATCH_ROWS):
+    """
+    Turn shard documents into sales_data write batches, dropping rows
+    before since.
+    """
+    since = str(since) if since else None
+    batch = _new_batch()
+    for doc in shard_docs:
+        shard = doc.to_dict()
+        store_id = shard.get('store_id') or doc.reference.parent.parent.id
+        for dp in shard.get('data', []):
+            if since and dp.get('date') < since:
+                continue
+            batch['sales_data'].append(
+                (store_id, shard.get('sku'), shard.get('year'), *(dp.get(f) for f in SALES_FIELDS))
+            )
+            if len(batch['sales_data']) >= batch_rows:
+                yield batch
+                batch = _new_batch()
+    if batch['sales_data']:
+        yield batch
+
+def resolve_since(pg_config, since):
+    """
+    'auto' resumes from the latest date already in Postgres; otherwise pass through.
+    """
+    if since != 'auto':
+        return since or None
+    conn = psycopg2.connect(**pg_config)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT MAX(date) FROM sales_data")
+            max_date = cur.fetchone()[0]
+    finally:
+        conn.close()
+    return max_date.isoformat() if max_date else None
+
+def run_sharded_pipeline(db, pg_config=PG_CONFIG, writers=ETL_WRITERS, batch_rows=ETL_BATCH_ROWS,
+                         since=ETL_SINCE, partitions=ETL_READ_PARTITIONS):
+    """
+    Export the sharded layout: static tables first, then sales shards read
+    in parallel partitions and written by the writer pool.
+    """
+    started = time.perf_counter()
+    since = resolve_since(pg_config, since)
+    pg_conn = psycopg2.connect(**pg_config)
+    try:
+        load_skus(db, pg_conn)
+        load_stores(db, pg_conn)
+    finally:
+        pg_conn.close()
+
+    print(f"📦 Exporting sales shards {'since ' + since if since else '(full)'}...")
+    shards = iter_sales_shards(db, since, partitions)
+    stats = run_writers(pg_config, iter_shard_batches(shards, since, batch_rows), writers)
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"✅ Wrote {stats['rows']} sales rows in {stats['batches']} batches, "
+          f"{elapsed:.1f}s ({stats['rows'] / elapsed:,.0f} rows/s)")
+    return stats
+
+if __name__ == "__main__":
+    # --- Initialize Firebase ---
+    db = init_firestore()
+
+    if FIRESTORE_LAYOUT == 'sharded':
+        run_sharded_pipeline(db)
+    elif ETL_MODE == 'pipeline':
+        run_pipeline(db)
+    else:
+        # --- Initialize Postgres connection ---
+        pg_conn = psycopg2.connect(**PG_CONFIG)
+        run_sequential(db, pg_conn)
+        # --- Cleanup ---
+        pg_conn.close()
+
+    print("✅ ETL completed! Data now in Postgres.")
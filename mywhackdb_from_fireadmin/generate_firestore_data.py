@@ -1,21 +1,53 @@
+import os
+import io
 import random
 import datetime
+import time
+import numpy as np
 from tqdm import tqdm
 import firebase_admin
 from firebase_admin import credentials, firestore
 
 # --- Init Firebase ---
-cred = credentials.Certificate("serviceAccountKey.json")
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+def init_firestore():
+    """
+    Return a Firestore client; uses the emulator when FIRESTORE_EMULATOR_HOST is set.
+    """
+    if os.getenv('FIRESTORE_EMULATOR_HOST'):
+        from google.cloud import firestore as gcloud_firestore
+        return gcloud_firestore.Client(project=os.getenv('GOOGLE_CLOUD_PROJECT', 'demo-mywhack'))
+    cred = credentials.Certificate("serviceAccountKey.json")
+    firebase_admin.initialize_app(cred)
+    return firestore.client()
 
 # --- Constants ---
-NUM_SKUS = 20
-NUM_STORES = 10
+NUM_SKUS = int(os.getenv('NUM_SKUS', '20'))
+NUM_STORES = int(os.getenv('NUM_STORES', '10'))
+SKUS_PER_STORE = int(os.getenv('SKUS_PER_STORE', '12'))
 YEARS = [2021, 2022, 2023, 2024, 2025]
 WEEKENDS_PER_YEAR = 52
 GOOD_NORMAL_BAD_RATIO = (0.3, 0.6, 0.1)  # approx 3:6:1
 
+# "embedded" keeps sales_data inside the store doc; "sharded" writes one
+# stores/{store_id}/sales/{sku}_{year} doc per SKU-year (stays far below the 1 MiB doc limit)
+FIRESTORE_LAYOUT = os.getenv('FIRESTORE_LAYOUT', 'embedded')
+FIRESTORE_BATCH_SIZE = 500  # Firestore max writes per batch
+
+# --- Scale generator (NumPy) config ---
+GENERATOR = os.getenv('GENERATOR', 'python')                  # python | numpy
+GENERATOR_OUTPUT = os.getenv('GENERATOR_OUTPUT', 'firestore')  # firestore | parquet | postgres
+GRANULARITY = os.getenv('GRANULARITY', 'weekend')             # weekend | daily
+SEED = os.getenv('SEED')
+SERIES_PER_CHUNK = int(os.getenv('SERIES_PER_CHUNK', '20000'))
+PARQUET_DIR = os.getenv('PARQUET_DIR', 'generated_data')
+PG_CONFIG = {
+    'dbname': os.getenv('PG_NAME', 'mywhackdb'),
+    'user': os.getenv('PG_USER', 'myuser'),
+    'password': os.getenv('PG_PASSWORD', 'rafaelnadal'),
+    'host': os.getenv('PG_HOST', 'localhost'),
+    'port': os.getenv('PG_PORT', '5432')
+}
+
 geo_options = ['hills', 'plains', 'beach']
 religion_options = ['hindu', 'muslim', 'christian']
 
@@ -32,11 +64,15 @@ peak_months = {
     ('beach', 'christian'): [5, 12],    # May (Easter/Pentecost), Dec
 }
 
+def id_width(count):
+    # Zero-pad ids to at least 2 digits, wider for large fleets
+    return max(2, len(str(count)))
+
 # --- Step 1: Create SKU master dataset ---
 def generate_skus():
     skus = []
     for i in range(1, NUM_SKUS + 1):
-        sku_id = f'SKU{str(i).zfill(2)}'
+        sku_id = f'SKU{str(i).zfill(id_width(NUM_SKUS))}'
         shelf_life_days = random.randint(14, 105)  # 2–15 weeks
         skus.append({
             'id': sku_id,
@@ -54,9 +90,9 @@ def generate_stores(skus):
     random.shuffle(combos)
     stores = []
     for i in range(1, NUM_STORES + 1):
-        store_id = f'store{str(i).zfill(2)}'
+        store_id = f'store{str(i).zfill(id_width(NUM_STORES))}'
         geo, religion = combos[i % len(combos)]
-        store_skus = random.sample([sku['id'] for sku in skus], 12)
+        store_skus = random.sample([sku['id'] for sku in skus], min(SKUS_PER_STORE, len(skus)))
         stores.append({
             'id': store_id,
             'geo': geo,
@@ -89,15 +125,19 @@ def classify_days(dates, peak_months_list):
         if d.month in peak_months_list:
             good_days.append(d)
     # If not enough good days, fill randomly
+    good_set = set(good_days)
     while len(good_days) < num_good:
         d = random.choice(dates)
-        if d not in good_days:
+        if d not in good_set:
             good_days.append(d)
+            good_set.add(d)
     good_days = good_days[:num_good]
+    good_set = set(good_days)
 
-    remaining = [d for d in dates if d not in good_days]
+    remaining = [d for d in dates if d not in good_set]
     bad_days = random.sample(remaining, num_bad)
-    normal_days = [d for d in remaining if d not in bad_days]
+    bad_set = set(bad_days)
+    normal_days = [d for d in remaining if d not in bad_set]
 
     day_types = {}
     for d in good_days:
@@ -166,7 +206,44 @@ def simulate_sales_data(store, years):
     return sales_data
 
 # --- Step 6: Upload to Firestore ---
-def upload_to_firestore(skus, stores):
+def shard_id(sku, year):
+    return f"{sku}_{year}"
+
+def commit_in_batches(db, writes):
+    """
+    Apply (doc_ref, data) set() writes in batches of FIRESTORE_BATCH_SIZE.
+    """
+    batch = db.batch()
+    pending = 0
+    for ref, data in writes:
+        batch.set(ref, data)
+        pending += 1
+        if pending == FIRESTORE_BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+
+def upload_sales_shards(db, store_id, sales_data):
+    """
+    Write one sales/{sku}_{year} doc per SKU-year under the store, in batched writes.
+    date_from/date_to let exports filter shards by date range.
+    """
+    sales_ref = db.collection('stores').document(store_id).collection('sales')
+    commit_in_batches(db, (
+        (sales_ref.document(shard_id(entry['sku'], entry['year'])), {
+            'store_id': store_id,
+            'sku': entry['sku'],
+            'year': entry['year'],
+            'date_from': entry['data'][0]['date'] if entry['data'] else None,
+            'date_to': entry['data'][-1]['date'] if entry['data'] else None,
+            'data': entry['data']
+        })
+        for entry in sales_data
+    ))
+
+def upload_to_firestore(db, skus, stores, layout=FIRESTORE_LAYOUT):
     print("Uploading SKUs...")
     for sku in tqdm(skus):
         db.collection('skus').document(sku['id']).set({
@@ -174,7 +251,7 @@ def upload_to_firestore(skus, stores):
             'shelf_life_days': sku['shelf_life_days']
         })
 
-    print("Uploading Stores & Sales data...")
+    print(f"Uploading Stores & Sales data ({layout} layout)...")
     for store in tqdm(stores):
         details = {
             'geo': store['geo'],
@@ -183,14 +260,277 @@ def upload_to_firestore(skus, stores):
         }
         sales_data = simulate_sales_data(store, YEARS)
 
-        db.collection('stores').document(store['id']).set({
-            'details': details,
-            'sales_data': sales_data
-        })
+        if layout == 'sharded':
+            db.collection('stores').document(store['id']).set({'details': details})
+            upload_sales_shards(db, store['id'], sales_data)
+        else:
+            db.collection('stores').document(store['id']).set({
+                'details': details,
+                'sales_data': sales_data
+            })
+
+# --- Scale generator (NumPy) ---
+# Same semantics as steps 1-5 (geo/religion peak months, good/normal/bad
+# ratio, stock carried over within a year), vectorized over many series at once.
+
+COMBOS = [(geo, religion) for geo in geo_options for religion in religion_options]
+DAY_TYPES = np.array(['good', 'normal', 'bad'])
+# Inclusive randint ranges for 'sold' by day type, as half-open bounds
+SOLD_LOW = np.array([10, 5, 1])
+SOLD_HIGH = np.array([21, 11, 6])
+COUNTERS = ['initial', 'sold', 'returns', 'donations',
+            'reroutes_in', 'reroutes_out', 'recycled', 'final']
+
+def make_rng(seed=SEED):
+    return np.random.default_rng(None if seed is None else int(seed))
+
+def generate_skus_np(rng, num_skus=NUM_SKUS):
+    width = id_width(num_skus)
+    return {
+        'sku_id': np.array([f'SKU{str(i).zfill(width)}' for i in range(1, num_skus + 1)]),
+        'shelf_life_days': rng.integers(14, 106, num_skus),  # 2–15 weeks
+    }
+
+def generate_stores_np(rng, num_skus, num_stores=NUM_STORES, skus_per_store=SKUS_PER_STORE):
+    """
+    Stores with a geo+religion combo index and sku_idx, a (stores, k) array
+    of distinct SKU indices per store.
+    """
+    width = id_width(num_stores)
+    combo_order = rng.permutation(len(COMBOS))
+    k = min(skus_per_store, num_skus)
+    return {
+        'store_id': np.array([f'store{str(i).zfill(width)}' for i in range(1, num_stores + 1)]),
+        'combo': combo_order[np.arange(1, num_stores + 1) % len(COMBOS)],
+        'sku_idx': np.stack([rng.choice(num_skus, k, replace=False) for _ in range(num_stores)]),
+    }
+
+def get_dates_np(year, granularity=GRANULARITY):
+    if granularity == 'daily':
+        return np.arange(f'{year}-01-01', f'{year + 1}-01-01', dtype='datetime64[D]')
+    return np.array(get_weekend_dates(year), dtype='datetime64[D]')
+
+def peak_mask_by_combo(dates):
+    """
+    (len(COMBOS), len(dates)) bool mask of peak-month dates per combo.
+    """
+    months = dates.astype('datetime64[M]').astype(int) % 12 + 1
+    return np.stack([np.isin(months, peak_months.get(c, [])) for c in COMBOS])
+
+def classify_days_np(rng, peak_mask):
+    """
+    Vectorized classify_days: day-type codes (0 good, 1 normal, 2 bad) for
+    a (series, dates) peak mask. Peak dates become good in date order, short
+    falls are filled with random dates, then bad days are drawn from the rest.
+    """
+    n, d = peak_mask.shape
+    num_good = int(d * GOOD_NORMAL_BAD_RATIO[0])
+    num_bad = int(d * GOOD_NORMAL_BAD_RATIO[2])
+    rows = np.arange(n)[:, None]
+
+    types = np.ones((n, d), dtype=np.int8)
+    key = np.where(peak_mask, np.arange(d) / d, 1.0 + rng.random((n, d)))
+    types[rows, np.argsort(key, axis=1)[:, :num_good]] = 0
+    key = np.where(types == 0, 2.0, rng.random((n, d)))
+    types[rows, np.argsort(key, axis=1)[:, :num_bad]] = 2
+    return types
+
+def simulate_sales_np(rng, types):
+    """
+    Vectorized simulate_sales_data for one year of many series.
+    Returns (series, dates) int32 arrays keyed by counter name.
+    """
+    n, d = types.shape
+    shape = (n, d)
+    sold = rng.integers(SOLD_LOW[types], SOLD_HIGH[types], dtype=np.int32)
+    returns = rng.integers(0, sold // 5 + 1, dtype=np.int32)
+    donations = (rng.random(shape) < 0.1) * rng.integers(0, 2, shape, dtype=np.int32)
+    reroutes_in = (rng.random(shape) < 0.05) * rng.integers(0, 3, shape, dtype=np.int32)
+    reroutes_out = (rng.random(shape) < 0.05) * rng.integers(0, 3, shape, dtype=np.int32)
+    recycled = (rng.random(shape) < 0.05) * rng.integers(0, 2, shape, dtype=np.int32)
+    delta = returns + reroutes_in - reroutes_out - donations - recycled - sold
+
+    initial = np.empty(shape, dtype=np.int32)
+    final = np.empty(shape, dtype=np.int32)
+    stock = rng.integers(80, 151, n, dtype=np.int32)  # initial stock for the year
+    for t in range(d):
+        initial[:, t] = stock
+        stock = np.maximum(stock + delta[:, t], 0)
+        final[:, t] = stock  # carry over to next period
+
+    return {'initial': initial, 'sold': sold, 'returns': returns, 'donations': donations,
+            'reroutes_in': reroutes_in, 'reroutes_out': reroutes_out,
+            'recycled': recycled, 'final': final}
+
+def iter_sales_chunks(rng, stores, years=YEARS, granularity=GRANULARITY,
+                      series_per_chunk=SERIES_PER_CHUNK):
+    """
+    Yield one chunk per (block of store-SKU series, year) with 2D
+    (series, dates) arrays, so memory is bounded by series_per_chunk.
+    """
+    k = stores['sku_idx'].shape[1]
+    store_idx = np.repeat(np.arange(len(stores['store_id'])), k)
+    sku_idx = stores['sku_idx'].ravel()
+    combo = stores['combo'][store_idx]
+
+    for start in range(0, len(store_idx), series_per_chunk):
+        block = slice(start, start + series_per_chunk)
+        for year in years:
+            dates = get_dates_np(year, granularity)
+            types = classify_days_np(rng, peak_mask_by_combo(dates)[combo[block]])
+            yield {'year': year, 'dates': dates, 'store_idx': store_idx[block],
+                   'sku_idx': sku_idx[block], 'types': types,
+                   **simulate_sales_np(rng, types)}
+
+def chunk_to_arrow(chunk, store_dict, sku_dict):
+    """
+    Flatten a chunk into a sales_data-shaped Arrow table (dictionary-encoded ids).
+    """
+    import pyarrow as pa
+    n, d = chunk['types'].shape
+    return pa.table({
+        'store_id': pa.DictionaryArray.from_arrays(
+            np.repeat(chunk['store_idx'], d).astype(np.int32), store_dict),
+        'sku_id': pa.DictionaryArray.from_arrays(
+            np.repeat(chunk['sku_idx'], d).astype(np.int32), sku_dict),
+        'year': np.full(n * d, chunk['year'], dtype=np.int32),
+        'day': np.tile(np.arange(1, d + 1, dtype=np.int32), n),
+        'date': pa.array(np.tile(chunk['dates'], n)),
+        'type_of_day': pa.DictionaryArray.from_arrays(
+            chunk['types'].ravel().astype(np.int32), pa.array(DAY_TYPES)),
+        **{c: chunk[c].ravel() for c in COUNTERS},
+    })
+
+def _decoded(table):
+    # CSV export needs plain strings instead of dictionary arrays
+    import pyarrow as pa
+    return pa.table({
+        name: col.dictionary_decode() if pa.types.is_dictionary(col.type) else col
+        for name, col in zip(table.column_names, (c.combine_chunks() for c in table.columns))
+    })
+
+def copy_table_to_postgres(cur, name, table):
+    """
+    COPY an Arrow table into Postgres through an in-memory CSV buffer.
+    """
+    import pyarrow.csv as pacsv
+    buf = io.BytesIO()
+    pacsv.write_csv(_decoded(table), buf, pacsv.WriteOptions(include_header=False))
+    buf.seek(0)
+    cur.copy_expert(f"COPY {name} ({', '.join(table.column_names)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+def master_tables(skus, stores):
+    import pyarrow as pa
+    k = stores['sku_idx'].shape[1]
+    return {
+        'skus': pa.table({'sku_id': skus['sku_id'], 'name': skus['sku_id'],
+                          'shelf_life_days': skus['shelf_life_days'].astype(np.int32)}),
+        'stores': pa.table({'store_id': stores['store_id'],
+                            'geo': [COMBOS[c][0] for c in stores['combo']],
+                            'religion': [COMBOS[c][1] for c in stores['combo']]}),
+        'store_skus': pa.table({'store_id': np.repeat(stores['store_id'], k),
+                                'sku_id': skus['sku_id'][stores['sku_idx'].ravel()]}),
+    }
+
+def upload_chunk_to_firestore(db, chunk, store_ids, sku_ids):
+    """
+    Write a chunk as sharded sales/{sku}_{year} docs with batched writes.
+    """
+    date_strs = np.datetime_as_string(chunk['dates']).tolist()
+    day_types = DAY_TYPES[chunk['types']].tolist()
+    counters = {c: chunk[c].tolist() for c in COUNTERS}
+
+    def writes():
+        for i, (s, k) in enumerate(zip(chunk['store_idx'], chunk['sku_idx'])):
+            data = [
+                {'day': t + 1, 'date': date_strs[t], 'type_of_day': day_types[i][t],
+                 **{c: counters[c][i][t] for c in COUNTERS}}
+                for t in range(len(date_strs))
+            ]
+            ref = (db.collection('stores').document(str(store_ids[s]))
+                   .collection('sales').document(shard_id(str(sku_ids[k]), chunk['year'])))
+            yield ref, {'store_id': str(store_ids[s]), 'sku': str(sku_ids[k]),
+                        'year': chunk['year'], 'date_from': date_strs[0],
+                        'date_to': date_strs[-1], 'data': data}
+
+    commit_in_batches(db, writes())
+
+def generate_at_scale(output=GENERATOR_OUTPUT, seed=SEED, granularity=GRANULARITY):
+    """
+    Generate stores, SKUs and sales with the NumPy generator and write them
+    to Parquet files, Postgres (COPY) or Firestore (sharded layout).
+    """
+    started = time.perf_counter()
+    rng = make_rng(seed)
+    skus = generate_skus_np(rng)
+    stores = generate_stores_np(rng, len(skus['sku_id']))
+    n_series = stores['sku_idx'].size
+    print(f"🎲 {len(stores['store_id'])} stores x {stores['sku_idx'].shape[1]} SKUs "
+          f"= {n_series} series, {granularity} granularity, seed={seed} → {output}")
+
+    if output in ('parquet', 'postgres'):
+        import pyarrow as pa
+        store_dict, sku_dict = pa.array(stores['store_id']), pa.array(skus['sku_id'])
+        masters = master_tables(skus, stores)
+
+    writer = conn = None
+    if output == 'parquet':
+        import pyarrow.parquet as pq
+        os.makedirs(PARQUET_DIR, exist_ok=True)
+        for name, table in masters.items():
+            pq.write_table(table, os.path.join(PARQUET_DIR, f"{name}.parquet"))
+    elif output == 'postgres':
+        import psycopg2
+        conn = psycopg2.connect(**PG_CONFIG)
+        with conn, conn.cursor() as cur:
+            for name, table in masters.items():
+                copy_table_to_postgres(cur, name, table)
+    else:
+        db = init_firestore()
+        commit_in_batches(db, (
+            (db.collection('skus').document(str(sku_id)),
+             {'name': str(sku_id), 'shelf_life_days': int(life)})
+            for sku_id, life in zip(skus['sku_id'], skus['shelf_life_days'])
+        ))
+        commit_in_batches(db, (
+            (db.collection('stores').document(str(store_id)), {'details': {
+                'geo': COMBOS[c][0], 'religion': COMBOS[c][1],
+                'skus': skus['sku_id'][idx].tolist()}})
+            for store_id, c, idx in zip(stores['store_id'], stores['combo'], stores['sku_idx'])
+        ))
+
+    rows = 0
+    try:
+        for chunk in tqdm(iter_sales_chunks(rng, stores, granularity=granularity), desc="Chunks"):
+            rows += chunk['types'].size
+            if output == 'parquet':
+                table = chunk_to_arrow(chunk, store_dict, sku_dict)
+                if writer is None:
+                    writer = pq.ParquetWriter(os.path.join(PARQUET_DIR, "sales_data.parquet"), table.schema)
+                writer.write_table(table)
+            elif output == 'postgres':
+                with conn, conn.cursor() as cur:
+                    copy_table_to_postgres(cur, 'sales_data', chunk_to_arrow(chunk, store_dict, sku_dict))
+            else:
+                upload_chunk_to_firestore(db, chunk, stores['store_id'], skus['sku_id'])
+    finally:
+        if writer is not None:
+            writer.close()
+        if conn is not None:
+            conn.close()
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"✅ Generated {rows:,} sales rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+    return rows
 
 # --- Run all ---
 if __name__ == '__main__':
+    if GENERATOR == 'numpy' or GENERATOR_OUTPUT != 'firestore':
+        generate_at_scale()
+        raise SystemExit(0)
+
+    db = init_firestore()
     skus = generate_skus()
     stores = generate_stores(skus)
-    upload_to_firestore(skus, stores)
-    print("✅ All data uploaded successfully!")
\ No newline at end of file
+    upload_to_firestore(db, skus, stores)
+    print("✅ All data uploaded successfully!")